@@ -19,6 +19,14 @@ from typing import Any, List, Dict, Tuple, Optional
 from app.log import logger
 from app.schemas import NotificationType
 from app.helper.downloader import DownloaderHelper
+from app.plugins.cleaninvalidseed.path_index import ContentPathIndex, get_size
+from app.plugins.cleaninvalidseed.tracker_collector import TrackerStatusCollector
+
+try:
+    # 与自动删种插件共用下载器种子清单缓存
+    from app.plugins.torrentremover.inventory import DownloaderInventory
+except ImportError:
+    DownloaderInventory = None
 
 class CleanInvalidSeed(_PluginBase):
     # 插件名称
@@ -28,7 +36,7 @@ class CleanInvalidSeed(_PluginBase):
     # 插件图标
     plugin_icon = "clean_a.png"
     # 插件版本
-    plugin_version = "2.0"
+    plugin_version = "2.3"
     # 插件作者
     plugin_author = "DzAvril"
     # 作者主页
@@ -316,7 +324,13 @@ class CleanInvalidSeed(_PluginBase):
     def get_all_torrents(self, service):
         downloader_name = service.name
         downloader_obj = service.instance
-        all_torrents, error = downloader_obj.get_torrents()
+        if DownloaderInventory:
+            # 清理前需要最新状态，只做一次增量同步
+            all_torrents, error = DownloaderInventory.get(
+                name=downloader_name, downloader_type=service.type, downloader_obj=downloader_obj
+            ).get_torrents(max_age=0)
+        else:
+            all_torrents, error = downloader_obj.get_torrents()
 
         if error:
             logger.error(f"获取下载器:{downloader_name}种子失败: {error}")
@@ -351,7 +365,6 @@ class CleanInvalidSeed(_PluginBase):
             temp_invalid_torrents = []
             # tracker未工作，但暂时不能判定为失效做种，需人工判断
             tracker_not_working_torrents = []
-            working_tracker_set = set()
             exclude_categories = (
                 self._exclude_categories.split("\n") if self._exclude_categories else []
             )
@@ -362,15 +375,16 @@ class CleanInvalidSeed(_PluginBase):
                 self._custom_error_msg.split("\n") if self._custom_error_msg else []
             )
             error_msgs = self._error_msg + custom_msgs
+            # 一次性采集全部种子的tracker状态，同时统计正常工作的tracker域名
+            collector = TrackerStatusCollector(downloader_obj).collect(all_torrents, error_msgs)
+            working_tracker_set = collector.working_tracker_set
             # 第一轮筛选出所有未工作的种子
             for torrent in all_torrents:
-                trackers = torrent.trackers
+                trackers = collector.trackers(torrent.get("hash"))
                 is_invalid = True
                 is_tracker_working = False
                 for tracker in trackers:
-                    if tracker.get("tier") == -1:
-                        continue
-                    tracker_domian = StringUtils.get_url_netloc((tracker.get("url")))[1]
+                    tracker_domian = tracker.get("domain")
                     # 有一个tracker工作即为有效做种
                     if (tracker.get("status") == 2) or (tracker.get("status") == 3):
                         is_tracker_working = True
@@ -379,7 +393,6 @@ class CleanInvalidSeed(_PluginBase):
                         (tracker.get("status") == 4) and (tracker.get("msg") in error_msgs)
                     ):
                         is_invalid = False
-                        working_tracker_set.add(tracker_domian)
 
                     if self._more_logs:
                         logger.info(f"处理 [{torrent.name}] tracker [{tracker_domian}]: 分类: [{torrent.category}], 标签: [{torrent.tags}], 状态: [{tracker.get('status')}], msg: [{tracker.get('msg')}], is_invalid: [{is_invalid}], is_working: [{is_tracker_working}]")
@@ -391,6 +404,9 @@ class CleanInvalidSeed(_PluginBase):
                         tracker_not_working_torrents.append(torrent)
 
             logger.info(f"初筛共有{len(temp_invalid_torrents)}个无效做种")
+            for domain, stat in collector.domain_stats.items():
+                if stat.get("error") and self._more_logs:
+                    logger.info(f"tracker [{domain}] 正常 {stat.get('working')} 个，失效 {stat.get('error')} 个：{stat.get('msgs')}")
             # 第二轮筛选出tracker有正常工作种子而当前种子未工作的，避免因临时关站或tracker失效导致误删的问题
             # 失效做种但通过种子分类排除的种子
             invalid_torrents_exclude_categories = []
@@ -400,11 +416,9 @@ class CleanInvalidSeed(_PluginBase):
             invalid_torrent_tuple_list = []
             deleted_torrent_tuple_list = []
             for torrent in temp_invalid_torrents:
-                trackers = torrent.trackers
+                trackers = collector.trackers(torrent.get("hash"))
                 for tracker in trackers:
-                    if tracker.get("tier") == -1:
-                        continue
-                    tracker_domian = StringUtils.get_url_netloc((tracker.get("url")))[1]
+                    tracker_domian = tracker.get("domain")
                     if tracker_domian in working_tracker_set:
                         # tracker是正常的，说明该种子是无效的
                         invalid_torrent_tuple_list.append(
@@ -414,7 +428,7 @@ class CleanInvalidSeed(_PluginBase):
                                 torrent.tags,
                                 torrent.size,
                                 tracker_domian,
-                                tracker.msg,
+                                tracker.get("msg"),
                             )
                         )
                         if self._delete_invalid_torrents or self._label_only:
@@ -445,7 +459,7 @@ class CleanInvalidSeed(_PluginBase):
                                             torrent.tags,
                                             torrent.size,
                                             tracker_domian,
-                                            tracker.msg,
+                                            tracker.get("msg"),
                                         )
                                     )
                         break
@@ -467,35 +481,23 @@ class CleanInvalidSeed(_PluginBase):
 
             for index in range(len(tracker_not_working_torrents)):
                 torrent = tracker_not_working_torrents[index]
-                trackers = torrent.trackers
                 tracker_msg = ""
-                for tracker in trackers:
-                    if tracker.get("tier") == -1:
-                        continue
-                    tracker_domian = StringUtils.get_url_netloc((tracker.get("url")))[1]
-                    tracker_msg += f" {tracker_domian}：{tracker.msg} "
+                for tracker in collector.trackers(torrent.get("hash")):
+                    tracker_msg += f" {tracker.get('domain')}：{tracker.get('msg')} "
                 tracker_not_working_msg += f"{index + 1}. {torrent.name}，分类：{torrent.category}，标签：{torrent.tags}, 大小：{StringUtils.str_filesize(torrent.size)}，Trackers: {tracker_msg}\n"
 
             for index in range(len(invalid_torrents_exclude_categories)):
                 torrent = invalid_torrents_exclude_categories[index]
-                trackers = torrent.trackers
                 tracker_msg = ""
-                for tracker in trackers:
-                    if tracker.get("tier") == -1:
-                        continue
-                    tracker_domian = StringUtils.get_url_netloc((tracker.get("url")))[1]
-                    tracker_msg += f" {tracker_domian}：{tracker.msg} "
+                for tracker in collector.trackers(torrent.get("hash")):
+                    tracker_msg += f" {tracker.get('domain')}：{tracker.get('msg')} "
                 exclude_categories_msg += f"{index + 1}. {torrent.name}，分类：{torrent.category}，标签：{torrent.tags}, 大小：{StringUtils.str_filesize(torrent.size)}，Trackers: {tracker_msg}\n"
 
             for index in range(len(invalid_torrents_exclude_labels)):
                 torrent = invalid_torrents_exclude_labels[index]
-                trackers = torrent.trackers
                 tracker_msg = ""
-                for tracker in trackers:
-                    if tracker.get("tier") == -1:
-                        continue
-                    tracker_domian = StringUtils.get_url_netloc((tracker.get("url")))[1]
-                    tracker_msg += f" {tracker_domian}：{tracker.msg} "
+                for tracker in collector.trackers(torrent.get("hash")):
+                    tracker_msg += f" {tracker.get('domain')}：{tracker.get('msg')} "
                 exclude_labels_msg += f"{index + 1}. {torrent.name}，分类：{torrent.category}，标签：{torrent.tags}, 大小：{StringUtils.str_filesize(torrent.size)}，Trackers: {tracker_msg}\n"
 
             for index in range(len(deleted_torrent_tuple_list)):
@@ -582,10 +584,9 @@ class CleanInvalidSeed(_PluginBase):
             mp_path, qb_path = path.split(":")
             source_path_map[mp_path] = qb_path
             source_paths.append(mp_path)
-        # 所有做种源文件路径
-        content_path_set = set()
-        for torrent in all_torrents:
-            content_path_set.add(torrent.content_path)
+        # 所有做种源文件路径，建立有序前缀索引
+        content_path_index = ContentPathIndex(torrent.content_path for torrent in all_torrents)
+        logger.info(f"共有{len(content_path_index)}个做种源文件路径")
 
         message = "检测未做种无效源文件：\n"
         for source_path_str in source_paths:
@@ -599,10 +600,9 @@ class CleanInvalidSeed(_PluginBase):
                     text=f"{source_path} 不存在，无法检测未做种无效源文件",
                 )
                 continue
-            source_files = []
             # 获取source_path下的所有文件包括文件夹
-            for file in source_path.iterdir():
-                source_files.append(file)
+            with os.scandir(source_path) as entries:
+                source_files = [Path(entry.path) for entry in entries]
             for source_file in source_files:
                 skip = False
                 for key_word in exclude_key_words:
@@ -616,17 +616,13 @@ class CleanInvalidSeed(_PluginBase):
                 qb_path = (str(source_file)).replace(
                     source_path_str, source_path_map[source_path_str]
                 )
-                # todo: 优化性能
-                is_exist = False
-                for content_path in content_path_set:
-                    if qb_path in content_path:
-                        is_exist = True
-                        break
+                # 存在以该路径开头的做种内容路径即为正在做种
+                is_exist = content_path_index.contains_prefix(qb_path)
 
                 if not is_exist:
                     deleted_file_cnt += 1
                     message += f"{deleted_file_cnt}. {str(source_file)}\n"
-                    total_size += self.get_size(source_file)
+                    total_size += get_size(str(source_file))
                     if self._delete_invalid_files:
                         if source_file.is_file():
                             source_file.unlink()
@@ -646,16 +642,6 @@ class CleanInvalidSeed(_PluginBase):
             )
         logger.info("检测无效源文件任务结束")
 
-    def get_size(self, path: Path):
-        total_size = 0
-        if path.is_file():
-            return path.stat().st_size
-        # rglob 方法用于递归遍历所有文件和目录
-        for entry in path.rglob("*"):
-            if entry.is_file():
-                total_size += entry.stat().st_size
-        return total_size
-
     def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
         return [
             {
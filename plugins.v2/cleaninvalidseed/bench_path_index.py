@@ -0,0 +1,118 @@
+"""
+无效源文件检测性能对比
+1、模拟的做种内容路径（默认10万条）下，对比旧版逐条子串匹配与 ContentPathIndex 前缀索引的耗时；
+2、在临时目录生成模拟的源文件目录树，对比旧版 Path.rglob + stat 与 os.scandir 版 get_size 的耗时
+
+用法（在MoviePilot环境中运行）：
+    python -m app.plugins.cleaninvalidseed.bench_path_index --paths 100000 --entries 500
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Set
+
+from app.plugins.cleaninvalidseed.path_index import ContentPathIndex, get_size
+
+
+def build_paths(count: int) -> List[str]:
+    """
+    生成做种内容路径：/downloads/分类/种子目录/文件
+    """
+    return [f"/downloads/{'tv' if i % 3 else 'movie'}/Torrent.{i // 10:06d}/file_{i % 10:02d}.mkv"
+            for i in range(count)]
+
+
+def build_entries(paths: List[str], count: int) -> List[str]:
+    """
+    生成下载目录下的一级条目，一半在做种、一半未做种
+    """
+    seeded = sorted({path.rsplit("/", 1)[0] for path in paths})
+    entries = random.sample(seeded, min(count // 2, len(seeded)))
+    entries += [f"/downloads/tv/Orphan.{i:06d}" for i in range(count - len(entries))]
+    random.shuffle(entries)
+    return entries
+
+
+def loop_match(content_paths: Set[str], entries: List[str]) -> int:
+    """
+    旧版匹配方式：逐条判断子串
+    """
+    matched = 0
+    for entry in entries:
+        for content_path in content_paths:
+            if entry in content_path:
+                matched += 1
+                break
+    return matched
+
+
+def index_match(content_paths: Set[str], entries: List[str]) -> int:
+    index = ContentPathIndex(content_paths)
+    return sum(1 for entry in entries if index.contains_prefix(entry))
+
+
+def rglob_size(path: Path) -> int:
+    """
+    旧版目录大小计算
+    """
+    total_size = 0
+    if path.is_file():
+        return path.stat().st_size
+    for entry in path.rglob("*"):
+        if entry.is_file():
+            total_size += entry.stat().st_size
+    return total_size
+
+
+def build_tree(root: Path, dirs: int, files: int):
+    for i in range(dirs):
+        folder = root / f"Torrent.{i:04d}" / "Sub"
+        folder.mkdir(parents=True, exist_ok=True)
+        for j in range(files):
+            (folder / f"file_{j:03d}.mkv").write_bytes(b"\0" * (i + j))
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CleanInvalidSeed 无效源文件检测性能对比")
+    parser.add_argument("--paths", type=int, default=100000, help="做种内容路径数")
+    parser.add_argument("--entries", type=int, default=500, help="下载目录一级条目数")
+    parser.add_argument("--dirs", type=int, default=200, help="目录大小计算的目录数")
+    parser.add_argument("--files", type=int, default=50, help="每个目录的文件数")
+    args = parser.parse_args()
+
+    random.seed(0)
+    content_paths = set(build_paths(args.paths))
+    entries = build_entries(list(content_paths), args.entries)
+    loop_matched, loop_cost = timed(loop_match, content_paths, entries)
+    index_matched, index_cost = timed(index_match, content_paths, entries)
+    if loop_matched != index_matched:
+        raise SystemExit(f"匹配结果不一致：逐条匹配 {loop_matched}，前缀索引 {index_matched}")
+    print(f"做种内容路径：{len(content_paths)}，检测条目：{len(entries)}，正在做种：{index_matched}")
+    print(f"逐条子串匹配：{loop_cost:.3f} 秒")
+    print(f"前缀索引（含建立索引）：{index_cost:.3f} 秒（{loop_cost / index_cost:.0f}x）")
+
+    tmp = Path(tempfile.mkdtemp(prefix="cleaninvalidseed-bench-"))
+    try:
+        build_tree(tmp, args.dirs, args.files)
+        rglob_total, rglob_cost = timed(rglob_size, tmp)
+        scandir_total, scandir_cost = timed(get_size, str(tmp))
+        if rglob_total != scandir_total:
+            raise SystemExit(f"目录大小不一致：rglob {rglob_total}，scandir {scandir_total}")
+        print(f"目录大小：{args.dirs * args.files} 个文件，共 {scandir_total} 字节")
+        print(f"Path.rglob + stat：{rglob_cost:.3f} 秒")
+        print(f"os.scandir：       {scandir_cost:.3f} 秒（{rglob_cost / scandir_cost:.1f}x）")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+from bisect import bisect_left
+from typing import Iterable
+
+
+class ContentPathIndex:
+    """
+    做种内容路径的有序前缀索引
+    判断某个路径是否被任一种子的内容路径以其为前缀包含，单次查询为O(log n)
+    """
+
+    def __init__(self, content_paths: Iterable[str]):
+        self._paths = sorted({path for path in content_paths if path})
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def contains_prefix(self, prefix: str) -> bool:
+        """
+        是否存在以prefix开头的内容路径
+        """
+        if not prefix:
+            return False
+        # 以prefix开头的字符串在有序列表中连续排列，且从第一个不小于prefix的位置开始
+        index = bisect_left(self._paths, prefix)
+        return index < len(self._paths) and self._paths[index].startswith(prefix)
+
+
+def get_size(path: str) -> int:
+    """
+    使用os.scandir单次遍历计算文件或目录的总大小，不跟随符号链接
+    """
+    try:
+        if not os.path.isdir(path) or os.path.islink(path):
+            return os.lstat(path).st_size
+    except OSError:
+        return 0
+    total_size = 0
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            total_size += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total_size
@@ -0,0 +1,127 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Set
+
+from app.log import logger
+from app.utils.string import StringUtils
+
+
+class TrackerStatusCollector:
+    """
+    批量采集种子的Tracker状态
+    qBittorrent 5.1+ 支持在torrents/info中直接返回Tracker，一次请求即可获取全部种子的Tracker；
+    旧版本退化为有限并发的逐个查询。结果在本次运行内按hash缓存，
+    同时一次性统计正常工作的Tracker域名和各域名的错误信息
+    """
+
+    def __init__(self, downloader_obj, max_workers: int = 8):
+        self._downloader = downloader_obj
+        self._max_workers = max_workers
+        # hash -> tracker列表（已排除DHT/PeX/LSD）
+        self._trackers: Dict[str, List[dict]] = {}
+        # 有tracker正常工作的域名
+        self.working_tracker_set: Set[str] = set()
+        # 域名 -> {"working": 数量, "error": 数量, "msgs": {错误信息: 数量}}
+        self.domain_stats: Dict[str, dict] = {}
+        # 采集方式与耗时
+        self.mode = ""
+        self.elapsed = 0.0
+        self.requests = 0
+
+    def collect(self, torrents: list, error_msgs: List[str]) -> "TrackerStatusCollector":
+        """
+        采集全部种子的Tracker状态并统计
+        :param torrents: 种子列表
+        :param error_msgs: 判定为失效的错误信息
+        """
+        start = time.time()
+        hashes = [torrent.get("hash") for torrent in torrents]
+        missing = [torrent_hash for torrent_hash in hashes if torrent_hash not in self._trackers]
+        if missing:
+            self.__collect_bulk(set(missing))
+            # 批量不支持或期间新增的种子逐个获取
+            self.__collect_each([torrent_hash for torrent_hash in missing if torrent_hash not in self._trackers])
+            # 无法直接访问下载器客户端时使用种子对象自身的trackers
+            for torrent in torrents:
+                if torrent.get("hash") not in self._trackers:
+                    self.requests += 1
+                    self._trackers[torrent.get("hash")] = self.__normalize(torrent.trackers)
+                    self.mode = self.mode or "逐个"
+        self.elapsed = time.time() - start
+
+        for torrent_hash in hashes:
+            for tracker in self.trackers(torrent_hash):
+                domain = tracker.get("domain")
+                stat = self.domain_stats.setdefault(domain, {"working": 0, "error": 0, "msgs": {}})
+                if tracker.get("status") == 4 and tracker.get("msg") in error_msgs:
+                    stat["error"] += 1
+                    stat["msgs"][tracker.get("msg")] = stat["msgs"].get(tracker.get("msg"), 0) + 1
+                else:
+                    stat["working"] += 1
+                    self.working_tracker_set.add(domain)
+        logger.info(f"Tracker状态采集完成，方式：{self.mode}，种子数：{len(hashes)}，"
+                    f"请求数：{self.requests}，耗时：{self.elapsed:.2f} 秒")
+        return self
+
+    def trackers(self, torrent_hash: str) -> List[dict]:
+        """
+        获取种子的Tracker列表，每项包含url、domain、status、msg
+        """
+        return self._trackers.get(torrent_hash) or []
+
+    @staticmethod
+    def __normalize(trackers: list) -> List[dict]:
+        result = []
+        for tracker in trackers or []:
+            if tracker.get("tier") == -1:
+                continue
+            result.append({
+                "url": tracker.get("url"),
+                "domain": StringUtils.get_url_netloc(tracker.get("url"))[1],
+                "status": tracker.get("status"),
+                "msg": tracker.get("msg")
+            })
+        return result
+
+    def __collect_bulk(self, hashes: Set[str]) -> bool:
+        """
+        通过torrents/info的includeTrackers参数一次获取全部Tracker
+        """
+        qbc = getattr(self._downloader, "qbc", None)
+        if not qbc:
+            return False
+        try:
+            self.requests += 1
+            torrents = qbc.torrents_info(includeTrackers=True)
+        except Exception as e:
+            logger.debug(f"批量获取Tracker失败：{str(e)}")
+            return False
+        if torrents and "trackers" not in torrents[0]:
+            # 下载器不支持includeTrackers
+            return False
+        for torrent in torrents or []:
+            if torrent.get("hash") in hashes:
+                self._trackers[torrent.get("hash")] = self.__normalize(torrent.get("trackers"))
+        self.mode = "批量"
+        return True
+
+    def __collect_each(self, hashes: List[str]):
+        """
+        有限并发逐个获取Tracker
+        """
+        qbc = getattr(self._downloader, "qbc", None)
+        if not qbc or not hashes:
+            return
+
+        def __fetch(torrent_hash: str):
+            try:
+                return torrent_hash, qbc.torrents_trackers(torrent_hash=torrent_hash)
+            except Exception as e:
+                logger.error(f"获取种子 {torrent_hash} Tracker失败：{str(e)}")
+                return torrent_hash, []
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            for torrent_hash, trackers in executor.map(__fetch, hashes):
+                self._trackers[torrent_hash] = self.__normalize(trackers)
+        self.requests += len(hashes)
+        self.mode = self.mode or "逐个"
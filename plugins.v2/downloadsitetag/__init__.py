@@ -1,15 +1,18 @@
 import datetime
 import threading
+import time
 from typing import List, Tuple, Dict, Any, Optional
 
 import pytz
 from app.helper.sites import SitesHelper
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy.orm import Session
 
 from app.core.config import settings
 from app.core.context import Context
 from app.core.event import eventmanager, Event
+from app.db import db_query
 from app.db.downloadhistory_oper import DownloadHistoryOper
 from app.db.models.downloadhistory import DownloadHistory
 from app.helper.downloader import DownloaderHelper
@@ -19,6 +22,12 @@ from app.schemas import ServiceInfo
 from app.schemas.types import EventType, MediaType
 from app.utils.string import StringUtils
 
+try:
+    # 与自动删种插件共用下载器种子清单缓存
+    from app.plugins.torrentremover.inventory import DownloaderInventory
+except ImportError:
+    DownloaderInventory = None
+
 
 class DownloadSiteTag(_PluginBase):
     # 插件名称
@@ -28,7 +37,7 @@ class DownloadSiteTag(_PluginBase):
     # 插件图标
     plugin_icon = "Youtube-dl_B.png"
     # 插件版本
-    plugin_version = "2.2"
+    plugin_version = "2.5"
     # 插件作者
     plugin_author = "叮叮当"
     # 作者主页
@@ -62,6 +71,19 @@ class DownloadSiteTag(_PluginBase):
     _category_tv = None
     _category_anime = None
     _downloaders = None
+    _full_days = 7
+    # tmdb类型缓存数量
+    _genre_cache_size = 5000
+    # 下载历史每批查询的hash数
+    _history_chunk_size = 500
+    # 每次调用下载器接口设置的种子数
+    _apply_chunk_size = 200
+    # tracker关键字 -> 站点域名
+    _tracker_mappings = {
+        "chdbits.xyz": "ptchdbits.co",
+        "agsvpt.trackers.work": "agsvpt.com",
+        "tracker.cinefiles.info": "audiences.me",
+    }
 
     def init_plugin(self, config: dict = None):
         self.downloadhistory_oper = DownloadHistoryOper()
@@ -82,6 +104,7 @@ class DownloadSiteTag(_PluginBase):
             self._category_tv = config.get("category_tv") or "电视"
             self._category_anime = config.get("category_anime") or "动漫"
             self._downloaders = config.get("downloaders")
+            self._full_days = self.str_to_number(config.get("full_days") or 7, 7)
 
         # 停止现有任务
         self.stop_service()
@@ -94,7 +117,7 @@ class DownloadSiteTag(_PluginBase):
             config.update({"onlyonce": self._onlyonce})
             self.update_config(config)
             # 添加 补全下载历史的标签与分类 任务
-            self._scheduler.add_job(func=self._complemented_history, trigger='date',
+            self._scheduler.add_job(func=self._complemented_history, trigger='date', kwargs={"full": True},
                                     run_date=datetime.datetime.now(
                                         tz=pytz.timezone(settings.TZ)) + datetime.timedelta(seconds=3)
                                     )
@@ -192,16 +215,22 @@ class DownloadSiteTag(_PluginBase):
     def str_to_number(s: str, i: int) -> int:
         try:
             return int(s)
-        except ValueError:
+        except (ValueError, TypeError):
             return i
 
-    def _complemented_history(self):
+    def _complemented_history(self, full: bool = False):
         """
         补全下载历史的标签与分类
+        :param full: 是否全量处理, 否则只处理上次运行之后添加的种子, 并按设置的间隔定期全量处理
         """
         if not self.service_infos:
             return
         logger.info(f"{self.LOG_TAG}开始执行 ...")
+        # 各下载器已处理到的位置
+        high_water = self.get_data("high_water") or {}
+        # tmdbid -> genre_ids
+        genre_cache = self.get_data("genre_cache") or {}
+        genre_count = len(genre_cache)
         # 记录处理的种子, 供辅种(无下载历史)使用
         dispose_history = {}
         # 所有站点索引
@@ -209,11 +238,9 @@ class DownloadSiteTag(_PluginBase):
         # JackettIndexers索引器支持多个站点, 如果不存在历史记录, 则通过tracker会再次附加其他站点名称
         indexers.append("JackettIndexers")
         indexers = set(indexers)
-        tracker_mappings = {
-            "chdbits.xyz": "ptchdbits.co",
-            "agsvpt.trackers.work": "agsvpt.com",
-            "tracker.cinefiles.info": "audiences.me",
-        }
+        # 站点域名 -> 站点名称, 以及本次运行中已识别的tracker -> 站点名称
+        site_domains = self._get_site_domains()
+        tracker_sites: Dict[str, Optional[str]] = {}
         for service in self.service_infos.values():
             downloader = service.name
             downloader_obj = service.instance
@@ -222,13 +249,44 @@ class DownloadSiteTag(_PluginBase):
                 logger.error(f"{self.LOG_TAG} 获取下载器失败 {downloader}")
                 continue
             # 获取下载器中的种子
-            torrents, error = downloader_obj.get_torrents()
+            if DownloaderInventory:
+                torrents, error = DownloaderInventory.get(
+                    name=downloader, downloader_type=service.type, downloader_obj=downloader_obj
+                ).get_torrents()
+            else:
+                torrents, error = downloader_obj.get_torrents()
             # 如果下载器获取种子发生错误 或 没有种子 则跳过
             if error or not torrents:
                 continue
+            mark = high_water.get(downloader) or {}
+            now = int(time.time())
+            if full or not mark or not self._full_days \
+                    or now - (mark.get("full_time") or 0) >= self._full_days * 86400:
+                # 全量处理
+                mark = {"full_time": now}
+                original_hashes = {}
+            else:
+                torrents, original_hashes = self._incremental_torrents(torrents=torrents, dl_type=service.type,
+                                                                       mark=mark)
+                if not torrents:
+                    logger.info(f"{self.LOG_TAG}下载器 {downloader} 没有新增种子")
+                    continue
             logger.info(f"{self.LOG_TAG}按时间重新排序 {downloader} 种子数：{len(torrents)}")
             # 按添加时间进行排序, 时间靠前的按大小和名称加入处理历史, 判定为原始种子, 其他为辅种
             torrents = self._torrents_sort(torrents=torrents, dl_type=service.type)
+            # 批量获取全部种子的下载历史
+            histories = self._get_histories(
+                hashes=[self._get_hash(torrent=torrent, dl_type=service.type) for torrent in torrents]
+                + [_hash for hashes in original_hashes.values() for _hash in hashes])
+            # 增量处理时, 之前已处理的同名同大小种子作为原始种子, 供新增辅种使用
+            for _key, hashes in original_hashes.items():
+                for _hash in reversed(hashes):
+                    if histories.get(_hash):
+                        dispose_history[_key] = histories.get(_hash)
+                        break
+            # 待设置的标签与分类, 相同的标签集合或分类合并为一次调用
+            tag_groups: Dict[Tuple[str, ...], List[str]] = {}
+            cat_groups: Dict[str, List[str]] = {}
             logger.info(f"{self.LOG_TAG}下载器 {downloader} 分析种子信息中 ...")
             for torrent in torrents:
                 try:
@@ -246,7 +304,7 @@ class DownloadSiteTag(_PluginBase):
                     torrent_tags = self._get_label(torrent=torrent, dl_type=service.type)
                     torrent_cat = self._get_category(torrent=torrent, dl_type=service.type)
                     # 提取种子hash对应的下载历史
-                    history: DownloadHistory = self.downloadhistory_oper.get_by_hash(_hash)
+                    history: DownloadHistory = histories.get(_hash)
                     if not history:
                         # 如果找到已处理种子的历史, 表明当前种子是辅种, 否则创建一个空DownloadHistory
                         if _key and _key in dispose_history:
@@ -266,16 +324,10 @@ class DownloadSiteTag(_PluginBase):
                     elif not history.torrent_site:
                         trackers = self._get_trackers(torrent=torrent, dl_type=service.type)
                         for tracker in trackers:
-                            # 检查tracker是否包含特定的关键字，并进行相应的映射
-                            for key, mapped_domain in tracker_mappings.items():
-                                if key in tracker:
-                                    domain = mapped_domain
-                                    break
-                            else:
-                                domain = StringUtils.get_url_domain(tracker)
-                            site_info = self.sites_helper.get_indexer(domain)
-                            if site_info:
-                                history.torrent_site = site_info.get("name")
+                            site_name = self._get_tracker_site(tracker=tracker, site_domains=site_domains,
+                                                               tracker_sites=tracker_sites)
+                            if site_name:
+                                history.torrent_site = site_name
                                 break
                         # 如果通过tracker还是无法获取站点名称, 且tmdbid, type, title都是空的, 那么跳过当前种子
                         if not history.torrent_site and not history.tmdbid and not history.type and not history.title:
@@ -296,10 +348,14 @@ class DownloadSiteTag(_PluginBase):
                         # 因允许tmdbid为空时运行到此, 因此需要判断tmdbid不为空
                         history_type = MediaType(history.type) if history.type else None
                         if history.tmdbid and history_type == MediaType.TV:
-                            # tmdb_id获取tmdb信息
-                            tmdb_info = self.chain.tmdb_info(mtype=history_type, tmdbid=history.tmdbid)
-                            if tmdb_info:
-                                genre_ids = tmdb_info.get("genre_ids")
+                            # 优先使用缓存, 否则通过tmdb_id获取tmdb信息
+                            if str(history.tmdbid) in genre_cache:
+                                genre_ids = genre_cache.get(str(history.tmdbid))
+                            else:
+                                tmdb_info = self.chain.tmdb_info(mtype=history_type, tmdbid=history.tmdbid)
+                                if tmdb_info:
+                                    genre_ids = tmdb_info.get("genre_ids")
+                                    genre_cache[str(history.tmdbid)] = genre_ids
                         _cat = self._genre_ids_get_cat(history.type, genre_ids)
 
                     # 去除种子已经存在的标签
@@ -311,15 +367,173 @@ class DownloadSiteTag(_PluginBase):
                     # 判断当前种子是否不需要修改
                     if not _cat and not _tags:
                         continue
-                    # 执行通用方法, 设置种子标签与分类
-                    self._set_torrent_info(service=service, _hash=_hash, _torrent=torrent, _tags=_tags, _cat=_cat,
-                                           _original_tags=torrent_tags)
+                    # 按标签集合与分类分组, 分析完成后批量设置
+                    if _tags:
+                        if service.type != "qbittorrent" and torrent_tags:
+                            # tr设置的是全部标签, 因此需要合并原始标签
+                            _tags = list(set(torrent_tags).union(set(_tags)))
+                        tag_groups.setdefault(tuple(sorted(_tags)), []).append(_hash)
+                    if _cat:
+                        cat_groups.setdefault(_cat, []).append(_hash)
                 except Exception as e:
                     logger.error(
                         f"{self.LOG_TAG}分析种子信息时发生了错误: {str(e)}")
+            # 批量设置种子标签与分类
+            self._batch_set_torrent_info(service=service, tag_groups=tag_groups, cat_groups=cat_groups)
+            # 记录已处理到的位置
+            high_water[downloader] = self._update_mark(torrents=torrents, dl_type=service.type, mark=mark)
+            self.save_data("high_water", high_water)
 
+        if len(genre_cache) != genre_count:
+            # 只保留最近的记录
+            if len(genre_cache) > self._genre_cache_size:
+                genre_cache = dict(list(genre_cache.items())[-self._genre_cache_size:])
+            self.save_data("genre_cache", genre_cache)
         logger.info(f"{self.LOG_TAG}执行完成")
 
+    def _incremental_torrents(self, torrents: list, dl_type: str, mark: dict) -> Tuple[list, Dict[tuple, list]]:
+        """
+        筛选上次处理位置之后添加的种子
+        :return: 新增种子, 以及与新增种子同名同大小的已处理种子hash(按添加时间排序)
+        """
+        added = mark.get("added") or 0
+        added_hashes = set(mark.get("hashes") or [])
+        new_torrents = []
+        old_torrents = []
+        for torrent in torrents:
+            torrent_added = self._get_added(torrent=torrent, dl_type=dl_type)
+            if torrent_added > added \
+                    or (torrent_added == added and self._get_hash(torrent=torrent, dl_type=dl_type) not in added_hashes):
+                new_torrents.append(torrent)
+            else:
+                old_torrents.append(torrent)
+        new_keys = {self._torrent_key(torrent=torrent, dl_type=dl_type) for torrent in new_torrents}
+        new_keys.discard(None)
+        original_hashes = {}
+        if new_keys:
+            for torrent in self._torrents_sort(
+                    torrents=[torrent for torrent in old_torrents
+                              if self._torrent_key(torrent=torrent, dl_type=dl_type) in new_keys],
+                    dl_type=dl_type):
+                original_hashes.setdefault(self._torrent_key(torrent=torrent, dl_type=dl_type), []).append(
+                    self._get_hash(torrent=torrent, dl_type=dl_type))
+        return new_torrents, original_hashes
+
+    def _update_mark(self, torrents: list, dl_type: str, mark: dict) -> dict:
+        """
+        更新下载器已处理到的位置: 最新的添加时间, 以及该时间添加的种子hash
+        """
+        added = mark.get("added") or 0
+        hashes = set(mark.get("hashes") or [])
+        for torrent in torrents:
+            torrent_added = self._get_added(torrent=torrent, dl_type=dl_type)
+            if torrent_added > added:
+                added = torrent_added
+                hashes = set()
+            if torrent_added == added:
+                hashes.add(self._get_hash(torrent=torrent, dl_type=dl_type))
+        return {
+            "added": added,
+            "hashes": list(hashes),
+            "full_time": mark.get("full_time")
+        }
+
+    @db_query
+    def _get_histories(self, hashes: List[str], db: Session = None) -> Dict[str, DownloadHistory]:
+        """
+        批量获取种子hash对应的下载历史, 分批使用IN查询, 同一hash存在多条记录时取最新的一条
+        """
+        histories = {}
+        hashes = list({_hash for _hash in hashes if _hash})
+        for i in range(0, len(hashes), self._history_chunk_size):
+            chunk = hashes[i:i + self._history_chunk_size]
+            try:
+                result = (
+                    db.query(DownloadHistory)
+                    .filter(DownloadHistory.download_hash.in_(chunk))
+                    .order_by(DownloadHistory.date.desc())
+                    .all()
+                )
+            except Exception as e:
+                logger.error(f"{self.LOG_TAG}批量获取下载历史失败: {str(e)}")
+                continue
+            for history in result:
+                histories.setdefault(history.download_hash, history)
+        logger.info(f"{self.LOG_TAG}共 {len(hashes)} 个种子, 查询到 {len(histories)} 条下载历史")
+        return histories
+
+    def _get_site_domains(self) -> Dict[str, str]:
+        """
+        预先生成站点域名与站点名称的对应关系
+        """
+        site_domains = {}
+        for indexer in self.sites_helper.get_indexers():
+            domain = StringUtils.get_url_domain(indexer.get("domain"))
+            if domain and indexer.get("name"):
+                site_domains.setdefault(domain, indexer.get("name"))
+        return site_domains
+
+    def _get_tracker_site(self, tracker: str, site_domains: Dict[str, str],
+                          tracker_sites: Dict[str, Optional[str]]) -> Optional[str]:
+        """
+        通过tracker获取站点名称, 结果在本次运行中缓存
+        """
+        if tracker in tracker_sites:
+            return tracker_sites[tracker]
+        # 检查tracker是否包含特定的关键字，并进行相应的映射
+        for key, mapped_domain in self._tracker_mappings.items():
+            if key in tracker:
+                domain = mapped_domain
+                break
+        else:
+            domain = StringUtils.get_url_domain(tracker)
+        site_name = site_domains.get(domain)
+        if not site_name:
+            site_info = self.sites_helper.get_indexer(domain)
+            site_name = site_info.get("name") if site_info else None
+        tracker_sites[tracker] = site_name
+        return site_name
+
+    def _batch_set_torrent_info(self, service: ServiceInfo, tag_groups: Dict[Tuple[str, ...], List[str]],
+                                cat_groups: Dict[str, List[str]]):
+        """
+        批量设置种子标签与分类, 每个标签集合或分类按批次调用一次下载器接口
+        """
+        if not service or not service.instance or (not tag_groups and not cat_groups):
+            return
+        downloader_obj = service.instance
+        for _tags, hashes in tag_groups.items():
+            for i in range(0, len(hashes), self._apply_chunk_size):
+                chunk = hashes[i:i + self._apply_chunk_size]
+                try:
+                    # 下载器api不通用, 因此需分开处理
+                    if service.type == "qbittorrent":
+                        downloader_obj.set_torrents_tag(ids=chunk, tags=list(_tags))
+                    else:
+                        downloader_obj.set_torrent_tag(ids=chunk, tags=list(_tags))
+                except Exception as e:
+                    logger.error(f"{self.LOG_TAG}下载器: {service.name} 设置标签 {','.join(_tags)} 失败: {str(e)}")
+                    continue
+            logger.warn(f"{self.LOG_TAG}下载器: {service.name} 标签: {','.join(_tags)} 种子数: {len(hashes)}")
+        # 设置分类 <tr暂不支持>
+        if service.type != "qbittorrent":
+            return
+        for _cat, hashes in cat_groups.items():
+            for i in range(0, len(hashes), self._apply_chunk_size):
+                chunk = hashes[i:i + self._apply_chunk_size]
+                # 尝试设置种子分类, 如果失败, 则创建再设置一遍
+                try:
+                    downloader_obj.qbc.torrents_set_category(category=_cat, torrent_hashes=chunk)
+                except Exception as e:
+                    logger.warn(f"下载器 {service.name} 设置分类 {_cat} 失败：{str(e)}, 尝试创建分类再设置 ...")
+                    try:
+                        downloader_obj.qbc.torrents_createCategory(name=_cat)
+                        downloader_obj.qbc.torrents_set_category(category=_cat, torrent_hashes=chunk)
+                    except Exception as err:
+                        logger.error(f"{self.LOG_TAG}下载器: {service.name} 设置分类 {_cat} 失败: {str(err)}")
+                        continue
+            logger.warn(f"{self.LOG_TAG}下载器: {service.name} 分类: {_cat} 种子数: {len(hashes)}")
+
     def _genre_ids_get_cat(self, mtype, genre_ids=None):
         """
         根据genre_ids判断是否<动漫>分类
@@ -366,6 +580,19 @@ class DownloadSiteTag(_PluginBase):
             torrents = sorted(torrents, key=lambda x: x.added_date, reverse=False)
         return torrents
 
+    @staticmethod
+    def _get_added(torrent: Any, dl_type: str) -> int:
+        """
+        获取种子添加时间戳
+        """
+        try:
+            if dl_type == "qbittorrent":
+                return int(torrent.get("added_on") or 0)
+            return int(torrent.added_date.timestamp()) if torrent.added_date else 0
+        except Exception as e:
+            print(str(e))
+            return 0
+
     @staticmethod
     def _get_hash(torrent: Any, dl_type: str):
         """
@@ -739,6 +966,27 @@ class DownloadSiteTag(_PluginBase):
                             }
                         ]
                     },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'full_days',
+                                            'label': '全量补全间隔(天), 其余只处理新增种子, 0为每次全量',
+                                            'placeholder': '7'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
                     {
                         'component': 'VRow',
                         'content': [
@@ -837,7 +1085,8 @@ class DownloadSiteTag(_PluginBase):
             "interval": "计划任务",
             "interval_cron": "5 4 * * *",
             "interval_time": "6",
-            "interval_unit": "小时"
+            "interval_unit": "小时",
+            "full_days": "7"
         }
 
     def get_page(self) -> List[dict]:
@@ -1,7 +1,10 @@
+import copy
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from pathlib import Path
 from threading import Event
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
 
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
@@ -10,11 +13,14 @@ from apscheduler.triggers.cron import CronTrigger
 from app import schemas
 from app.chain.media import MediaChain
 from app.core.config import settings
+from app.core.context import MediaInfo
 from app.core.metainfo import MetaInfoPath
 from app.db.transferhistory_oper import TransferHistoryOper
 from app.helper.nfo import NfoReader
 from app.log import logger
 from app.plugins import _PluginBase
+from app.plugins.libraryscraper.cache import RecognizeCache
+from app.plugins.libraryscraper.manifest import ScrapeManifest
 from app.schemas import MediaType
 from app.utils.system import SystemUtils
 
@@ -27,7 +33,7 @@ class LibraryScraper(_PluginBase):
     # 插件图标
     plugin_icon = "scraper.png"
     # 插件版本
-    plugin_version = "2.1"
+    plugin_version = "2.3"
     # 插件作者
     plugin_author = "jxxghp"
     # 作者主页
@@ -51,6 +57,8 @@ class LibraryScraper(_PluginBase):
     _mode = ""
     _scraper_paths = ""
     _exclude_paths = ""
+    # 并发刮削的目录数
+    _workers = 4
     # 退出事件
     _event = Event()
 
@@ -64,6 +72,10 @@ class LibraryScraper(_PluginBase):
             self._mode = config.get("mode") or ""
             self._scraper_paths = config.get("scraper_paths") or ""
             self._exclude_paths = config.get("exclude_paths") or ""
+            try:
+                self._workers = max(int(config.get("workers") or 4), 1)
+            except ValueError:
+                self._workers = 4
 
         # 停止现有任务
         self.stop_service()
@@ -77,7 +89,7 @@ class LibraryScraper(_PluginBase):
                 self._scheduler = BackgroundScheduler(timezone=settings.TZ)
                 self._scheduler.add_job(func=self.__libraryscraper, trigger='date',
                                         run_date=datetime.now(tz=pytz.timezone(settings.TZ)) + timedelta(seconds=3),
-                                        name="媒体库刮削")
+                                        name="媒体库刮削", kwargs={"full": True})
                 # 关闭一次性开关
                 self._onlyonce = False
                 self.update_config({
@@ -86,7 +98,8 @@ class LibraryScraper(_PluginBase):
                     "cron": self._cron,
                     "mode": self._mode,
                     "scraper_paths": self._scraper_paths,
-                    "exclude_paths": self._exclude_paths
+                    "exclude_paths": self._exclude_paths,
+                    "workers": self._workers
                 })
                 if self._scheduler.get_jobs():
                     # 启动服务
@@ -181,7 +194,7 @@ class LibraryScraper(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    'md': 6
+                                    'md': 4
                                 },
                                 'content': [
                                     {
@@ -201,7 +214,7 @@ class LibraryScraper(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    'md': 6
+                                    'md': 4
                                 },
                                 'content': [
                                     {
@@ -213,6 +226,23 @@ class LibraryScraper(_PluginBase):
                                         }
                                     }
                                 ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'workers',
+                                            'label': '并发刮削数',
+                                            'placeholder': '4'
+                                        }
+                                    }
+                                ]
                             }
                         ]
                     },
@@ -276,6 +306,7 @@ class LibraryScraper(_PluginBase):
                                             'variant': 'tonal',
                                             'text': '刮削路径后拼接#电视剧/电影，强制指定该媒体路径媒体类型。'
                                                     '不加默认根据文件名自动识别媒体类型。'
+                                                    '定时任务只刮削新增、文件有变化或缺少nfo的目录，立即运行一次时全量刮削。'
                                         }
                                     }
                                 ]
@@ -289,15 +320,17 @@ class LibraryScraper(_PluginBase):
             "cron": "0 0 */7 * *",
             "mode": "",
             "scraper_paths": "",
-            "err_hosts": ""
+            "err_hosts": "",
+            "workers": 4
         }
 
     def get_page(self) -> List[dict]:
         pass
 
-    def __libraryscraper(self):
+    def __libraryscraper(self, full: bool = False):
         """
         开始刮削媒体库
+        :param full: 是否全量刮削，否则只刮削新增或有变化的目录
         """
         if not self._scraper_paths:
             return
@@ -305,8 +338,11 @@ class LibraryScraper(_PluginBase):
         exclude_paths = self._exclude_paths.split("\n")
         # 已选择的目录
         paths = self._scraper_paths.split("\n")
-        # 需要适削的媒体文件夹
-        scraper_paths = []
+        # 刮削清单
+        manifest = ScrapeManifest(self)
+        # 需要适削的媒体文件夹：(目录, 媒体类型) -> {媒体文件相对路径: 修改时间}
+        scraper_paths: Dict[Tuple[Path, MediaType], Dict[str, int]] = {}
+        roots = []
         for path in paths:
             if not path:
                 continue
@@ -323,6 +359,7 @@ class LibraryScraper(_PluginBase):
             if not scraper_path.exists():
                 logger.warning(f"媒体库刮削路径不存在：{path}")
                 continue
+            roots.append(scraper_path)
             logger.info(f"开始检索目录：{path} {mtype} ...")
             # 遍历所有文件
             files = SystemUtils.list_files(scraper_path, settings.RMT_MEDIAEXT)
@@ -343,30 +380,95 @@ class LibraryScraper(_PluginBase):
                     logger.debug(f"{file_path} 在排除目录中，跳过 ...")
                     continue
                 # 识别是电影还是电视剧
-                if not mtype:
-                    file_meta = MetaInfoPath(file_path)
-                    mtype = file_meta.type
-                if mtype == MediaType.TV:
-                    dir_item = (file_path.parent.parent, mtype)
-                    if dir_item not in scraper_paths:
-                        logger.info(f"发现电视剧目录：{dir_item}")
-                        scraper_paths.append(dir_item)
+                file_mtype = mtype or MetaInfoPath(file_path).type
+                if file_mtype == MediaType.TV:
+                    dir_item = (file_path.parent.parent, file_mtype)
                 else:
-                    dir_item = (file_path.parent, mtype)
-                    if dir_item not in scraper_paths:
-                        logger.info(f"发现电影目录：{dir_item}")
-                        scraper_paths.append(dir_item)
+                    dir_item = (file_path.parent, file_mtype)
+                if dir_item not in scraper_paths:
+                    logger.info(f"发现{'电视剧' if file_mtype == MediaType.TV else '电影'}目录：{dir_item}")
+                    scraper_paths[dir_item] = {}
+                try:
+                    scraper_paths[dir_item][file_path.relative_to(dir_item[0]).as_posix()] = \
+                        int(file_path.stat().st_mtime)
+                except OSError:
+                    continue
+        # 清理已不存在的目录
+        stale_paths = manifest.stale(roots, {str(item[0]) for item in scraper_paths})
+        if stale_paths:
+            logger.info(f"以下目录已不存在，从刮削清单中移除：{stale_paths}")
         # 开始刮削
         if scraper_paths:
-            for item in scraper_paths:
-                logger.info(f"开始刮削目录：{item[0]} ...")
-                self.__scrape_dir(path=item[0], mtype=item[1])
+            if full:
+                changed_paths = list(scraper_paths.keys())
+            else:
+                changed_paths = [item for item, files in scraper_paths.items()
+                                 if manifest.changed(path=item[0], mtype=item[1], files=files)]
+            logger.info(f"共发现 {len(scraper_paths)} 个目录，需要刮削 {len(changed_paths)} 个，"
+                        f"未变化跳过 {len(scraper_paths) - len(changed_paths)} 个")
+            self.__scrape_dirs(items=changed_paths, scraper_paths=scraper_paths, manifest=manifest)
         else:
             logger.info(f"未发现需要刮削的目录")
+        manifest.save()
 
-    def __scrape_dir(self, path: Path, mtype: MediaType):
+    def __scrape_dirs(self, items: List[Tuple[Path, MediaType]],
+                      scraper_paths: Dict[Tuple[Path, MediaType], Dict[str, int]],
+                      manifest: ScrapeManifest):
+        """
+        并发刮削多个目录，刮削结果在当前线程更新到清单
+        """
+        if not items:
+            return
+        cache = RecognizeCache()
+        # 目录 -> 耗时
+        costs: List[Tuple[float, Path]] = []
+        success = failed = 0
+        begin = time.time()
+
+        def __scrape(item: Tuple[Path, MediaType]) -> Tuple[Optional[int], float]:
+            if self._event.is_set():
+                return None, 0
+            start = time.time()
+            logger.info(f"开始刮削目录：{item[0]} ...")
+            try:
+                return self.__scrape_dir(path=item[0], mtype=item[1], cache=cache), time.time() - start
+            except Exception as err:
+                logger.error(f"刮削目录 {item[0]} 出错：{str(err)}")
+                return None, time.time() - start
+
+        executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="LibraryScraper")
+        try:
+            futures = {executor.submit(__scrape, item): item for item in items}
+            for future in as_completed(futures):
+                item = futures[future]
+                tmdbid, cost = future.result()
+                if self._event.is_set():
+                    logger.info(f"媒体库刮削服务停止")
+                    break
+                costs.append((cost, item[0]))
+                logger.info(f"{item[0]} 耗时 {cost:.1f} 秒")
+                if tmdbid:
+                    success += 1
+                    manifest.update(path=item[0], mtype=item[1], files=scraper_paths[item], tmdbid=tmdbid)
+                else:
+                    failed += 1
+        finally:
+            # 停止时取消未开始的目录
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        total = time.time() - begin
+        costs.sort(key=lambda x: x[0], reverse=True)
+        logger.info(f"刮削完成：成功 {success} 个，失败 {failed} 个，总耗时 {total:.1f} 秒，"
+                    f"平均每个目录 {sum(c for c, _ in costs) / len(costs) if costs else 0:.1f} 秒，"
+                    f"识别缓存命中 {cache.hits} 次")
+        if costs:
+            logger.info("耗时最长的目录：" + "，".join(f"{path} {cost:.1f}秒" for cost, path in costs[:5]))
+
+    def __scrape_dir(self, path: Path, mtype: MediaType, cache: RecognizeCache = None) -> Optional[int]:
         """
         削刮一个目录，该目录必须是媒体文件目录
+        :param cache: 识别结果缓存，同一媒体只识别和获取图片一次
+        :return: 刮削成功时返回tmdbid
         """
         # 优先读取本地nfo文件
         tmdbid = None
@@ -383,27 +485,42 @@ class LibraryScraper(_PluginBase):
             tv_nfo = path / "tvshow.nfo"
             if tv_nfo.exists():
                 tmdbid = self.__get_tmdbid_from_nfo(tv_nfo)
+        meta = None
         if tmdbid:
-            # 按TMDBID识别
             logger.info(f"读取到本地nfo文件的tmdbid：{tmdbid}")
-            mediainfo = self.chain.recognize_media(tmdbid=tmdbid, mtype=mtype)
+            cache_key = ("tmdb", str(tmdbid), mtype)
         else:
-            # 按名称识别
             meta = MetaInfoPath(path)
             meta.type = mtype
-            mediainfo = self.chain.recognize_media(meta=meta)
+            cache_key = ("meta", meta.name, meta.year, mtype)
+
+        def __recognize() -> Optional[MediaInfo]:
+            if tmdbid:
+                # 按TMDBID识别
+                _mediainfo = self.chain.recognize_media(tmdbid=tmdbid, mtype=mtype)
+            else:
+                # 按名称识别
+                _mediainfo = self.chain.recognize_media(meta=meta)
+            if not _mediainfo or self._event.is_set():
+                return _mediainfo
+            # 如果未开启新增已入库媒体是否跟随TMDB信息变化则根据tmdbid查询之前的title
+            if not settings.SCRAP_FOLLOW_TMDB:
+                transfer_history = self.transferhis.get_by_type_tmdbid(tmdbid=_mediainfo.tmdb_id,
+                                                                       mtype=_mediainfo.type.value)
+                if transfer_history:
+                    _mediainfo.title = transfer_history.title
+            # 获取图片
+            self.chain.obtain_images(_mediainfo)
+            return _mediainfo
+
+        mediainfo: MediaInfo = cache.get(cache_key, __recognize) if cache else __recognize()
         if not mediainfo:
             logger.warn(f"未识别到媒体信息：{path}")
-            return
-
-        # 如果未开启新增已入库媒体是否跟随TMDB信息变化则根据tmdbid查询之前的title
-        if not settings.SCRAP_FOLLOW_TMDB:
-            transfer_history = self.transferhis.get_by_type_tmdbid(tmdbid=mediainfo.tmdb_id,
-                                                                   mtype=mediainfo.type.value)
-            if transfer_history:
-                mediainfo.title = transfer_history.title
-        # 获取图片
-        self.chain.obtain_images(mediainfo)
+            return None
+        if self._event.is_set():
+            return None
+        # 同一媒体的多个目录共享识别结果，刮削时各自使用副本
+        mediainfo = copy.deepcopy(mediainfo)
         # 刮削
         self.mediachain.scrape_metadata(
             fileitem=schemas.FileItem(
@@ -418,6 +535,7 @@ class LibraryScraper(_PluginBase):
             overwrite=True if self._mode else False
         )
         logger.info(f"{path} 刮削完成")
+        return mediainfo.tmdb_id
 
     @staticmethod
     def __get_tmdbid_from_nfo(file_path: Path):
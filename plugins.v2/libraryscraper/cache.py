@@ -0,0 +1,30 @@
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable
+
+
+class RecognizeCache:
+    """
+    单次刮削任务内的识别结果缓存
+    同一tmdbid或同一名称年份的多个目录并发识别时，只有第一个目录真正查询，其余等待其结果
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._values: Dict[Hashable, Any] = {}
+        self._key_locks: Dict[Hashable, Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, Lock())
+        with key_lock:
+            with self._lock:
+                if key in self._values:
+                    self.hits += 1
+                    return self._values[key]
+                self.misses += 1
+            value = loader()
+            with self._lock:
+                self._values[key] = value
+            return value
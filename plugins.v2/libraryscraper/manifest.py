@@ -0,0 +1,87 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.schemas import MediaType
+
+
+class ScrapeManifest:
+    """
+    媒体库刮削清单
+    按目录记录媒体文件及修改时间、tmdbid和刮削时间，定时刮削时只处理新增、文件有变化或缺少nfo的目录
+    """
+
+    def __init__(self, plugin: Any, key: str = "manifest"):
+        """
+        :param plugin: 插件实例，用于读写插件数据
+        :param key: 插件数据键
+        """
+        self._plugin = plugin
+        self._key = key
+        # 目录 -> {"type", "files": {相对路径: 修改时间}, "tmdbid", "time"}
+        self._dirs: Dict[str, dict] = plugin.get_data(key) or {}
+
+    def __len__(self):
+        return len(self._dirs)
+
+    @staticmethod
+    def __nfo_exists(path: Path, mtype: MediaType, files: Dict[str, int]) -> bool:
+        """
+        刮削生成的nfo是否存在
+        """
+        if mtype == MediaType.TV:
+            return (path / "tvshow.nfo").exists()
+        for name in files:
+            if (path / name).with_suffix(".nfo").exists():
+                return True
+        return (path / "movie.nfo").exists()
+
+    def changed(self, path: Path, mtype: MediaType, files: Dict[str, int]) -> bool:
+        """
+        目录是否需要刮削
+        :param path: 媒体目录
+        :param mtype: 媒体类型
+        :param files: 媒体文件相对路径 -> 修改时间
+        """
+        item = self._dirs.get(str(path))
+        if not item:
+            return True
+        if item.get("type") != (mtype.value if mtype else None):
+            return True
+        if item.get("files") != files:
+            return True
+        return not self.__nfo_exists(path, mtype, files)
+
+    def update(self, path: Path, mtype: MediaType, files: Dict[str, int], tmdbid: Optional[int]):
+        """
+        记录目录已刮削
+        """
+        self._dirs[str(path)] = {
+            "type": mtype.value if mtype else None,
+            "files": files,
+            "tmdbid": tmdbid,
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+    def stale(self, roots: List[Path], found: set) -> List[str]:
+        """
+        清理已不存在的目录
+        :param roots: 本次检索的刮削路径
+        :param found: 本次检索到的目录
+        :return: 已清理的目录
+        """
+        removed = []
+        for path in list(self._dirs.keys()):
+            if path in found:
+                continue
+            if any(Path(path).is_relative_to(root) for root in roots):
+                self._dirs.pop(path, None)
+                removed.append(path)
+        return removed
+
+    def save(self):
+        self._plugin.save_data(self._key, self._dirs)
+
+    def clear(self):
+        self._dirs = {}
+        self._plugin.del_data(self._key)
@@ -1,9 +1,10 @@
 from typing import List, Tuple, Dict, Any, Optional
 from enum import Enum
-from urllib.parse import urlparse
-import urllib
+from app import schemas
 from app.log import logger
 from app.plugins import _PluginBase
+from app.plugins.qbcommand.site_resolver import SiteResolver
+from app.plugins.qbcommand.state_tracker import TorrentStateTracker
 from app.schemas import NotificationType, ServiceInfo
 from app.schemas.types import EventType
 from apscheduler.triggers.cron import CronTrigger
@@ -17,7 +18,6 @@ from app.helper.downloader import DownloaderHelper
 from datetime import datetime, timedelta
 
 import pytz
-import time
 
 
 class QbCommand(_PluginBase):
@@ -28,7 +28,7 @@ class QbCommand(_PluginBase):
     # 插件图标
     plugin_icon = "Qbittorrent_A.png"
     # 插件版本
-    plugin_version = "2.1"
+    plugin_version = "2.3"
     # 插件作者
     plugin_author = "DzAvril"
     # 作者主页
@@ -62,10 +62,15 @@ class QbCommand(_PluginBase):
     _multi_level_root_domain = ["edu.cn", "com.cn", "net.cn", "org.cn"]
     _scheduler = None
     _exclude_dirs = ""
+    # 下载器名称 -> 种子状态跟踪器
+    _state_trackers: Dict[str, TorrentStateTracker] = {}
+    _resolver: SiteResolver = None
     def init_plugin(self, config: dict = None):
         self._sites = SitesHelper()
         self._siteoper = SiteOper()
         self.downloader_helper = DownloaderHelper()
+        self._state_trackers = {}
+        self._resolver = SiteResolver(self._multi_level_root_domain)
         # 停止现有任务
         self.stop_service()
         # 读取配置
@@ -321,7 +326,13 @@ class QbCommand(_PluginBase):
         return custom_sites
 
     def get_api(self) -> List[Dict[str, Any]]:
-        pass
+        return [{
+            "path": "/site_status",
+            "endpoint": self.site_status,
+            "methods": ["GET"],
+            "summary": "站点任务状态",
+            "description": "按站点汇总QB种子数量、大小和上传/下载速度",
+        }]
 
     def get_service(self) -> List[Dict[str, Any]]:
         """
@@ -373,62 +384,6 @@ class QbCommand(_PluginBase):
             ]
         return []
 
-    def get_all_torrents(self, service):
-        downloader_name = service.name
-        downloader_obj = service.instance
-        all_torrents, error = downloader_obj.get_torrents()
-        if error:
-            logger.error(f"获取下载器:{downloader_name}种子失败: {error}")
-            if self._notify:
-                self.post_message(
-                    mtype=NotificationType.SiteMessage,
-                    title=f"【QB远程操作】",
-                    text=f"获取下载器:{downloader_name}种子失败，请检查下载器配置",
-                )
-            return []
-
-        if not all_torrents:
-            logger.warning(f"下载器:{downloader_name}没有种子")
-            if self._notify:
-                self.post_message(
-                    mtype=NotificationType.SiteMessage,
-                    title=f"【QB远程操作】",
-                    text=f"下载器:{downloader_name}中没有种子",
-                )
-            return []
-        return all_torrents
-
-    @staticmethod
-    def get_torrents_status(torrents):
-        downloading_torrents = []
-        uploading_torrents = []
-        paused_torrents = []
-        checking_torrents = []
-        error_torrents = []
-        for torrent in torrents:
-            if torrent.state_enum.is_uploading and not torrent.state_enum.is_paused:
-                uploading_torrents.append(torrent.get("hash"))
-            elif (
-                torrent.state_enum.is_downloading
-                and not torrent.state_enum.is_paused
-                and not torrent.state_enum.is_checking
-            ):
-                downloading_torrents.append(torrent.get("hash"))
-            elif torrent.state_enum.is_checking:
-                checking_torrents.append(torrent.get("hash"))
-            elif torrent.state_enum.is_paused:
-                paused_torrents.append(torrent.get("hash"))
-            elif torrent.state_enum.is_errored:
-                error_torrents.append(torrent.get("hash"))
-
-        return (
-            downloading_torrents,
-            uploading_torrents,
-            paused_torrents,
-            checking_torrents,
-            error_torrents,
-        )
-
     @eventmanager.register(EventType.PluginAction)
     def handle_pause_torrent(self, event: Event):
         if not self._enabled:
@@ -469,6 +424,40 @@ class QbCommand(_PluginBase):
                 return
         self.pause_torrent(self.TorrentType.CHECKING)
 
+    def get_state_tracker(self, service) -> Optional[TorrentStateTracker]:
+        """
+        获取下载器的种子状态跟踪器并增量同步
+        """
+        downloader_name = service.name
+        tracker = self._state_trackers.get(downloader_name)
+        if not tracker or tracker.qbc is not service.instance.qbc:
+            tracker = TorrentStateTracker(service.instance.qbc, resolver=self._resolver)
+            self._state_trackers[downloader_name] = tracker
+        try:
+            tracker.sync()
+        except Exception as e:
+            self._state_trackers.pop(downloader_name, None)
+            logger.error(f"获取下载器:{downloader_name}种子失败: {str(e)}")
+            if self._notify:
+                self.post_message(
+                    mtype=NotificationType.SiteMessage,
+                    title=f"【QB远程操作】",
+                    text=f"获取下载器:{downloader_name}种子失败，请检查下载器配置",
+                )
+            return None
+        return tracker
+
+    @staticmethod
+    def status_text(status: Dict[str, int]) -> str:
+        return (
+            f"种子总数:  {status.get('total')} \n"
+            f"做种数量:  {status.get(TorrentStateTracker.UPLOADING)}\n"
+            f"下载数量:  {status.get(TorrentStateTracker.DOWNLOADING)}\n"
+            f"检查数量:  {status.get(TorrentStateTracker.CHECKING)}\n"
+            f"暂停数量:  {status.get(TorrentStateTracker.PAUSED)}\n"
+            f"错误数量:  {status.get(TorrentStateTracker.ERROR)}\n"
+        )
+
     def pause_torrent(self, type: TorrentType = TorrentType.ALL):
         if not self._enabled:
             return
@@ -476,39 +465,29 @@ class QbCommand(_PluginBase):
             downloader_name = service.name
             downloader_obj = service.instance
             if not downloader_obj:
-                logger.error(f"{self.LOG_TAG} 获取下载器失败 {downloader_name}")
+                logger.error(f"获取下载器失败 {downloader_name}")
                 continue
-            all_torrents = self.get_all_torrents(service)
-            hash_downloading, hash_uploading, hash_paused, hash_checking, hash_error = (
-                self.get_torrents_status(all_torrents)
-            )
-
+            tracker = self.get_state_tracker(service)
+            if not tracker:
+                continue
+            status_text = self.status_text(tracker.status())
             logger.info(
                 f"下载器{downloader_name}暂定任务启动 \n"
-                f"种子总数:  {len(all_torrents)} \n"
-                f"做种数量:  {len(hash_uploading)}\n"
-                f"下载数量:  {len(hash_downloading)}\n"
-                f"检查数量:  {len(hash_checking)}\n"
-                f"暂停数量:  {len(hash_paused)}\n"
-                f"错误数量:  {len(hash_error)}\n"
+                f"{status_text}"
                 f"暂停操作中请稍等...\n",
             )
             if self._notify:
                 self.post_message(
                     mtype=NotificationType.SiteMessage,
                     title=f"【下载器{downloader_name}暂停任务启动】",
-                    text=f"种子总数:  {len(all_torrents)} \n"
-                    f"做种数量:  {len(hash_uploading)}\n"
-                    f"下载数量:  {len(hash_downloading)}\n"
-                    f"检查数量:  {len(hash_checking)}\n"
-                    f"暂停数量:  {len(hash_paused)}\n"
-                    f"错误数量:  {len(hash_error)}\n"
+                    text=f"{status_text}"
                     f"暂停操作中请稍等...\n",
                 )
-            pause_torrents = self.filter_pause_torrents(all_torrents)
-            hash_downloading, hash_uploading, hash_paused, hash_checking, hash_error = (
-                self.get_torrents_status(pause_torrents)
-            )
+            pause_torrents = self.filter_pause_torrents(tracker.torrents())
+            hashes = tracker.split(pause_torrents)
+            hash_downloading = hashes[TorrentStateTracker.DOWNLOADING]
+            hash_uploading = hashes[TorrentStateTracker.UPLOADING]
+            hash_checking = hashes[TorrentStateTracker.CHECKING]
             if type == self.TorrentType.DOWNLOADING:
                 to_be_paused = hash_downloading
             elif type == self.TorrentType.UPLOADING:
@@ -519,7 +498,7 @@ class QbCommand(_PluginBase):
                 to_be_paused = hash_downloading + hash_uploading + hash_checking
 
             if len(to_be_paused) > 0:
-                if downloader_obj.stop_torrents(ids=to_be_paused):
+                if tracker.apply(downloader_obj.stop_torrents, to_be_paused):
                     logger.info(f"暂停了{len(to_be_paused)}个种子")
                 else:
                     logger.error(f"下载器{downloader_name}暂停种子失败")
@@ -529,33 +508,21 @@ class QbCommand(_PluginBase):
                             title=f"【远程操作】",
                             text=f"下载器{downloader_name}暂停种子失败",
                         )
-            # 每个种子等待1ms以让状态切换成功,至少等待1S
-            wait_time = 0.001 * len(to_be_paused) + 1
-            time.sleep(wait_time)
+                # 轮询确认状态切换完成
+                pending = tracker.wait(to_be_paused, paused=True)
+                if pending:
+                    logger.warning(f"下载器{downloader_name}有{len(pending)}个种子未能在超时时间内暂停")
 
-            all_torrents = self.get_all_torrents(service)
-            hash_downloading, hash_uploading, hash_paused, hash_checking, hash_error = (
-                self.get_torrents_status(all_torrents)
-            )
+            status_text = self.status_text(tracker.status())
             logger.info(
                 f"下载器{downloader_name}暂定任务完成 \n"
-                f"种子总数:  {len(all_torrents)} \n"
-                f"做种数量:  {len(hash_uploading)}\n"
-                f"下载数量:  {len(hash_downloading)}\n"
-                f"检查数量:  {len(hash_checking)}\n"
-                f"暂停数量:  {len(hash_paused)}\n"
-                f"错误数量:  {len(hash_error)}\n"
+                f"{status_text}"
             )
             if self._notify:
                 self.post_message(
                     mtype=NotificationType.SiteMessage,
                     title=f"【下载器{downloader_name}暂停任务完成】",
-                    text=f"种子总数:  {len(all_torrents)} \n"
-                    f"做种数量:  {len(hash_uploading)}\n"
-                    f"下载数量:  {len(hash_downloading)}\n"
-                    f"检查数量:  {len(hash_checking)}\n"
-                    f"暂停数量:  {len(hash_paused)}\n"
-                    f"错误数量:  {len(hash_error)}\n",
+                    text=status_text,
                 )
 
     def __is_excluded(self, file_path) -> bool:
@@ -592,74 +559,51 @@ class QbCommand(_PluginBase):
             downloader_name = service.name
             downloader_obj = service.instance
             if not downloader_obj:
-                logger.error(f"{self.LOG_TAG} 获取下载器失败 {downloader_name}")
+                logger.error(f"获取下载器失败 {downloader_name}")
                 continue
-            all_torrents = self.get_all_torrents(service)
-            hash_downloading, hash_uploading, hash_paused, hash_checking, hash_error = (
-                self.get_torrents_status(all_torrents)
-            )
+            tracker = self.get_state_tracker(service)
+            if not tracker:
+                continue
+            status_text = self.status_text(tracker.status())
             logger.info(
                 f"下载器{downloader_name}开始任务启动 \n"
-                f"种子总数:  {len(all_torrents)} \n"
-                f"做种数量:  {len(hash_uploading)}\n"
-                f"下载数量:  {len(hash_downloading)}\n"
-                f"检查数量:  {len(hash_checking)}\n"
-                f"暂停数量:  {len(hash_paused)}\n"
-                f"错误数量:  {len(hash_error)}\n"
+                f"{status_text}"
                 f"开始操作中请稍等...\n",
             )
             if self._notify:
                 self.post_message(
                     mtype=NotificationType.SiteMessage,
                     title=f"【下载器{downloader_name}开始任务启动】",
-                    text=f"种子总数:  {len(all_torrents)} \n"
-                    f"做种数量:  {len(hash_uploading)}\n"
-                    f"下载数量:  {len(hash_downloading)}\n"
-                    f"检查数量:  {len(hash_checking)}\n"
-                    f"暂停数量:  {len(hash_paused)}\n"
-                    f"错误数量:  {len(hash_error)}\n"
+                    text=f"{status_text}"
                     f"开始操作中请稍等...\n",
                 )
 
-            resume_torrents = self.filter_resume_torrents(all_torrents)
-            hash_downloading, hash_uploading, hash_paused, hash_checking, hash_error = (
-                self.get_torrents_status(resume_torrents)
-            )
-            if not downloader_obj.start_torrents(ids=hash_paused):
-                logger.error(f"下载器{downloader_name}开始种子失败")
-                if self._notify:
-                    self.post_message(
-                        mtype=NotificationType.SiteMessage,
-                        title=f"【QB远程操作】",
-                        text=f"下载器{downloader_name}开始种子失败",
-                    )
-            # 每个种子等待1ms以让状态切换成功,至少等待1S
-            wait_time = 0.001 * len(hash_paused) + 1
-            time.sleep(wait_time)
+            resume_torrents = self.filter_resume_torrents(tracker.torrents())
+            hash_paused = tracker.split(resume_torrents)[TorrentStateTracker.PAUSED]
+            if hash_paused:
+                if not tracker.apply(downloader_obj.start_torrents, hash_paused):
+                    logger.error(f"下载器{downloader_name}开始种子失败")
+                    if self._notify:
+                        self.post_message(
+                            mtype=NotificationType.SiteMessage,
+                            title=f"【QB远程操作】",
+                            text=f"下载器{downloader_name}开始种子失败",
+                        )
+                # 轮询确认状态切换完成
+                pending = tracker.wait(hash_paused, paused=False)
+                if pending:
+                    logger.warning(f"下载器{downloader_name}有{len(pending)}个种子未能在超时时间内开始")
 
-            all_torrents = self.get_all_torrents(service)
-            hash_downloading, hash_uploading, hash_paused, hash_checking, hash_error = (
-                self.get_torrents_status(all_torrents)
-            )
+            status_text = self.status_text(tracker.status())
             logger.info(
                 f"下载器{downloader_name}开始任务完成 \n"
-                f"种子总数:  {len(all_torrents)} \n"
-                f"做种数量:  {len(hash_uploading)}\n"
-                f"下载数量:  {len(hash_downloading)}\n"
-                f"检查数量:  {len(hash_checking)}\n"
-                f"暂停数量:  {len(hash_paused)}\n"
-                f"错误数量:  {len(hash_error)}\n"
+                f"{status_text}"
             )
             if self._notify:
                 self.post_message(
                     mtype=NotificationType.SiteMessage,
                     title=f"【下载器{downloader_name}开始任务完成】",
-                    text=f"种子总数:  {len(all_torrents)} \n"
-                    f"做种数量:  {len(hash_uploading)}\n"
-                    f"下载数量:  {len(hash_downloading)}\n"
-                    f"检查数量:  {len(hash_checking)}\n"
-                    f"暂停数量:  {len(hash_paused)}\n"
-                    f"错误数量:  {len(hash_error)}\n",
+                    text=status_text,
                 )
 
     def filter_resume_torrents(self, all_torrents):
@@ -669,28 +613,19 @@ class QbCommand(_PluginBase):
         if len(self._op_sites) == 0:
             return all_torrents
 
-        urls = [site.get("url") for site in self._op_sites]
-        op_sites_main_domains = []
-        for url in urls:
-            domain = StringUtils.get_url_netloc(url)
-            main_domain = self.get_main_domain(domain[1])
-            op_sites_main_domains.append(main_domain)
+        op_sites_main_domains = {self._resolver.url_main_domain(site.get("url")) for site in self._op_sites}
 
         torrents = []
         for torrent in all_torrents:
             if torrent.get("state") in ["pausedUP", "stoppedUP"]:
-                tracker_url = self.get_torrent_tracker(torrent)
-                if not tracker_url:
-                    logger.info(f"获取种子 {torrent.name} Tracker失败，不过滤该种子")
-                    torrents.append(torrent)
-                _, tracker_domain = StringUtils.get_url_netloc(tracker_url)
-                if not tracker_domain:
-                    logger.info(f"获取种子 {torrent.name} Tracker失败，不过滤该种子")
+                tracker_main_domain = self._resolver.resolve(torrent)
+                if not tracker_main_domain:
+                    logger.info(f"获取种子 {torrent.get('name')} Tracker失败，不过滤该种子")
                     torrents.append(torrent)
-                tracker_main_domain = self.get_main_domain(domain=tracker_domain)
+                    continue
                 if tracker_main_domain in op_sites_main_domains:
                     logger.info(
-                        f"种子 {torrent.name} 属于站点{tracker_main_domain}，不执行操作"
+                        f"种子 {torrent.get('name')} 属于站点{tracker_main_domain}，不执行操作"
                     )
                     continue
 
@@ -705,40 +640,78 @@ class QbCommand(_PluginBase):
             event_data = event.event_data
             if not event_data or event_data.get("action") != "qb_status":
                 return
+            self.qb_status(site=event_data.get("arg_str"))
+            return
         self.qb_status()
 
-    def qb_status(self):
+    def get_site_domain(self, site: str) -> Optional[str]:
+        """
+        站点名称或域名转换为站点主域名
+        """
+        if not site:
+            return None
+        site = site.strip()
+        for indexer in self._sites.get_indexers() + self.__custom_sites():
+            if indexer.get("name") == site:
+                return self._resolver.url_main_domain(indexer.get("url") or indexer.get("domain"))
+        if "://" in site:
+            return self._resolver.url_main_domain(site)
+        return self._resolver.main_domain(site)
+
+    def site_status(self, apikey: str, site: str = None) -> schemas.Response:
+        """
+        按站点汇总各下载器的种子状态
+        """
+        if apikey != settings.API_TOKEN:
+            return schemas.Response(success=False, message="API密钥错误")
+        if not self._enabled or not self.service_info:
+            return schemas.Response(success=False, message="插件未启用或没有可用的下载器")
+        site_domain = self.get_site_domain(site)
+        data = {}
+        for service in self.service_info.values():
+            tracker = self.get_state_tracker(service)
+            if tracker:
+                data[service.name] = tracker.site_stats(site_domain)
+        return schemas.Response(success=True, data=data)
+
+    @staticmethod
+    def site_status_text(site_stats: Dict[str, Dict[str, int]]) -> str:
+        return "".join(
+            f"{site or '未知站点'}:  {stat.get('count')}个  "
+            f"{StringUtils.str_filesize(stat.get('size'))}  "
+            f"↑{StringUtils.str_filesize(stat.get('upspeed'))}/s  "
+            f"↓{StringUtils.str_filesize(stat.get('dlspeed'))}/s\n"
+            for site, stat in sorted(site_stats.items(), key=lambda x: x[1].get("count"), reverse=True)
+        )
+
+    def qb_status(self, site: str = None):
         if not self._enabled:
             return
+        site_domain = self.get_site_domain(site)
         for service in self.service_info.values():
             downloader_name = service.name
             downloader_obj = service.instance
             if not downloader_obj:
-                logger.error(f"{self.LOG_TAG} 获取下载器失败 {downloader_name}")
+                logger.error(f"获取下载器失败 {downloader_name}")
                 continue
-            all_torrents = self.get_all_torrents(service)
-            hash_downloading, hash_uploading, hash_paused, hash_checking, hash_error = (
-                self.get_torrents_status(all_torrents)
-            )
+            tracker = self.get_state_tracker(service)
+            if not tracker:
+                continue
+            if site_domain:
+                # 指定站点时使用站点汇总
+                status_text = self.site_status_text(tracker.site_stats(site_domain)) \
+                    or f"{site_domain}:  没有种子\n"
+            else:
+                status_text = self.status_text(tracker.status())
             logger.info(
                 f"下载器{downloader_name}任务状态 \n"
-                f"种子总数:  {len(all_torrents)} \n"
-                f"做种数量:  {len(hash_uploading)}\n"
-                f"下载数量:  {len(hash_downloading)}\n"
-                f"检查数量:  {len(hash_checking)}\n"
-                f"暂停数量:  {len(hash_paused)}\n"
-                f"错误数量:  {len(hash_error)}\n"
+                f"{status_text}"
             )
             if self._notify:
                 self.post_message(
                     mtype=NotificationType.SiteMessage,
                     title=f"【下载器{downloader_name}任务状态】",
-                    text=f"种子总数:  {len(all_torrents)} \n"
-                    f"做种数量:  {len(hash_uploading)}\n"
-                    f"下载数量:  {len(hash_downloading)}\n"
-                    f"检查数量:  {len(hash_checking)}\n"
-                    f"暂停数量:  {len(hash_paused)}\n"
-                    f"错误数量:  {len(hash_error)}\n"
+                    text=status_text
                 )
 
     @eventmanager.register(EventType.PluginAction)
@@ -886,20 +859,7 @@ class QbCommand(_PluginBase):
         qb解析 tracker
         :return: tracker url
         """
-        if not torrent:
-            return None
-        tracker = torrent.get("tracker")
-        if tracker and len(tracker) > 0:
-            return tracker
-        magnet_uri = torrent.get("magnet_uri")
-        if not magnet_uri or len(magnet_uri) <= 0:
-            return None
-        magnet_uri_obj = urlparse(magnet_uri)
-        query = urllib.parse.parse_qs(magnet_uri_obj.query)
-        tr = query["tr"]
-        if not tr or len(tr) <= 0:
-            return None
-        return tr[0]
+        return SiteResolver.torrent_tracker(torrent)
 
     def get_main_domain(self, domain):
         """
@@ -907,17 +867,7 @@ class QbCommand(_PluginBase):
         :param domain: 原域名
         :return: 主域名
         """
-        if not domain:
-            return None
-        domain_arr = domain.split(".")
-        domain_len = len(domain_arr)
-        if domain_len < 2:
-            return None
-        root_domain, root_domain_len = self.match_multi_level_root_domain(domain=domain)
-        if root_domain:
-            return f"{domain_arr[-root_domain_len - 1]}.{root_domain}"
-        else:
-            return f"{domain_arr[-2]}.{domain_arr[-1]}"
+        return self._resolver.main_domain(domain)
 
     def match_multi_level_root_domain(self, domain):
         """
@@ -925,13 +875,7 @@ class QbCommand(_PluginBase):
         :param domain: 被匹配的域名
         :return: 匹配的根域名, 匹配的根域名长度
         """
-        if not domain or not self._multi_level_root_domain:
-            return None, 0
-        for root_domain in self._multi_level_root_domain:
-            if domain.endswith("." + root_domain):
-                root_domain_len = len(root_domain.split("."))
-                return root_domain, root_domain_len
-        return None, 0
+        return self._resolver.match_root_domain(domain)
 
     def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
         customSites = self.__custom_sites()
@@ -0,0 +1,108 @@
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+from app.utils.string import StringUtils
+
+
+class SiteResolver:
+    """
+    Tracker地址到站点主域名的解析
+    多级根域名（如edu.cn）构建为按域名段倒序的后缀树，单次匹配只需从右向左走一遍域名段；
+    Tracker地址和域名的解析结果都会缓存，暂停、开始和状态查询共用
+    """
+
+    def __init__(self, multi_level_root_domains: List[str]):
+        # 后缀树：域名段 -> 子节点，节点中的 None 键表示此处为一个根域名的结尾
+        self._trie: dict = {}
+        for root_domain in multi_level_root_domains or []:
+            node = self._trie
+            for label in reversed(root_domain.lower().split(".")):
+                node = node.setdefault(label, {})
+            node[None] = True
+        # 域名 -> 主域名
+        self._domains: Dict[str, Optional[str]] = {}
+        # Tracker地址或磁力链接 -> 主域名
+        self._trackers: Dict[str, Optional[str]] = {}
+
+    def match_root_domain(self, domain: str) -> Tuple[Optional[str], int]:
+        """
+        匹配最长的多级根域名
+        :return: 匹配的根域名, 匹配的根域名长度
+        """
+        if not domain:
+            return None, 0
+        labels = domain.lower().split(".")
+        node = self._trie
+        matched = 0
+        # 至少保留一段作为主域名，因此不匹配整个域名
+        for i, label in enumerate(reversed(labels[1:])):
+            node = node.get(label)
+            if node is None:
+                break
+            if None in node:
+                matched = i + 1
+        if not matched:
+            return None, 0
+        return ".".join(labels[-matched:]), matched
+
+    def main_domain(self, domain: str) -> Optional[str]:
+        """
+        获取域名的主域名
+        """
+        if not domain:
+            return None
+        if domain in self._domains:
+            return self._domains[domain]
+        domain_arr = domain.split(".")
+        if len(domain_arr) < 2:
+            main_domain = None
+        else:
+            root_domain, root_domain_len = self.match_root_domain(domain)
+            if root_domain:
+                main_domain = f"{domain_arr[-root_domain_len - 1]}.{root_domain}"
+            else:
+                main_domain = f"{domain_arr[-2]}.{domain_arr[-1]}"
+        self._domains[domain] = main_domain
+        return main_domain
+
+    def url_main_domain(self, url: str) -> Optional[str]:
+        """
+        获取地址的主域名
+        """
+        if not url:
+            return None
+        if url not in self._trackers:
+            _, domain = StringUtils.get_url_netloc(url)
+            self._trackers[url] = self.main_domain(domain)
+        return self._trackers[url]
+
+    @staticmethod
+    def torrent_tracker(torrent: dict) -> Optional[str]:
+        """
+        获取种子的Tracker地址，没有当前Tracker时从磁力链接中解析
+        """
+        if not torrent:
+            return None
+        tracker = torrent.get("tracker")
+        if tracker:
+            return tracker
+        magnet_uri = torrent.get("magnet_uri")
+        if not magnet_uri:
+            return None
+        tr = parse_qs(urlparse(magnet_uri).query).get("tr")
+        if not tr:
+            return None
+        return tr[0]
+
+    def resolve(self, torrent: dict) -> Optional[str]:
+        """
+        获取种子所属站点的主域名
+        """
+        if not torrent:
+            return None
+        key = torrent.get("tracker") or torrent.get("magnet_uri")
+        if not key:
+            return None
+        if key not in self._trackers:
+            self._trackers[key] = self.url_main_domain(self.torrent_tracker(torrent))
+        return self._trackers[key]
@@ -0,0 +1,221 @@
+import time
+from threading import Lock
+from typing import Dict, List, Optional, Set
+
+from qbittorrentapi import TorrentState
+
+from app.log import logger
+from app.plugins.qbcommand.site_resolver import SiteResolver
+
+
+class TorrentStateTracker:
+    """
+    基于qBittorrent sync/maindata增量接口的种子状态跟踪
+    首次同步获取全部种子，之后每次只获取rid之后发生变化的种子，
+    并维护各状态的种子hash集合，暂停/开始后只需轮询变化的种子即可确认结果；
+    指定站点解析器时同时按站点汇总种子数量、大小和上传/下载速度
+    """
+
+    # 影响站点汇总的字段
+    _SITE_FIELDS = ("tracker", "magnet_uri", "size", "upspeed", "dlspeed")
+
+    DOWNLOADING = "downloading"
+    UPLOADING = "uploading"
+    PAUSED = "paused"
+    CHECKING = "checking"
+    ERROR = "error"
+    STATES = (DOWNLOADING, UPLOADING, PAUSED, CHECKING, ERROR)
+
+    def __init__(self, qbc, chunk_size: int = 500, resolver: SiteResolver = None):
+        self._qbc = qbc
+        self._resolver = resolver
+        self._chunk_size = chunk_size
+        self._lock = Lock()
+        self._rid = 0
+        # hash -> 种子信息
+        self._torrents: Dict[str, dict] = {}
+        # 状态 -> hash集合
+        self._states: Dict[str, Set[str]] = {state: set() for state in self.STATES}
+        # hash -> 状态
+        self._state_of: Dict[str, Optional[str]] = {}
+        # hash -> (站点, 大小, 上传速度, 下载速度)
+        self._site_of: Dict[str, tuple] = {}
+        # 站点 -> 汇总
+        self._sites: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def qbc(self):
+        return self._qbc
+
+    @classmethod
+    def classify(cls, state: str) -> Optional[str]:
+        """
+        按种子状态归类：做种、下载、校验、暂停、错误
+        """
+        try:
+            state_enum = TorrentState(state)
+        except ValueError:
+            return None
+        if state_enum.is_uploading and not state_enum.is_paused:
+            return cls.UPLOADING
+        elif state_enum.is_downloading and not state_enum.is_paused and not state_enum.is_checking:
+            return cls.DOWNLOADING
+        elif state_enum.is_checking:
+            return cls.CHECKING
+        elif state_enum.is_paused:
+            return cls.PAUSED
+        elif state_enum.is_errored:
+            return cls.ERROR
+        return None
+
+    def sync(self) -> Set[str]:
+        """
+        增量同步种子状态
+        :return: 本次发生变化的种子hash
+        """
+        with self._lock:
+            data = self._qbc.sync_maindata(rid=self._rid)
+            changed = set()
+            if data.get("full_update"):
+                changed.update(self._torrents.keys())
+                self._torrents.clear()
+                self._state_of.clear()
+                self._site_of.clear()
+                self._sites.clear()
+                for hashes in self._states.values():
+                    hashes.clear()
+            for torrent_hash, fields in (data.get("torrents") or {}).items():
+                torrent = self._torrents.setdefault(torrent_hash, {"hash": torrent_hash})
+                torrent.update(fields)
+                changed.add(torrent_hash)
+                if "state" in fields or torrent_hash not in self._state_of:
+                    self.__set_state(torrent_hash, self.classify(torrent.get("state")))
+                if self._resolver and (torrent_hash not in self._site_of
+                                       or any(field in fields for field in self._SITE_FIELDS)):
+                    self.__set_site(torrent_hash, torrent)
+            for torrent_hash in data.get("torrents_removed") or []:
+                self._torrents.pop(torrent_hash, None)
+                self.__set_state(torrent_hash, None)
+                self._state_of.pop(torrent_hash, None)
+                self.__set_site(torrent_hash, None)
+                changed.add(torrent_hash)
+            self._rid = data.get("rid") or self._rid
+            return changed
+
+    def __set_state(self, torrent_hash: str, state: Optional[str]):
+        old_state = self._state_of.get(torrent_hash)
+        if old_state:
+            self._states[old_state].discard(torrent_hash)
+        if state:
+            self._states[state].add(torrent_hash)
+        self._state_of[torrent_hash] = state
+
+    def __set_site(self, torrent_hash: str, torrent: Optional[dict]):
+        """
+        更新种子在站点汇总中的计数
+        """
+        old = self._site_of.pop(torrent_hash, None)
+        if old:
+            stat = self._sites.get(old[0])
+            if stat:
+                stat["count"] -= 1
+                stat["size"] -= old[1]
+                stat["upspeed"] -= old[2]
+                stat["dlspeed"] -= old[3]
+                if stat["count"] <= 0:
+                    self._sites.pop(old[0], None)
+        if not torrent:
+            return
+        site = self._resolver.resolve(torrent) or ""
+        new = (site, torrent.get("size") or 0, torrent.get("upspeed") or 0, torrent.get("dlspeed") or 0)
+        stat = self._sites.setdefault(site, {"count": 0, "size": 0, "upspeed": 0, "dlspeed": 0})
+        stat["count"] += 1
+        stat["size"] += new[1]
+        stat["upspeed"] += new[2]
+        stat["dlspeed"] += new[3]
+        self._site_of[torrent_hash] = new
+
+    def site_of(self, torrent_hash: str) -> Optional[str]:
+        """
+        种子所属站点的主域名
+        """
+        site = self._site_of.get(torrent_hash)
+        return site[0] if site else None
+
+    def site_stats(self, site: str = None) -> Dict[str, Dict[str, int]]:
+        """
+        按站点汇总的种子数量、大小和上传/下载速度
+        :param site: 站点主域名，为空时返回全部站点
+        """
+        with self._lock:
+            if site:
+                return {site: dict(self._sites[site])} if site in self._sites else {}
+            return {name: dict(stat) for name, stat in self._sites.items()}
+
+    def torrents(self) -> List[dict]:
+        """
+        当前全部种子信息
+        """
+        with self._lock:
+            return list(self._torrents.values())
+
+    def state_of(self, torrent_hash: str) -> Optional[str]:
+        return self._state_of.get(torrent_hash)
+
+    def split(self, torrents: List[dict]) -> Dict[str, List[str]]:
+        """
+        将种子按状态分组
+        :return: 状态 -> hash列表
+        """
+        result = {state: [] for state in self.STATES}
+        for torrent in torrents:
+            state = self._state_of.get(torrent.get("hash"))
+            if state:
+                result[state].append(torrent.get("hash"))
+        return result
+
+    def status(self) -> Dict[str, int]:
+        """
+        各状态种子数量
+        """
+        with self._lock:
+            status = {state: len(hashes) for state, hashes in self._states.items()}
+            status["total"] = len(self._torrents)
+            return status
+
+    def apply(self, func, hashes: List[str]) -> bool:
+        """
+        分批执行暂停/开始
+        :param func: 下载器的stop_torrents或start_torrents
+        :param hashes: 种子hash
+        """
+        success = True
+        for i in range(0, len(hashes), self._chunk_size):
+            if not func(ids=hashes[i:i + self._chunk_size]):
+                success = False
+        return success
+
+    def wait(self, hashes: List[str], paused: bool, timeout: float = 30, interval: float = 0.5) -> Set[str]:
+        """
+        轮询等待种子状态切换完成，每次只同步发生变化的种子
+        :param hashes: 种子hash
+        :param paused: 目标是否为暂停状态
+        :param timeout: 最长等待时间（秒）
+        :param interval: 轮询间隔（秒）
+        :return: 超时仍未切换的种子hash
+        """
+        pending = set(hashes)
+        deadline = time.time() + timeout
+        while pending:
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error(f"同步种子状态失败：{str(e)}")
+                break
+            pending = {torrent_hash for torrent_hash in pending
+                       if torrent_hash in self._torrents
+                       and (self._state_of.get(torrent_hash) == self.PAUSED) != paused}
+            if not pending or time.time() >= deadline:
+                break
+            time.sleep(interval)
+        return pending
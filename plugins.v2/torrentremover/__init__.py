@@ -1,17 +1,20 @@
-import re
+import os
 import threading
 import time
 from datetime import datetime, timedelta
-from typing import List, Tuple, Dict, Any, Optional
+from typing import List, Tuple, Dict, Any, Optional, Callable
 
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 
+from app import schemas
 from app.core.config import settings
 from app.helper.downloader import DownloaderHelper
 from app.log import logger
 from app.plugins import _PluginBase
+from app.plugins.torrentremover.inventory import DownloaderInventory
+from app.plugins.torrentremover.rules import RemoveRules
 from app.schemas import NotificationType, ServiceInfo
 from app.utils.string import StringUtils
 
@@ -26,7 +29,7 @@ class TorrentRemover(_PluginBase):
     # 插件图标
     plugin_icon = "delete.jpg"
     # 插件版本
-    plugin_version = "2.2"
+    plugin_version = "2.6"
     # 插件作者
     plugin_author = "jxxghp"
     # 作者主页
@@ -50,6 +53,8 @@ class TorrentRemover(_PluginBase):
     _action = "pause"
     _cron = None
     _samedata = False
+    # 辅种匹配方式 name_size/content_path/pieces
+    _samedata_mode = "name_size"
     _mponly = False
     _size = None
     _ratio = None
@@ -61,6 +66,10 @@ class TorrentRemover(_PluginBase):
     _errorkeywords = None
     _torrentstates = None
     _torrentcategorys = None
+    # 每次调用下载器处理的种子数
+    _batch_size = 100
+    # 通知中最多列出的种子数
+    _notify_limit = 20
 
     def init_plugin(self, config: dict = None):
         self.downloader_helper = DownloaderHelper()
@@ -72,6 +81,7 @@ class TorrentRemover(_PluginBase):
             self._action = config.get("action")
             self._cron = config.get("cron")
             self._samedata = config.get("samedata")
+            self._samedata_mode = config.get("samedata_mode") or "name_size"
             self._mponly = config.get("mponly")
             self._size = config.get("size") or ""
             self._ratio = config.get("ratio")
@@ -83,6 +93,10 @@ class TorrentRemover(_PluginBase):
             self._errorkeywords = config.get("errorkeywords") or ""
             self._torrentstates = config.get("torrentstates") or ""
             self._torrentcategorys = config.get("torrentcategorys") or ""
+            try:
+                self._batch_size = max(int(config.get("batch_size") or 100), 1)
+            except ValueError:
+                self._batch_size = 100
 
         self.stop_service()
 
@@ -105,6 +119,7 @@ class TorrentRemover(_PluginBase):
                     "cron": self._cron,
                     "downloaders": self._downloaders,
                     "samedata": self._samedata,
+                    "samedata_mode": self._samedata_mode,
                     "mponly": self._mponly,
                     "size": self._size,
                     "ratio": self._ratio,
@@ -115,8 +130,8 @@ class TorrentRemover(_PluginBase):
                     "trackerkeywords": self._trackerkeywords,
                     "errorkeywords": self._errorkeywords,
                     "torrentstates": self._torrentstates,
-                    "torrentcategorys": self._torrentcategorys
-
+                    "torrentcategorys": self._torrentcategorys,
+                    "batch_size": self._batch_size
                 })
                 if self._scheduler.get_jobs():
                     # 启动服务
@@ -131,7 +146,13 @@ class TorrentRemover(_PluginBase):
         pass
 
     def get_api(self) -> List[Dict[str, Any]]:
-        pass
+        return [{
+            "path": "/preview",
+            "endpoint": self.preview,
+            "methods": ["GET"],
+            "summary": "预览删种",
+            "description": "按当前条件列出将被处理的种子及命中原因，不执行任何操作",
+        }]
 
     def get_service(self) -> List[Dict[str, Any]]:
         """
@@ -426,6 +447,42 @@ class TorrentRemover(_PluginBase):
                                         }
                                     }
                                 ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'batch_size',
+                                            'label': '批量处理数',
+                                            'placeholder': '每次提交给下载器的种子数，默认100'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSelect',
+                                        'props': {
+                                            'model': 'samedata_mode',
+                                            'label': '辅种匹配方式',
+                                            'items': [
+                                                {'title': '名称和大小', 'value': 'name_size'},
+                                                {'title': '内容路径', 'value': 'content_path'},
+                                                {'title': '分块校验（QB）', 'value': 'pieces'}
+                                            ]
+                                        }
+                                    }
+                                ]
                             }
                         ]
                     },
@@ -553,6 +610,7 @@ class TorrentRemover(_PluginBase):
             'downloaders': [],
             "cron": '0 */12 * * *',
             "samedata": False,
+            "samedata_mode": "name_size",
             "mponly": False,
             "size": "",
             "ratio": "",
@@ -563,7 +621,8 @@ class TorrentRemover(_PluginBase):
             "trackerkeywords": "",
             "errorkeywords": "",
             "torrentstates": "",
-            "torrentcategorys": ""
+            "torrentcategorys": "",
+            "batch_size": 100
         }
 
     def get_page(self) -> List[dict]:
@@ -636,147 +695,135 @@ class TorrentRemover(_PluginBase):
                     # 下载器
                     downlader_obj = self.__get_downloader(downloader)
                     if self._action == "pause":
-                        message_text = f"{downloader.title()} 共暂停{len(torrents)}个种子"
-                        for torrent in torrents:
-                            if self._event.is_set():
-                                logger.info(f"自动删种服务停止")
-                                return
-                            text_item = f"{torrent.get('name')} " \
-                                        f"来自站点：{torrent.get('site')} " \
-                                        f"大小：{StringUtils.str_filesize(torrent.get('size'))}"
-                            # 暂停种子
-                            downlader_obj.stop_torrents(ids=[torrent.get("id")])
-                            logger.info(f"自动删种任务 暂停种子：{text_item}")
-                            message_text = f"{message_text}\n{text_item}"
+                        action_text = "暂停"
+                        action_func = lambda ids: downlader_obj.stop_torrents(ids=ids)
                     elif self._action == "delete":
-                        message_text = f"{downloader.title()} 共删除{len(torrents)}个种子"
-                        for torrent in torrents:
-                            if self._event.is_set():
-                                logger.info(f"自动删种服务停止")
-                                return
-                            text_item = f"{torrent.get('name')} " \
-                                        f"来自站点：{torrent.get('site')} " \
-                                        f"大小：{StringUtils.str_filesize(torrent.get('size'))}"
-                            # 删除种子
-                            downlader_obj.delete_torrents(delete_file=False,
-                                                          ids=[torrent.get("id")])
-                            logger.info(f"自动删种任务 删除种子：{text_item}")
-                            message_text = f"{message_text}\n{text_item}"
+                        action_text = "删除"
+                        action_func = lambda ids: downlader_obj.delete_torrents(delete_file=False, ids=ids)
                     elif self._action == "deletefile":
-                        message_text = f"{downloader.title()} 共删除{len(torrents)}个种子及文件"
-                        for torrent in torrents:
-                            if self._event.is_set():
-                                logger.info(f"自动删种服务停止")
-                                return
-                            text_item = f"{torrent.get('name')} " \
-                                        f"来自站点：{torrent.get('site')} " \
-                                        f"大小：{StringUtils.str_filesize(torrent.get('size'))}"
-                            # 删除种子
-                            downlader_obj.delete_torrents(delete_file=True,
-                                                          ids=[torrent.get("id")])
-                            logger.info(f"自动删种任务 删除种子及文件：{text_item}")
-                            message_text = f"{message_text}\n{text_item}"
+                        action_text = "删除种子及文件"
+                        action_func = lambda ids: downlader_obj.delete_torrents(delete_file=True, ids=ids)
                     else:
                         continue
-                    if torrents and message_text and self._notify:
+                    succeed, failed, stopped = self.__batch_execute(torrents=torrents,
+                                                                    action_func=action_func,
+                                                                    action_text=action_text)
+                    if torrents and self._notify:
                         self.post_message(
                             mtype=NotificationType.SiteMessage,
                             title=f"【自动删种任务完成】",
-                            text=message_text
+                            text=self.__build_summary(downloader=downloader,
+                                                      action_text=action_text,
+                                                      succeed=succeed,
+                                                      failed=failed,
+                                                      stopped=stopped)
                         )
+                    if stopped:
+                        logger.info(f"自动删种服务停止")
+                        return
             except Exception as e:
                 logger.error(f"自动删种任务异常：{str(e)}")
 
-    def __get_qb_torrent(self, torrent: Any) -> Optional[dict]:
+    def __batch_execute(self, torrents: List[dict], action_func: Callable[[List[str]], Any],
+                        action_text: str) -> Tuple[List[dict], List[dict], bool]:
         """
-        检查QB下载任务是否符合条件
+        按批次调用下载器处理种子，每批之间检查停止信号
+        :param torrents: 待处理种子
+        :param action_func: 处理方法，参数为种子ID列表，返回False表示失败
+        :param action_text: 动作描述
+        :return: 处理成功的种子、处理失败的种子、是否被停止
         """
-        # 完成时间
-        date_done = torrent.completion_on if torrent.completion_on > 0 else torrent.added_on
-        # 现在时间
-        date_now = int(time.mktime(datetime.now().timetuple()))
-        # 做种时间
-        torrent_seeding_time = date_now - date_done if date_done else 0
-        # 平均上传速度
-        torrent_upload_avs = torrent.uploaded / torrent_seeding_time if torrent_seeding_time else 0
-        # 大小 单位：GB
-        sizes = self._size.split('-') if self._size else []
-        minsize = float(sizes[0]) * 1024 * 1024 * 1024 if sizes else 0
-        maxsize = float(sizes[-1]) * 1024 * 1024 * 1024 if sizes else 0
-        # 分享率
-        if self._ratio and torrent.ratio <= float(self._ratio):
-            return None
-        # 做种时间 单位：小时
-        if self._time and torrent_seeding_time <= float(self._time) * 3600:
-            return None
-        # 文件大小
-        if self._size and (torrent.size >= int(maxsize) or torrent.size <= int(minsize)):
-            return None
-        if self._upspeed and torrent_upload_avs >= float(self._upspeed) * 1024:
-            return None
-        if self._pathkeywords and not re.findall(self._pathkeywords, torrent.save_path, re.I):
-            return None
-        if self._trackerkeywords and not re.findall(self._trackerkeywords, torrent.tracker, re.I):
-            return None
-        if self._torrentstates and torrent.state not in self._torrentstates:
-            return None
-        if self._torrentcategorys and (not torrent.category or torrent.category not in self._torrentcategorys):
-            return None
-        return {
-            "id": torrent.hash,
-            "name": torrent.name,
-            "site": StringUtils.get_url_sld(torrent.tracker),
-            "size": torrent.size
-        }
+        succeed = []
+        failed = []
+        start = time.time()
+        for i in range(0, len(torrents), self._batch_size):
+            if self._event.is_set():
+                return succeed, failed, True
+            chunk = torrents[i:i + self._batch_size]
+            try:
+                result = action_func([torrent.get("id") for torrent in chunk])
+            except Exception as e:
+                logger.error(f"自动删种任务 {action_text}第 {i // self._batch_size + 1} 批种子出错：{str(e)}")
+                result = False
+            if not result:
+                logger.warn(f"自动删种任务 {action_text}第 {i // self._batch_size + 1} 批种子失败，共 {len(chunk)} 个")
+                failed.extend(chunk)
+                continue
+            succeed.extend(chunk)
+            for torrent in chunk:
+                logger.info(f"自动删种任务 {action_text}种子：{torrent.get('name')} "
+                            f"来自站点：{torrent.get('site')} "
+                            f"大小：{StringUtils.str_filesize(torrent.get('size'))}")
+        logger.info(f"自动删种任务 {action_text}完成，成功 {len(succeed)} 个，失败 {len(failed)} 个，"
+                    f"耗时 {time.time() - start:.2f} 秒")
+        return succeed, failed, False
 
-    def __get_tr_torrent(self, torrent: Any) -> Optional[dict]:
+    def __build_summary(self, downloader: str, action_text: str, succeed: List[dict],
+                        failed: List[dict], stopped: bool) -> str:
         """
-        检查TR下载任务是否符合条件
+        生成通知摘要，种子明细最多列出 _notify_limit 个
         """
-        # 完成时间
-        date_done = torrent.date_done or torrent.date_added
-        # 现在时间
-        date_now = int(time.mktime(datetime.now().timetuple()))
-        # 做种时间
-        torrent_seeding_time = date_now - int(time.mktime(date_done.timetuple())) if date_done else 0
-        # 上传量
-        torrent_uploaded = torrent.ratio * torrent.total_size
-        # 平均上传速茺
-        torrent_upload_avs = torrent_uploaded / torrent_seeding_time if torrent_seeding_time else 0
-        # 大小 单位：GB
-        sizes = self._size.split('-') if self._size else []
-        minsize = float(sizes[0]) * 1024 * 1024 * 1024 if sizes else 0
-        maxsize = float(sizes[-1]) * 1024 * 1024 * 1024 if sizes else 0
-        # 分享率
-        if self._ratio and torrent.ratio <= float(self._ratio):
-            return None
-        if self._time and torrent_seeding_time <= float(self._time) * 3600:
-            return None
-        if self._size and (torrent.total_size >= int(maxsize) or torrent.total_size <= int(minsize)):
-            return None
-        if self._upspeed and torrent_upload_avs >= float(self._upspeed) * 1024:
-            return None
-        if self._pathkeywords and not re.findall(self._pathkeywords, torrent.download_dir, re.I):
-            return None
-        if self._trackerkeywords:
-            if not torrent.trackers:
-                return None
-            else:
-                tacker_key_flag = False
-                for tracker in torrent.trackers:
-                    if re.findall(self._trackerkeywords, tracker.get("announce", ""), re.I):
-                        tacker_key_flag = True
-                        break
-                if not tacker_key_flag:
-                    return None
-        if self._errorkeywords and not re.findall(self._errorkeywords, torrent.error_string, re.I):
-            return None
-        return {
-            "id": torrent.hashString,
-            "name": torrent.name,
-            "site": torrent.trackers[0].get("sitename") if torrent.trackers else "",
-            "size": torrent.total_size
-        }
+        total_size = sum(torrent.get("size") or 0 for torrent in succeed)
+        lines = [f"{downloader.title()} 共{action_text}{len(succeed)}个种子，"
+                 f"合计 {StringUtils.str_filesize(total_size)}"]
+        if failed:
+            lines.append(f"{action_text}失败{len(failed)}个种子")
+        if stopped:
+            lines.append("任务已停止，剩余种子未处理")
+        # 按站点汇总
+        sites = {}
+        for torrent in succeed:
+            site = torrent.get("site") or "未知"
+            sites[site] = sites.get(site, 0) + 1
+        if sites:
+            lines.append("站点：" + "，".join(f"{site} {count}个" for site, count in
+                                             sorted(sites.items(), key=lambda x: x[1], reverse=True)))
+        for torrent in succeed[:self._notify_limit]:
+            lines.append(f"{torrent.get('name')} "
+                         f"来自站点：{torrent.get('site')} "
+                         f"大小：{StringUtils.str_filesize(torrent.get('size'))}")
+        if len(succeed) > self._notify_limit:
+            lines.append(f"... 等共 {len(succeed)} 个种子")
+        return "\n".join(lines)
+
+    def __build_rules(self) -> RemoveRules:
+        """
+        按当前配置编译删种条件
+        """
+        return RemoveRules(size=self._size,
+                           ratio=self._ratio,
+                           seeding_time=self._time,
+                           upspeed=self._upspeed,
+                           pathkeywords=self._pathkeywords,
+                           trackerkeywords=self._trackerkeywords,
+                           errorkeywords=self._errorkeywords,
+                           torrentstates=self._torrentstates,
+                           torrentcategorys=self._torrentcategorys)
+
+    def preview(self, apikey: str, downloader: str = None, limit: int = 0) -> schemas.Response:
+        """
+        预览当前条件下将被处理的种子及命中原因，不执行任何操作
+        """
+        if apikey != settings.API_TOKEN:
+            return schemas.Response(success=False, message="API密钥错误")
+        downloaders = [downloader] if downloader else self._downloaders
+        if not downloaders:
+            return schemas.Response(success=False, message="尚未配置下载器")
+        start = time.time()
+        result = {}
+        for name in downloaders:
+            try:
+                torrents = self.get_remove_torrents(name)
+            except Exception as e:
+                return schemas.Response(success=False, message=f"下载器 {name} 预览失败：{str(e)}")
+            result[name] = {
+                "count": len(torrents),
+                "size": sum(torrent.get("size") or 0 for torrent in torrents),
+                "torrents": torrents[:int(limit)] if limit else torrents
+            }
+        return schemas.Response(success=True,
+                                message=f"预览完成，耗时 {time.time() - start:.2f} 秒",
+                                data=result)
 
     def get_remove_torrents(self, downloader: str):
         """
@@ -793,49 +840,103 @@ class TorrentRemover(_PluginBase):
             tags = []
         if self._mponly:
             tags.append(settings.TORRENT_TAG)
-        # 查询种子
-        torrents, error_flag = downloader_obj.get_torrents(tags=tags or None)
+        # 查询种子，通过共享清单增量同步，删种前总是同步一次
+        torrents, error_flag = DownloaderInventory.get(
+            name=downloader, downloader_type=downloader_config.type, downloader_obj=downloader_obj
+        ).get_torrents(tags=tags or None, max_age=0)
         if error_flag:
             return []
-        # 处理种子
+        # 处理种子，条件每次运行只编译一次
+        rules = self.__build_rules()
+        match_func = rules.match_qb if downloader_config.type == "qbittorrent" else rules.match_tr
         for torrent in torrents:
-            if downloader_config.type == "qbittorrent":
-                item = self.__get_qb_torrent(torrent)
-            else:
-                item = self.__get_tr_torrent(torrent)
+            item = match_func(torrent)
             if not item:
                 continue
             remove_torrents.append(item)
         # 处理辅种
         if self._samedata and remove_torrents:
-            remove_ids = [t.get("id") for t in remove_torrents]
-            remove_torrents_plus = []
-            for remove_torrent in remove_torrents:
-                name = remove_torrent.get("name")
-                size = remove_torrent.get("size")
-                for torrent in torrents:
-                    if downloader_config.type == "qbittorrent":
-                        plus_id = torrent.hash
-                        plus_name = torrent.name
-                        plus_size = torrent.size
-                        plus_site = StringUtils.get_url_sld(torrent.tracker)
-                    else:
-                        plus_id = torrent.hashString
-                        plus_name = torrent.name
-                        plus_size = torrent.total_size
-                        plus_site = torrent.trackers[0].get("sitename") if torrent.trackers else ""
-                    # 比对名称和大小
-                    if plus_name == name \
-                            and plus_size == size \
-                            and plus_id not in remove_ids:
-                        remove_torrents_plus.append(
-                            {
-                                "id": plus_id,
-                                "name": plus_name,
-                                "site": plus_site,
-                                "size": plus_size
-                            }
-                        )
-            if remove_torrents_plus:
-                remove_torrents.extend(remove_torrents_plus)
+            remove_torrents.extend(self.__get_samedata_torrents(downloader_obj=downloader_obj,
+                                                                downloader_type=downloader_config.type,
+                                                                torrents=torrents,
+                                                                remove_torrents=remove_torrents))
         return remove_torrents
+
+    @staticmethod
+    def __get_torrent_item(torrent: Any, downloader_type: str) -> dict:
+        """
+        提取辅种比对所需的种子信息
+        """
+        if downloader_type == "qbittorrent":
+            return {
+                "id": torrent.hash,
+                "name": torrent.name,
+                "site": StringUtils.get_url_sld(torrent.tracker),
+                "size": torrent.size,
+                "content_path": torrent.content_path
+            }
+        return {
+            "id": torrent.hashString,
+            "name": torrent.name,
+            "site": torrent.trackers[0].get("sitename") if torrent.trackers else "",
+            "size": torrent.total_size,
+            "content_path": os.path.join(torrent.download_dir or "", torrent.name or "")
+        }
+
+    def __get_samedata_torrents(self, downloader_obj: Any, downloader_type: str,
+                                torrents: list, remove_torrents: List[dict]) -> List[dict]:
+        """
+        查找与待删除种子数据相同的辅种，先按匹配键建立一次索引再逐个查找
+        """
+        mode = self._samedata_mode
+        if mode == "pieces" and downloader_type != "qbittorrent":
+            logger.warn("自动删种任务 分块校验仅支持QB，改为按名称和大小匹配辅种")
+            mode = "name_size"
+
+        def __key(item: dict) -> tuple:
+            if mode == "content_path":
+                return item.get("content_path"), item.get("size")
+            return item.get("name"), item.get("size")
+
+        # 匹配键 -> 种子列表
+        index: Dict[tuple, List[dict]] = {}
+        for torrent in torrents:
+            item = self.__get_torrent_item(torrent, downloader_type)
+            index.setdefault(__key(item), []).append(item)
+
+        # 分块哈希缓存
+        piece_hashes: Dict[str, Optional[tuple]] = {}
+
+        def __pieces(torrent_hash: str) -> Optional[tuple]:
+            if torrent_hash not in piece_hashes:
+                try:
+                    piece_hashes[torrent_hash] = tuple(downloader_obj.qbc.torrents_piece_hashes(
+                        torrent_hash=torrent_hash))
+                except Exception as e:
+                    logger.error(f"自动删种任务 获取种子 {torrent_hash} 分块哈希失败：{str(e)}")
+                    piece_hashes[torrent_hash] = None
+            return piece_hashes[torrent_hash]
+
+        remove_ids = {t.get("id") for t in remove_torrents}
+        remove_torrents_plus = []
+        for remove_torrent in remove_torrents:
+            key = __key(remove_torrent)
+            if mode == "content_path" and not key[0]:
+                continue
+            for item in index.get(key) or []:
+                if item.get("id") in remove_ids:
+                    continue
+                if mode == "pieces":
+                    # 名称和大小相同后再比对分块哈希，确认数据完全一致
+                    pieces = __pieces(remove_torrent.get("id"))
+                    if not pieces or pieces != __pieces(item.get("id")):
+                        continue
+                remove_ids.add(item.get("id"))
+                remove_torrents_plus.append({
+                    "id": item.get("id"),
+                    "name": item.get("name"),
+                    "site": item.get("site"),
+                    "size": item.get("size"),
+                    "reasons": [f"辅种：与 {remove_torrent.get('site')} 的种子数据相同"]
+                })
+        return remove_torrents_plus
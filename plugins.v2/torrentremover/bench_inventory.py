@@ -0,0 +1,181 @@
+"""
+下载器种子清单性能对比
+使用本地模拟的qBittorrent/Transmission（接口返回前做一次JSON序列化，模拟下载器生成和传输数据的开销），
+对比每次全量获取种子与 DownloaderInventory 增量同步的耗时和传输数据量
+
+用法（在MoviePilot环境中运行）：
+    python -m app.plugins.torrentremover.bench_inventory --torrents 40000 --rounds 20 --changes 200
+"""
+import argparse
+import json
+import random
+import time
+from types import SimpleNamespace
+from typing import Dict, List
+
+from app.plugins.torrentremover.inventory import DownloaderInventory
+
+STATES = ["uploading", "stalledUP", "downloading", "pausedUP", "queuedUP"]
+
+
+class _Payload:
+    """
+    模拟接口数据传输，记录传输的字节数
+    """
+
+    def __init__(self):
+        self.bytes = 0
+
+    def transfer(self, data):
+        text = json.dumps(data)
+        self.bytes += len(text)
+        return json.loads(text)
+
+
+class FakeQbClient:
+    """
+    模拟qBittorrent，支持sync/maindata的rid增量
+    """
+
+    def __init__(self, count: int, payload: _Payload):
+        self.payload = payload
+        self.torrents: Dict[str, dict] = {
+            f"{i:040x}": {
+                "name": f"Torrent.{i}",
+                "state": random.choice(STATES),
+                "progress": 1,
+                "ratio": round(random.random() * 5, 3),
+                "size": random.randint(1, 100) * 1024 ** 3,
+                "tags": "",
+                "category": "tv",
+                "seeding_time": random.randint(0, 10 ** 7),
+                "upspeed": 0
+            } for i in range(count)
+        }
+        self.rid = 0
+        # rid -> 本次变化的hash、删除的hash
+        self.changes: Dict[int, tuple] = {}
+
+    def mutate(self, count: int):
+        """
+        模拟一段时间内的种子变化：修改、新增和删除
+        """
+        self.rid += 1
+        changed = set()
+        removed = set()
+        for torrent_hash in random.sample(list(self.torrents), count):
+            self.torrents[torrent_hash]["upspeed"] = random.randint(0, 10 ** 6)
+            self.torrents[torrent_hash]["ratio"] = round(random.random() * 5, 3)
+            changed.add(torrent_hash)
+        torrent_hash = random.choice(list(self.torrents))
+        self.torrents.pop(torrent_hash)
+        removed.add(torrent_hash)
+        torrent_hash = f"{random.getrandbits(160):040x}"
+        self.torrents[torrent_hash] = dict(next(iter(self.torrents.values())), name="New")
+        changed.add(torrent_hash)
+        self.changes[self.rid] = (changed, removed)
+
+    def sync_maindata(self, rid: int = 0) -> dict:
+        if not rid or rid not in self.changes and rid != self.rid:
+            return self.payload.transfer({"rid": self.rid, "full_update": True, "torrents": self.torrents})
+        changed = set()
+        removed = set()
+        for change_rid in range(rid + 1, self.rid + 1):
+            changed |= self.changes[change_rid][0]
+            removed |= self.changes[change_rid][1]
+        return self.payload.transfer({
+            "rid": self.rid,
+            "torrents": {torrent_hash: self.torrents[torrent_hash]
+                         for torrent_hash in changed - removed if torrent_hash in self.torrents},
+            "torrents_removed": list(removed)
+        })
+
+    def torrents_info(self) -> List[dict]:
+        return self.payload.transfer([dict(torrent, hash=torrent_hash)
+                                      for torrent_hash, torrent in self.torrents.items()])
+
+
+class FakeTrClient:
+    """
+    模拟Transmission，支持recently-active
+    """
+
+    def __init__(self, qb: FakeQbClient):
+        self.qb = qb
+        self.ids = {torrent_hash: i for i, torrent_hash in enumerate(qb.torrents)}
+        self.active = set()
+        self.removed = []
+
+    def mutate(self, count: int):
+        before = set(self.qb.torrents)
+        self.qb.mutate(count)
+        changed, removed = self.qb.changes[self.qb.rid]
+        for torrent_hash in set(self.qb.torrents) - before:
+            self.ids[torrent_hash] = len(self.ids)
+        self.active = changed
+        self.removed = [self.ids[torrent_hash] for torrent_hash in removed]
+
+    def __torrents(self, hashes) -> List[SimpleNamespace]:
+        data = self.qb.payload.transfer([dict(self.qb.torrents[torrent_hash], hashString=torrent_hash,
+                                              id=self.ids[torrent_hash], status="seeding")
+                                         for torrent_hash in hashes if torrent_hash in self.qb.torrents])
+        return [SimpleNamespace(**item) for item in data]
+
+    def get_torrents(self, arguments=None) -> List[SimpleNamespace]:
+        return self.__torrents(self.qb.torrents)
+
+    def get_recently_active_torrents(self, arguments=None):
+        return self.__torrents(self.active), list(self.removed)
+
+
+def run(name: str, downloader_type: str, client, rounds: int, changes: int):
+    payload = client.payload if downloader_type == "qbittorrent" else client.qb.payload
+    full_list = client.torrents_info if downloader_type == "qbittorrent" else client.get_torrents
+
+    # 每次全量获取
+    payload.bytes = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        client.mutate(changes)
+        torrents = full_list()
+    full_cost = time.perf_counter() - start
+    full_bytes = payload.bytes
+
+    # 增量同步
+    downloader = SimpleNamespace(qbc=client) if downloader_type == "qbittorrent" else SimpleNamespace(trc=client)
+    inventory = DownloaderInventory(name=name, downloader_type=downloader_type, downloader_obj=downloader)
+    inventory.refresh(force=True)
+    payload.bytes = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        client.mutate(changes)
+        inventory_torrents, _ = inventory.get_torrents(max_age=0)
+    delta_cost = time.perf_counter() - start
+    delta_bytes = payload.bytes
+
+    expected = set(client.torrents if downloader_type == "qbittorrent" else client.qb.torrents)
+    actual = {torrent.get("hash") if downloader_type == "qbittorrent" else torrent.hashString
+              for torrent in inventory_torrents}
+    if expected != actual:
+        raise SystemExit(f"{name} 增量同步结果与下载器不一致")
+    print(f"{name}：{len(torrents)} 个种子，{rounds} 次获取，每次 {changes} 个变化")
+    print(f"  全量获取：{full_cost:.3f} 秒，传输 {full_bytes / 1024 ** 2:.1f} MB")
+    print(f"  增量同步：{delta_cost:.3f} 秒，传输 {delta_bytes / 1024 ** 2:.1f} MB"
+          f"（{full_cost / delta_cost:.1f}x，全量 {inventory.full_syncs} 次，增量 {inventory.delta_syncs} 次）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TorrentRemover 下载器种子清单性能对比")
+    parser.add_argument("--torrents", type=int, default=40000, help="种子数")
+    parser.add_argument("--rounds", type=int, default=20, help="获取次数")
+    parser.add_argument("--changes", type=int, default=200, help="每次获取之间变化的种子数")
+    args = parser.parse_args()
+
+    random.seed(0)
+    run("qBittorrent", "qbittorrent", FakeQbClient(args.torrents, _Payload()), args.rounds, args.changes)
+    run("Transmission", "transmission", FakeTrClient(FakeQbClient(args.torrents, _Payload())),
+        args.rounds, args.changes)
+
+
+if __name__ == "__main__":
+    main()
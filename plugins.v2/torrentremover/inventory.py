@@ -0,0 +1,195 @@
+import time
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.log import logger
+
+
+class DownloaderInventory:
+    """
+    下载器种子清单缓存
+    每个下载器保留一份种子快照，首次全量获取，之后按需增量同步：
+    qBittorrent使用sync/maindata的rid增量（与其它插件共用会话时下载器可能返回全量更新，按全量处理），
+    Transmission使用recently-active（只包含最近60秒内有变化的种子，超过该时间未同步时全量获取）；
+    快照在max_age秒内直接复用，同一进程内的多个插件共享同一份快照，减少对下载器的全量查询
+    """
+
+    # Transmission recently-active 的时间范围（秒）
+    TR_ACTIVE_WINDOW = 60
+
+    _instances: Dict[str, "DownloaderInventory"] = {}
+    _instances_lock = Lock()
+
+    def __init__(self, name: str, downloader_type: str, downloader_obj: Any,
+                 max_age: float = 30, full_interval: float = 600):
+        """
+        :param name: 下载器名称
+        :param downloader_type: qbittorrent/transmission
+        :param downloader_obj: 下载器实例
+        :param max_age: 快照最长复用时间（秒）
+        :param full_interval: 全量校正间隔（秒）
+        """
+        self.name = name
+        self.downloader_type = downloader_type
+        self.downloader = downloader_obj
+        self.max_age = max_age
+        self.full_interval = full_interval
+        self._lock = Lock()
+        # hash -> 种子
+        self._torrents: Dict[str, Any] = {}
+        # Transmission 种子id -> hash
+        self._tr_ids: Dict[int, str] = {}
+        self._rid = 0
+        self._synced_at = 0.0
+        self._full_at = 0.0
+        # 同步次数统计
+        self.full_syncs = 0
+        self.delta_syncs = 0
+
+    @classmethod
+    def get(cls, name: str, downloader_type: str, downloader_obj: Any) -> "DownloaderInventory":
+        """
+        获取下载器的共享清单，下载器实例变化（如重新配置）时重建
+        """
+        with cls._instances_lock:
+            inventory = cls._instances.get(name)
+            if not inventory or inventory.downloader is not downloader_obj \
+                    or inventory.downloader_type != downloader_type:
+                inventory = cls(name=name, downloader_type=downloader_type, downloader_obj=downloader_obj)
+                cls._instances[name] = inventory
+            return inventory
+
+    def refresh(self, max_age: float = None, force: bool = False) -> bool:
+        """
+        按新鲜度要求同步快照
+        :param max_age: 本次可接受的快照最长时间（秒），为空时使用默认值
+        :param force: 是否强制同步
+        :return: 是否同步成功
+        """
+        max_age = self.max_age if max_age is None else max_age
+        with self._lock:
+            now = time.time()
+            if not force and self._synced_at and now - self._synced_at <= max_age:
+                return True
+            full = not self._full_at or now - self._full_at >= self.full_interval
+            if self.downloader_type != "qbittorrent" and now - self._synced_at > self.TR_ACTIVE_WINDOW:
+                # 上次同步已超出recently-active的范围，增量会遗漏变化和删除
+                full = True
+            try:
+                if self.downloader_type == "qbittorrent":
+                    self.__sync_qb(full=full)
+                else:
+                    self.__sync_tr(full=full)
+            except Exception as e:
+                logger.error(f"同步下载器 {self.name} 种子清单失败：{str(e)}")
+                self._synced_at = 0
+                self._full_at = 0
+                return False
+            self._synced_at = now
+            return True
+
+    def __sync_qb(self, full: bool):
+        from qbittorrentapi import TorrentDictionary
+
+        qbc = self.downloader.qbc
+        data = qbc.sync_maindata(rid=0 if full else self._rid)
+        if data.get("full_update"):
+            self._torrents.clear()
+            self._full_at = time.time()
+            self.full_syncs += 1
+        else:
+            self.delta_syncs += 1
+        for torrent_hash, fields in (data.get("torrents") or {}).items():
+            torrent = self._torrents.get(torrent_hash)
+            if torrent is None:
+                self._torrents[torrent_hash] = TorrentDictionary(data=dict(fields, hash=torrent_hash), client=qbc)
+            else:
+                torrent.update(fields)
+        for torrent_hash in data.get("torrents_removed") or []:
+            self._torrents.pop(torrent_hash, None)
+        self._rid = data.get("rid") or self._rid
+
+    def __sync_tr(self, full: bool):
+        trc = self.downloader.trc
+        arguments = getattr(self.downloader, "_trarg", None)
+        if arguments and "id" not in arguments:
+            arguments = list(arguments) + ["id"]
+        if full:
+            torrents = trc.get_torrents(arguments=arguments)
+            self._torrents = {torrent.hashString: torrent for torrent in torrents}
+            self._tr_ids = {torrent.id: torrent.hashString for torrent in torrents}
+            self._full_at = time.time()
+            self.full_syncs += 1
+            return
+        torrents, removed = trc.get_recently_active_torrents(arguments=arguments)
+        for torrent in torrents:
+            self._torrents[torrent.hashString] = torrent
+            self._tr_ids[torrent.id] = torrent.hashString
+        for torrent_id in removed or []:
+            torrent_hash = self._tr_ids.pop(torrent_id, None)
+            if torrent_hash:
+                self._torrents.pop(torrent_hash, None)
+        self.delta_syncs += 1
+
+    def get_torrents(self, ids: List[str] = None, tags: List[str] = None,
+                     max_age: float = None) -> Tuple[List[Any], bool]:
+        """
+        获取种子，返回值与下载器的get_torrents一致
+        :param ids: 种子hash
+        :param tags: 标签，需同时包含全部标签
+        :param max_age: 本次可接受的快照最长时间（秒）
+        :return: 种子列表, 是否发生错误
+        """
+        if not self.refresh(max_age=max_age):
+            return [], True
+        with self._lock:
+            if ids:
+                ids = [ids] if isinstance(ids, str) else ids
+                torrents = [self._torrents[torrent_hash] for torrent_hash in ids if torrent_hash in self._torrents]
+            else:
+                torrents = list(self._torrents.values())
+        if tags:
+            tags = set(tags)
+            torrents = [torrent for torrent in torrents if tags.issubset(self.__tags(torrent))]
+        return torrents, False
+
+    def get_completed_torrents(self, max_age: float = None) -> Optional[List[Any]]:
+        """
+        获取已完成的种子，出错时返回None
+        """
+        torrents, error = self.get_torrents(max_age=max_age)
+        if error:
+            return None
+        if self.downloader_type == "qbittorrent":
+            return [torrent for torrent in torrents if torrent.get("progress") == 1]
+        return [torrent for torrent in torrents if torrent.status in ["seeding", "seed_pending"]]
+
+    def filter(self, predicate: Callable[[Any], bool], max_age: float = None) -> List[Any]:
+        """
+        按条件筛选种子
+        """
+        torrents, _ = self.get_torrents(max_age=max_age)
+        return [torrent for torrent in torrents if predicate(torrent)]
+
+    def by_hash(self, max_age: float = None) -> Dict[str, Any]:
+        """
+        hash -> 种子
+        """
+        self.refresh(max_age=max_age)
+        with self._lock:
+            return dict(self._torrents)
+
+    def __tags(self, torrent: Any) -> set:
+        if self.downloader_type == "qbittorrent":
+            return {tag.strip() for tag in (torrent.get("tags") or "").split(",") if tag.strip()}
+        return set(torrent.labels or [])
+
+
+def get_torrents(service: Any, ids: List[str] = None, tags: List[str] = None,
+                 max_age: float = None) -> Tuple[List[Any], bool]:
+    """
+    通过共享清单获取下载器种子
+    :param service: 下载器服务信息
+    """
+    return DownloaderInventory.get(name=service.name, downloader_type=service.type,
+                                   downloader_obj=service.instance).get_torrents(ids=ids, tags=tags, max_age=max_age)
@@ -0,0 +1,144 @@
+import os
+import re
+import time
+from typing import Any, List, Optional
+
+from app.utils.string import StringUtils
+
+
+class RemoveRules:
+    """
+    自动删种条件
+    每次运行只解析一次配置：大小区间、阈值换算、正则预编译、状态和分类集合，当前时间也只取一次，
+    之后对每个种子只做比较；匹配时同时给出命中的条件，用于预览
+    """
+
+    def __init__(self, size: str = None, ratio: Any = None, seeding_time: Any = None, upspeed: Any = None,
+                 pathkeywords: str = None, trackerkeywords: str = None, errorkeywords: str = None,
+                 torrentstates: str = None, torrentcategorys: str = None):
+        # 大小 单位：GB
+        sizes = size.split('-') if size else []
+        self.min_size = int(float(sizes[0]) * 1024 * 1024 * 1024) if sizes else None
+        self.max_size = int(float(sizes[-1]) * 1024 * 1024 * 1024) if sizes else None
+        # 分享率
+        self.ratio = float(ratio) if ratio else None
+        # 做种时间 单位：小时
+        self.seeding_time = float(seeding_time) * 3600 if seeding_time else None
+        # 平均上传速度 单位：KB/s
+        self.upspeed = float(upspeed) * 1024 if upspeed else None
+        self.path_re = re.compile(pathkeywords, re.I) if pathkeywords else None
+        self.tracker_re = re.compile(trackerkeywords, re.I) if trackerkeywords else None
+        self.error_re = re.compile(errorkeywords, re.I) if errorkeywords else None
+        self.states = self.__split(torrentstates)
+        self.categorys = self.__split(torrentcategorys)
+        # 本次运行的当前时间
+        self.now = int(time.time())
+
+    @staticmethod
+    def __split(value: str) -> Optional[set]:
+        """
+        拆分逗号分隔的配置，兼容全角逗号
+        """
+        if not value:
+            return None
+        return {item.strip() for item in value.replace("，", ",").split(",") if item.strip()}
+
+    def __check(self, size: int, ratio: float, seeding_time: int, upload_avs: float) -> Optional[List[str]]:
+        """
+        检查数值条件，不符合返回None，符合返回命中原因
+        """
+        reasons = []
+        if self.ratio is not None:
+            if ratio <= self.ratio:
+                return None
+            reasons.append(f"分享率 {round(ratio, 2)} > {self.ratio}")
+        if self.seeding_time is not None:
+            if seeding_time <= self.seeding_time:
+                return None
+            reasons.append(f"做种时间 {round(seeding_time / 3600, 1)} 小时 > {self.seeding_time / 3600:g} 小时")
+        if self.min_size is not None:
+            if size >= self.max_size or size <= self.min_size:
+                return None
+            reasons.append(f"大小 {StringUtils.str_filesize(size)} 在区间内")
+        if self.upspeed is not None:
+            if upload_avs >= self.upspeed:
+                return None
+            reasons.append(f"平均上传速度 {StringUtils.str_filesize(upload_avs)}/s < {self.upspeed / 1024:g}KB/s")
+        return reasons
+
+    def match_qb(self, torrent: Any) -> Optional[dict]:
+        """
+        检查QB下载任务是否符合条件
+        """
+        # 完成时间
+        date_done = torrent.completion_on if torrent.completion_on > 0 else torrent.added_on
+        # 做种时间
+        seeding_time = self.now - date_done if date_done else 0
+        # 平均上传速度
+        upload_avs = torrent.uploaded / seeding_time if seeding_time else 0
+        reasons = self.__check(size=torrent.size, ratio=torrent.ratio,
+                               seeding_time=seeding_time, upload_avs=upload_avs)
+        if reasons is None:
+            return None
+        if self.path_re:
+            if not self.path_re.search(torrent.save_path):
+                return None
+            reasons.append("保存路径匹配")
+        if self.tracker_re:
+            if not self.tracker_re.search(torrent.tracker):
+                return None
+            reasons.append("Tracker匹配")
+        if self.states is not None:
+            if torrent.state not in self.states:
+                return None
+            reasons.append(f"状态 {torrent.state}")
+        if self.categorys is not None:
+            if not torrent.category or torrent.category not in self.categorys:
+                return None
+            reasons.append(f"分类 {torrent.category}")
+        return {
+            "id": torrent.hash,
+            "name": torrent.name,
+            "site": StringUtils.get_url_sld(torrent.tracker),
+            "size": torrent.size,
+            "content_path": torrent.content_path,
+            "reasons": reasons
+        }
+
+    def match_tr(self, torrent: Any) -> Optional[dict]:
+        """
+        检查TR下载任务是否符合条件
+        """
+        # 完成时间
+        date_done = torrent.date_done or torrent.date_added
+        # 做种时间
+        seeding_time = self.now - int(time.mktime(date_done.timetuple())) if date_done else 0
+        # 上传量
+        uploaded = torrent.ratio * torrent.total_size
+        # 平均上传速度
+        upload_avs = uploaded / seeding_time if seeding_time else 0
+        reasons = self.__check(size=torrent.total_size, ratio=torrent.ratio,
+                               seeding_time=seeding_time, upload_avs=upload_avs)
+        if reasons is None:
+            return None
+        if self.path_re:
+            if not self.path_re.search(torrent.download_dir):
+                return None
+            reasons.append("保存路径匹配")
+        if self.tracker_re:
+            if not torrent.trackers \
+                    or not any(self.tracker_re.search(tracker.get("announce", "")) for tracker in torrent.trackers):
+                return None
+            reasons.append("Tracker匹配")
+        if self.error_re:
+            if not self.error_re.search(torrent.error_string):
+                return None
+            reasons.append("错误信息匹配")
+        return {
+            "id": torrent.hashString,
+            "name": torrent.name,
+            "site": torrent.trackers[0].get("sitename") if torrent.trackers else "",
+            "size": torrent.total_size,
+            "content_path": os.path.join(torrent.download_dir or "", torrent.name or ""),
+            "reasons": reasons
+        }
@@ -4,7 +4,7 @@ from datetime import datetime, timedelta
 from multiprocessing.dummy import Pool as ThreadPool
 from multiprocessing.pool import ThreadPool
 from typing import Any, List, Dict, Tuple, Optional
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
 
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
@@ -17,12 +17,13 @@ from app.core.config import settings
 from app.core.event import EventManager, eventmanager, Event
 from app.db.site_oper import SiteOper
 from app.db.sitestatistic_oper import SiteStatisticOper
-from app.helper.browser import PlaywrightHelper
 from app.helper.cloudflare import under_challenge
 from app.helper.module import ModuleHelper
 from app.helper.sites import SitesHelper
 from app.log import logger
 from app.plugins import _PluginBase
+from app.plugins.autosignin.browser_pool import BrowserPool
+from app.plugins.autosignin.engine import SigninEngine
 from app.schemas.types import EventType, NotificationType
 from app.utils.http import RequestUtils
 from app.utils.site import SiteUtils
@@ -38,7 +39,7 @@ class AutoSignIn(_PluginBase):
     # 插件图标
     plugin_icon = "signin.png"
     # 插件版本
-    plugin_version = "2.4.3"
+    plugin_version = "2.6"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -61,6 +62,8 @@ class AutoSignIn(_PluginBase):
     _scheduler: Optional[BackgroundScheduler] = None
     # 加载的模块
     _site_schema: list = []
+    # 站点域名 -> 签到处理实例，None表示使用通用处理
+    _site_handlers: Dict[str, Any] = {}
 
     # 配置属性
     _enabled: bool = False
@@ -75,6 +78,9 @@ class AutoSignIn(_PluginBase):
     _start_time: int = None
     _end_time: int = None
     _auto_cf: int = 0
+    _signin_timeout: int = 30
+    _retry_times: int = 2
+    _max_duration: int = 0
 
     def init_plugin(self, config: dict = None):
         self.sites = SitesHelper()
@@ -98,6 +104,9 @@ class AutoSignIn(_PluginBase):
             self._retry_keyword = config.get("retry_keyword")
             self._auto_cf = config.get("auto_cf")
             self._clean = config.get("clean")
+            self._signin_timeout = self.__to_int(config.get("signin_timeout"), 30)
+            self._retry_times = self.__to_int(config.get("retry_times"), 2)
+            self._max_duration = self.__to_int(config.get("max_duration"), 0)
 
             # 过滤掉已删除的站点
             all_sites = [site.id for site in self.siteoper.list_order_by_pri()] + [site.get("id") for site in
@@ -112,6 +121,7 @@ class AutoSignIn(_PluginBase):
 
             self._site_schema = ModuleHelper.load('app.plugins.autosignin.sites',
                                                   filter_func=lambda _, obj: hasattr(obj, 'match'))
+            self.__build_handlers()
 
             # 立即运行一次
             if self._onlyonce:
@@ -135,6 +145,13 @@ class AutoSignIn(_PluginBase):
     def get_state(self) -> bool:
         return self._enabled
 
+    @staticmethod
+    def __to_int(value: Any, default: int) -> int:
+        try:
+            return int(value) if value not in (None, "") else default
+        except (TypeError, ValueError):
+            return default
+
     def __update_config(self):
         # 保存配置
         self.update_config(
@@ -149,6 +166,9 @@ class AutoSignIn(_PluginBase):
                 "retry_keyword": self._retry_keyword,
                 "auto_cf": self._auto_cf,
                 "clean": self._clean,
+                "signin_timeout": self._signin_timeout,
+                "retry_times": self._retry_times,
+                "max_duration": self._max_duration,
             }
         )
 
@@ -184,6 +204,12 @@ class AutoSignIn(_PluginBase):
             "methods": ["GET"],
             "summary": "站点签到",
             "description": "使用站点域名签到站点",
+        }, {
+            "path": "/render_metrics",
+            "endpoint": self.render_metrics,
+            "methods": ["GET"],
+            "summary": "仿真渲染指标",
+            "description": "查询各站点仿真渲染耗时",
         }]
 
     def get_service(self) -> List[Dict[str, Any]]:
@@ -423,6 +449,62 @@ class AutoSignIn(_PluginBase):
                             }
                         ]
                     },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'signin_timeout',
+                                            'label': '单站超时（秒）',
+                                            'placeholder': '30'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'retry_times',
+                                            'label': '失败重试次数',
+                                            'placeholder': '无法访问等临时错误立即重试，0-关闭'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'max_duration',
+                                            'label': '任务总时长（分钟）',
+                                            'placeholder': '超时后未开始的站点跳过，0-不限制'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
                     {
                         'component': 'VRow',
                         'content': [
@@ -521,7 +603,10 @@ class AutoSignIn(_PluginBase):
             "queue_cnt": 5,
             "sign_sites": [],
             "login_sites": [],
-            "retry_keyword": "错误|失败"
+            "retry_keyword": "错误|失败",
+            "signin_timeout": 30,
+            "retry_times": 2,
+            "max_duration": 0
         }
 
     def __custom_sites(self) -> List[Any]:
@@ -710,12 +795,16 @@ class AutoSignIn(_PluginBase):
 
         # 执行签到
         logger.info(f"开始执行{type_str}任务 ...")
-        if type_str == "签到":
-            with ThreadPool(min(len(do_sites), int(self._queue_cnt))) as p:
-                status = p.map(self.signin_site, do_sites)
-        else:
-            with ThreadPool(min(len(do_sites), int(self._queue_cnt))) as p:
-                status = p.map(self.login_site, do_sites)
+        engine = self.__build_engine()
+        try:
+            if type_str == "签到":
+                with ThreadPool(min(len(do_sites), int(self._queue_cnt))) as p:
+                    status = p.map(lambda site: self.signin_site(site, engine=engine), do_sites)
+            else:
+                with ThreadPool(min(len(do_sites), int(self._queue_cnt))) as p:
+                    status = p.map(lambda site: self.login_site(site, engine=engine), do_sites)
+        finally:
+            engine.close()
 
         if status:
             logger.info(f"站点{type_str}任务完成！")
@@ -835,7 +924,18 @@ class AutoSignIn(_PluginBase):
         # 保存配置
         self.__update_config()
 
-    def __build_class(self, url) -> Any:
+    @staticmethod
+    def __handler_key(url: str) -> str:
+        """
+        站点Url转换为路由表的键：小写的域名（含端口），去掉www.前缀
+        """
+        if not url:
+            return ""
+        netloc = urlparse(url).netloc if url.startswith("http") else url.split("/")[0]
+        netloc = netloc.lower()
+        return netloc[4:] if netloc.startswith("www.") else netloc
+
+    def __match_class(self, url: str) -> Any:
         for site_schema in self._site_schema:
             try:
                 if site_schema.match(url):
@@ -844,6 +944,32 @@ class AutoSignIn(_PluginBase):
                 logger.error("站点模块加载失败：%s" % str(e))
         return None
 
+    def __build_handlers(self):
+        """
+        模块加载后预先建立域名到签到处理实例的路由表，签到类不保存状态，实例可重复使用
+        """
+        handlers = {}
+        for site_schema in self._site_schema:
+            key = self.__handler_key(site_schema.site_url)
+            if not key or key in handlers:
+                continue
+            # 按模块顺序匹配，与逐个调用match的结果保持一致
+            site_module = self.__match_class(key)
+            handlers[key] = site_module() if site_module else None
+        self._site_handlers = handlers
+
+    def __build_class(self, url) -> Any:
+        """
+        根据站点Url获取签到处理实例，未命中路由表时逐个匹配一次并缓存结果，无专属模块返回None
+        """
+        key = self.__handler_key(url)
+        if key in self._site_handlers:
+            return self._site_handlers[key]
+        site_module = self.__match_class(url)
+        handler = site_module() if site_module else None
+        self._site_handlers[key] = handler
+        return handler
+
     def signin_by_domain(self, url: str, apikey: str) -> schemas.Response:
         """
         签到一个站点，可由API调用
@@ -864,28 +990,58 @@ class AutoSignIn(_PluginBase):
                 message=self.signin_site(site_info)
             )
 
-    def signin_site(self, site_info: CommentedMap) -> Tuple[str, str]:
+    @staticmethod
+    def render_metrics(apikey: str) -> schemas.Response:
         """
-        签到一个站点
+        查询各站点仿真渲染耗时，可由API调用
         """
-        site_module = self.__build_class(site_info.get("url"))
-        # 开始记时
-        start_time = datetime.now()
-        if site_module and hasattr(site_module, "signin"):
-            try:
-                state, message = site_module().signin(site_info)
-            except Exception as e:
-                traceback.print_exc()
-                state, message = False, f"签到失败：{str(e)}"
-        else:
-            state, message = self.__signin_base(site_info)
-        # 统计
-        seconds = (datetime.now() - start_time).seconds
-        domain = StringUtils.get_url_domain(site_info.get('url'))
+        if apikey != settings.API_TOKEN:
+            return schemas.Response(success=False, message="API密钥错误")
+        return schemas.Response(success=True, data=BrowserPool.instance().metrics())
+
+    def __build_engine(self) -> SigninEngine:
+        """
+        创建签到执行引擎，每个站点的最终结果记录到站点统计
+        """
+        return SigninEngine(timeout=self._signin_timeout,
+                            retries=self._retry_times,
+                            max_duration=self._max_duration * 60,
+                            on_result=self.__record_result)
+
+    def __record_result(self, domain: str, state: bool, seconds: float):
         if state:
-            self.sitestatistic.success(domain=domain, seconds=seconds)
+            self.sitestatistic.success(domain=domain, seconds=int(seconds))
         else:
             self.sitestatistic.fail(domain)
+
+    def __execute(self, site_info: CommentedMap, func, engine: SigninEngine = None) -> Tuple[bool, str]:
+        """
+        在签到引擎中执行，未指定引擎时单独创建
+        """
+        if engine:
+            return engine.execute(site_info, func)
+        engine = self.__build_engine()
+        try:
+            return engine.execute(site_info, func)
+        finally:
+            engine.close()
+
+    def signin_site(self, site_info: CommentedMap, engine: SigninEngine = None) -> Tuple[str, str]:
+        """
+        签到一个站点
+        """
+        site_module = self.__build_class(site_info.get("url"))
+
+        def __signin(_site_info: CommentedMap) -> Tuple[bool, str]:
+            if site_module and hasattr(site_module, "signin"):
+                try:
+                    return site_module.signin(_site_info)
+                except Exception as e:
+                    traceback.print_exc()
+                    return False, f"签到失败：{str(e)}"
+            return self.__signin_base(_site_info)
+
+        state, message = self.__execute(site_info, __signin, engine=engine)
         return site_info.get("name"), message
 
     @staticmethod
@@ -916,10 +1072,11 @@ class AutoSignIn(_PluginBase):
                 checkin_url = urljoin(site_url, "attendance.php")
             logger.info(f"开始站点签到：{site}，地址：{checkin_url}...")
             if render:
-                page_source = PlaywrightHelper().get_page_source(url=checkin_url,
-                                                                 cookies=site_cookie,
-                                                                 ua=ua,
-                                                                 proxies=proxy_server)
+                page_source = BrowserPool.instance().get_page_source(url=checkin_url,
+                                                                     cookies=site_cookie,
+                                                                     ua=ua,
+                                                                     proxies=proxy_server,
+                                                                     site=site)
                 if not SiteUtils.is_logged_in(page_source):
                     if under_challenge(page_source):
                         return False, f"无法通过Cloudflare！"
@@ -933,13 +1090,17 @@ class AutoSignIn(_PluginBase):
             else:
                 res = RequestUtils(cookies=site_cookie,
                                    ua=ua,
-                                   proxies=proxies
+                                   proxies=proxies,
+                                   session=SigninEngine.current_session(),
+                                   timeout=SigninEngine.current_timeout()
                                    ).get_res(url=checkin_url)
                 if not res and site_url != checkin_url:
                     logger.info(f"开始站点模拟登录：{site}，地址：{site_url}...")
                     res = RequestUtils(cookies=site_cookie,
                                        ua=ua,
-                                       proxies=proxies
+                                       proxies=proxies,
+                                       session=SigninEngine.current_session(),
+                                       timeout=SigninEngine.current_timeout()
                                        ).get_res(url=site_url)
                 # 判断登录状态
                 if res and res.status_code in [200, 500, 403]:
@@ -966,28 +1127,22 @@ class AutoSignIn(_PluginBase):
             traceback.print_exc()
             return False, f"签到失败：{str(e)}！"
 
-    def login_site(self, site_info: CommentedMap) -> Tuple[str, str]:
+    def login_site(self, site_info: CommentedMap, engine: SigninEngine = None) -> Tuple[str, str]:
         """
         模拟登录一个站点
         """
         site_module = self.__build_class(site_info.get("url"))
-        # 开始记时
-        start_time = datetime.now()
-        if site_module and hasattr(site_module, "login"):
-            try:
-                state, message = site_module().login(site_info)
-            except Exception as e:
-                traceback.print_exc()
-                state, message = False, f"模拟登录失败：{str(e)}"
-        else:
-            state, message = self.__login_base(site_info)
-        # 统计
-        seconds = (datetime.now() - start_time).seconds
-        domain = StringUtils.get_url_domain(site_info.get('url'))
-        if state:
-            self.sitestatistic.success(domain=domain, seconds=seconds)
-        else:
-            self.sitestatistic.fail(domain)
+
+        def __login(_site_info: CommentedMap) -> Tuple[bool, str]:
+            if site_module and hasattr(site_module, "login"):
+                try:
+                    return site_module.login(_site_info)
+                except Exception as e:
+                    traceback.print_exc()
+                    return False, f"模拟登录失败：{str(e)}"
+            return self.__login_base(_site_info)
+
+        state, message = self.__execute(site_info, __login, engine=engine)
         return site_info.get("name"), message
 
     @staticmethod
@@ -1015,10 +1170,11 @@ class AutoSignIn(_PluginBase):
             site_url = str(site_url).replace("attendance.php", "")
             logger.info(f"开始站点模拟登录：{site}，地址：{site_url}...")
             if render:
-                page_source = PlaywrightHelper().get_page_source(url=site_url,
-                                                                 cookies=site_cookie,
-                                                                 ua=ua,
-                                                                 proxies=proxy_server)
+                page_source = BrowserPool.instance().get_page_source(url=site_url,
+                                                                     cookies=site_cookie,
+                                                                     ua=ua,
+                                                                     proxies=proxy_server,
+                                                                     site=site)
                 if not SiteUtils.is_logged_in(page_source):
                     if under_challenge(page_source):
                         return False, f"无法通过Cloudflare！"
@@ -1028,7 +1184,9 @@ class AutoSignIn(_PluginBase):
             else:
                 res = RequestUtils(cookies=site_cookie,
                                    ua=ua,
-                                   proxies=proxies
+                                   proxies=proxies,
+                                   session=SigninEngine.current_session(),
+                                   timeout=SigninEngine.current_timeout()
                                    ).get_res(url=site_url)
                 # 判断登录状态
                 if res and res.status_code in [200, 500, 403]:
@@ -1065,6 +1223,8 @@ class AutoSignIn(_PluginBase):
                 if self._scheduler.running:
                     self._scheduler.shutdown()
                 self._scheduler = None
+            # 关闭仿真浏览器
+            BrowserPool.close_instance()
         except Exception as e:
             logger.error("退出插件失败：%s" % str(e))
 
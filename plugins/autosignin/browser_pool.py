@@ -0,0 +1,286 @@
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from queue import Queue, Empty
+from threading import Lock, Thread, current_thread
+from typing import Optional, Dict, List
+
+from app.core.config import settings
+from app.log import logger
+
+
+class _RenderJob:
+    """
+    一次仿真渲染请求
+    """
+
+    def __init__(self, url: str, site: str, cookies: str = None, ua: str = None,
+                 proxies: dict = None, timeout: int = 20):
+        self.url = url
+        self.site = site
+        self.cookies = cookies
+        self.ua = ua
+        self.proxies = proxies
+        self.timeout = timeout
+        self.future = Future()
+
+
+class BrowserPool:
+    """
+    共享的仿真浏览器池
+    playwright同步接口的对象只能在创建它的线程中使用，因此每个浏览器由一个常驻线程持有，
+    渲染请求通过队列交给这些线程执行；每个站点使用独立的浏览器上下文，隔离Cookie和UA，
+    浏览器空闲超时后自动关闭
+    """
+
+    _instance: Optional["BrowserPool"] = None
+    _instance_lock = Lock()
+
+    def __init__(self, max_browsers: int = 2, max_contexts: int = 8, idle_timeout: int = 300):
+        # 最大浏览器（线程）数
+        self.max_browsers = max_browsers
+        # 每个浏览器最多保留的站点上下文数
+        self.max_contexts = max_contexts
+        # 浏览器空闲关闭时间（秒）
+        self.idle_timeout = idle_timeout
+        self._queue: Queue = Queue()
+        self._lock = Lock()
+        self._workers: List[Thread] = []
+        self._idle = 0
+        self._stopped = False
+        # 站点 -> 渲染耗时统计
+        self._metrics: Dict[str, dict] = {}
+
+    @classmethod
+    def instance(cls) -> "BrowserPool":
+        """
+        进程内共享的浏览器池，签到、登录、站点数据统计共用
+        """
+        with cls._instance_lock:
+            if not cls._instance:
+                cls._instance = cls()
+            return cls._instance
+
+    @classmethod
+    def close_instance(cls):
+        """
+        关闭共享的浏览器池，之后的请求会重新创建
+        """
+        with cls._instance_lock:
+            if cls._instance:
+                cls._instance.shutdown()
+                cls._instance = None
+
+    def shutdown(self):
+        """
+        关闭浏览器池：排队中的请求直接返回，浏览器线程处理完当前请求后关闭浏览器并退出
+        """
+        pending = []
+        with self._lock:
+            self._stopped = True
+            while True:
+                try:
+                    pending.append(self._queue.get_nowait())
+                except Empty:
+                    break
+            # 每个浏览器线程一个退出标记
+            for _ in self._workers:
+                self._queue.put(None)
+        for job in pending:
+            if job and not job.future.done():
+                job.future.set_result("")
+
+    def get_page_source(self, url: str, cookies: str = None, ua: str = None, proxies: dict = None,
+                        site: str = None, timeout: int = 20) -> str:
+        """
+        获取页面源码，参数与PlaywrightHelper().get_page_source保持一致
+        :param url: Url地址
+        :param cookies: Cookie
+        :param ua: UA
+        :param proxies: 代理服务器
+        :param site: 站点标识，用于隔离上下文和统计耗时，默认使用Url的域名
+        :param timeout: 页面加载超时时间（秒）
+        """
+        if not site:
+            site = url.split("//")[-1].split("/")[0]
+        job = _RenderJob(url=url, site=site, cookies=cookies, ua=ua, proxies=proxies, timeout=timeout)
+        self.__dispatch(job)
+        try:
+            # 除页面加载外还需预留浏览器启动和Cloudflare验证的时间
+            return job.future.result(timeout=timeout * 3 + 60)
+        except FutureTimeoutError:
+            logger.error(f"站点 {site} 仿真获取网页源码超时")
+        except Exception as e:
+            logger.error(f"站点 {site} 仿真获取网页源码失败：{str(e)}")
+        return ""
+
+    def metrics(self) -> List[dict]:
+        """
+        各站点仿真渲染耗时，按平均耗时倒序
+        """
+        with self._lock:
+            metrics = [dict(site=site, **stat) for site, stat in self._metrics.items()]
+        return sorted(metrics, key=lambda x: x.get("avg_latency") or 0, reverse=True)
+
+    def __dispatch(self, job: _RenderJob):
+        """
+        投递渲染请求，没有空闲浏览器且未达上限时启动新的浏览器线程
+        """
+        with self._lock:
+            if self._stopped:
+                job.future.set_result("")
+                return
+            self._workers = [worker for worker in self._workers if worker.is_alive()]
+            if self._idle <= self._queue.qsize() and len(self._workers) < max(self.max_browsers, 1):
+                worker = Thread(target=self.__worker, name=f"BrowserPool-{len(self._workers)}", daemon=True)
+                self._workers.append(worker)
+                worker.start()
+            self._queue.put(job)
+
+    def __record(self, site: str, latency: float, success: bool):
+        with self._lock:
+            stat = self._metrics.setdefault(site, {
+                "renders": 0,
+                "failures": 0,
+                "latency": 0,
+                "avg_latency": 0
+            })
+            stat["renders"] += 1
+            if not success:
+                stat["failures"] += 1
+            stat["latency"] = round(latency, 3)
+            stat["avg_latency"] = round(stat["avg_latency"] + (latency - stat["avg_latency"]) / stat["renders"], 3)
+
+    def __worker(self):
+        """
+        浏览器线程，持有一个浏览器及若干站点上下文
+        """
+        playwright = None
+        browser = None
+        # (站点, UA, 代理) -> 浏览器上下文
+        contexts: OrderedDict = OrderedDict()
+        # 当前线程是否计入空闲数
+        idle = False
+        # 是否空闲超时正常退出
+        idle_exit = False
+
+        def stop_playwright():
+            if playwright:
+                try:
+                    playwright.stop()
+                except Exception as err:
+                    logger.debug(f"停止playwright失败：{str(err)}")
+
+        def close_all():
+            for context in contexts.values():
+                try:
+                    context.close()
+                except Exception as err:
+                    logger.debug(f"关闭浏览器上下文失败：{str(err)}")
+            contexts.clear()
+            if browser:
+                try:
+                    browser.close()
+                except Exception as err:
+                    logger.debug(f"关闭浏览器失败：{str(err)}")
+            stop_playwright()
+
+        with self._lock:
+            self._idle += 1
+            idle = True
+        try:
+            from cf_clearance import sync_cf_retry, sync_stealth
+            from playwright.sync_api import sync_playwright
+
+            while True:
+                try:
+                    job: _RenderJob = self._queue.get(timeout=self.idle_timeout)
+                except Empty:
+                    with self._lock:
+                        # 空闲超时且没有待处理请求，关闭浏览器并退出线程
+                        if self._queue.empty():
+                            self._idle -= 1
+                            idle = False
+                            self._workers = [worker for worker in self._workers
+                                             if worker is not current_thread()]
+                            idle_exit = True
+                            break
+                    continue
+                with self._lock:
+                    self._idle -= 1
+                    idle = False
+                    if job is None:
+                        # 浏览器池已关闭
+                        self._workers = [worker for worker in self._workers
+                                         if worker is not current_thread()]
+                        idle_exit = True
+                        break
+                start = time.time()
+                source = ""
+                try:
+                    if not browser:
+                        playwright = sync_playwright().start()
+                        browser = playwright[settings.PLAYWRIGHT_BROWSER_TYPE].launch(headless=False)
+                        logger.info("仿真浏览器已启动")
+                    key = (job.site, job.ua, str(job.proxies))
+                    context = contexts.get(key)
+                    if context:
+                        contexts.move_to_end(key)
+                    else:
+                        context = browser.new_context(user_agent=job.ua, proxy=job.proxies)
+                        contexts[key] = context
+                        # 超出上限时关闭最久未使用的上下文
+                        while len(contexts) > max(self.max_contexts, 1):
+                            _, expired = contexts.popitem(last=False)
+                            expired.close()
+                    page = context.new_page()
+                    try:
+                        if job.cookies:
+                            page.set_extra_http_headers({"cookie": job.cookies})
+                        sync_stealth(page, pure=True)
+                        page.goto(job.url)
+                        if not sync_cf_retry(page)[0]:
+                            logger.warn(f"站点 {job.site} cloudflare challenge fail！")
+                        page.wait_for_load_state("networkidle", timeout=job.timeout * 1000)
+                        source = page.content()
+                    finally:
+                        page.close()
+                except Exception as e:
+                    logger.error(f"站点 {job.site} 仿真获取网页源码失败：{str(e)}")
+                    if not browser or not browser.is_connected():
+                        # 浏览器启动失败或已崩溃，停止playwright，下次请求时重新启动
+                        contexts.clear()
+                        browser = None
+                        stop_playwright()
+                        playwright = None
+                finally:
+                    latency = time.time() - start
+                    self.__record(site=job.site, latency=latency, success=bool(source))
+                    logger.debug(f"站点 {job.site} 仿真渲染耗时 {latency:.2f} 秒")
+                    job.future.set_result(source)
+                    with self._lock:
+                        self._idle += 1
+                        idle = True
+        except Exception as e:
+            logger.error(f"仿真浏览器线程异常退出：{str(e)}")
+        finally:
+            close_all()
+            pending = []
+            if not idle_exit:
+                # 异常退出时移出线程列表，使后续请求可以启动新的浏览器线程
+                with self._lock:
+                    if idle:
+                        self._idle -= 1
+                    self._workers = [worker for worker in self._workers
+                                     if worker is not current_thread() and worker.is_alive()]
+                    # 没有其它浏览器线程时，排队中的请求直接返回，避免等待到超时
+                    if not self._workers:
+                        while True:
+                            try:
+                                pending.append(self._queue.get_nowait())
+                            except Empty:
+                                break
+            for job in pending:
+                if not job.future.done():
+                    job.future.set_result("")
+            logger.info("仿真浏览器已关闭")
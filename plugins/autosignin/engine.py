@@ -0,0 +1,135 @@
+import re
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from ruamel.yaml import CommentedMap
+
+from app.log import logger
+from app.utils.string import StringUtils
+
+
+class SigninEngine:
+    """
+    签到执行引擎
+    每个站点复用一个会话（保持连接和Cookie），单站点超时，同一次运行内按指数退避重试临时性失败，
+    并限制整个任务的总时长，避免少数无法访问的站点拖长签到时间
+    """
+
+    # 可重试的临时性失败
+    _retry_pattern = re.compile(r"无法打开网站|无法访问|超时|timeout|timed out|Connection|连接|状态码：5\d\d",
+                                re.IGNORECASE)
+
+    # 当前线程正在执行的站点上下文
+    _local = threading.local()
+
+    def __init__(self, timeout: int = 30, retries: int = 2, backoff: float = 2, max_duration: int = 0,
+                 on_result: Callable[[str, bool, float], None] = None):
+        """
+        :param timeout: 单次请求超时时间（秒）
+        :param retries: 临时性失败的重试次数
+        :param backoff: 首次重试的等待时间（秒），之后逐次翻倍
+        :param max_duration: 任务总时长上限（秒），0为不限制
+        :param on_result: 站点最终结果的回调（重试结束后只调用一次），参数为域名、是否成功、最后一次尝试的耗时（秒）
+        """
+        self.timeout = timeout
+        self.retries = max(retries, 0)
+        self.backoff = backoff
+        self.deadline = time.time() + max_duration if max_duration else None
+        self.on_result = on_result
+        # 站点域名 -> 会话
+        self._sessions: Dict[str, Session] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def current_session(cls) -> Optional[Session]:
+        """
+        当前线程正在签到站点的会话，不在引擎中执行时返回None
+        """
+        return getattr(cls._local, "session", None)
+
+    @classmethod
+    def current_timeout(cls) -> Optional[int]:
+        """
+        当前线程正在签到站点的超时时间
+        """
+        return getattr(cls._local, "timeout", None)
+
+    def session(self, domain: str) -> Session:
+        """
+        获取站点会话，同一站点的多次请求和重试复用连接与Cookie
+        """
+        with self._lock:
+            session = self._sessions.get(domain)
+            if not session:
+                session = Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[domain] = session
+            return session
+
+    def remaining(self) -> Optional[float]:
+        """
+        距离总时长上限的剩余秒数，不限制时返回None
+        """
+        if not self.deadline:
+            return None
+        return self.deadline - time.time()
+
+    def is_retryable(self, message: str) -> bool:
+        return bool(message and self._retry_pattern.search(message))
+
+    def execute(self, site_info: CommentedMap,
+                func: Callable[[CommentedMap], Tuple[bool, str]]) -> Tuple[bool, str]:
+        """
+        在引擎中执行一个站点的签到或登录
+        :param site_info: 站点信息
+        :param func: 签到或登录方法
+        :return: 是否成功、结果信息
+        """
+        site = site_info.get("name")
+        domain = StringUtils.get_url_domain(site_info.get("url"))
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            logger.warn(f"{site} 已超出任务总时长，跳过")
+            return False, "已超出任务总时长，跳过"
+        self._local.session = self.session(domain)
+        self._local.timeout = self.timeout
+        try:
+            attempt = 0
+            while True:
+                start = time.time()
+                try:
+                    state, message = func(site_info)
+                except Exception as e:
+                    state, message = False, f"执行失败：{str(e)}"
+                seconds = time.time() - start
+                if state or attempt >= self.retries or not self.is_retryable(message):
+                    break
+                # 指数退避，不超过剩余时长
+                wait = self.backoff * (2 ** attempt)
+                remaining = self.remaining()
+                if remaining is not None and remaining <= wait:
+                    logger.warn(f"{site} 剩余时长不足，不再重试")
+                    break
+                attempt += 1
+                logger.info(f"{site} {message}，{wait:.0f} 秒后第 {attempt} 次重试 ...")
+                time.sleep(wait)
+            if self.on_result:
+                self.on_result(domain, state, seconds)
+            return state, message
+        finally:
+            self._local.session = None
+            self._local.timeout = None
+
+    def close(self):
+        """
+        关闭所有站点会话
+        """
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
@@ -7,8 +7,9 @@ import chardet
 from ruamel.yaml import CommentedMap
 
 from app.core.config import settings
-from app.helper.browser import PlaywrightHelper
 from app.log import logger
+from app.plugins.autosignin.browser_pool import BrowserPool
+from app.plugins.autosignin.engine import SigninEngine
 from app.utils.http import RequestUtils
 from app.utils.string import StringUtils
 
@@ -41,6 +42,15 @@ class _ISiteSigninHandler(metaclass=ABCMeta):
         """
         pass
 
+    @staticmethod
+    def request_utils(**kwargs) -> RequestUtils:
+        """
+        创建请求工具，在签到引擎中执行时复用站点会话并使用站点超时设置
+        """
+        kwargs.setdefault("session", SigninEngine.current_session())
+        kwargs.setdefault("timeout", SigninEngine.current_timeout())
+        return RequestUtils(**kwargs)
+
     @staticmethod
     def get_page_source(url: str, cookie: str, ua: str, proxy: bool, render: bool, token: str = None) -> str:
         """
@@ -54,10 +64,10 @@ class _ISiteSigninHandler(metaclass=ABCMeta):
         :return: 页面源码，错误信息
         """
         if render:
-            return PlaywrightHelper().get_page_source(url=url,
-                                                      cookies=cookie,
-                                                      ua=ua,
-                                                      proxies=settings.PROXY_SERVER if proxy else None)
+            return BrowserPool.instance().get_page_source(url=url,
+                                                          cookies=cookie,
+                                                          ua=ua,
+                                                          proxies=settings.PROXY_SERVER if proxy else None)
         else:
             if token:
                 headers = {
@@ -69,8 +79,8 @@ class _ISiteSigninHandler(metaclass=ABCMeta):
                     "User-Agent": ua,
                     "Cookie": cookie
                 }
-            res = RequestUtils(headers=headers,
-                               proxies=settings.PROXY if proxy else None).get_res(url=url)
+            res = _ISiteSigninHandler.request_utils(headers=headers,
+                                                    proxies=settings.PROXY if proxy else None).get_res(url=url)
             if res is not None:
                 # 使用chardet检测字符编码
                 raw_data = res.content
@@ -6,7 +6,6 @@ from ruamel.yaml import CommentedMap
 from app.core.config import settings
 from app.log import logger
 from app.plugins.autosignin.sites import _ISiteSigninHandler
-from app.utils.http import RequestUtils
 from app.utils.string import StringUtils
 
 
@@ -64,10 +63,10 @@ class Hares(_ISiteSigninHandler):
             'Accept': 'application/json',
             "User-Agent": ua
         }
-        sign_res = RequestUtils(cookies=site_cookie,
-                                headers=headers,
-                                proxies=settings.PROXY if proxy else None
-                                ).get_res(url="https://club.hares.top/attendance.php?action=sign")
+        sign_res = self.request_utils(cookies=site_cookie,
+                                      headers=headers,
+                                      proxies=settings.PROXY if proxy else None
+                                      ).get_res(url="https://club.hares.top/attendance.php?action=sign")
         if not sign_res or sign_res.status_code != 200:
             logger.error(f"{site} 签到失败，签到接口请求失败")
             return False, '签到失败，签到接口请求失败'
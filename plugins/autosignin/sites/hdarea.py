@@ -5,7 +5,6 @@ from ruamel.yaml import CommentedMap
 from app.core.config import settings
 from app.log import logger
 from app.plugins.autosignin.sites import _ISiteSigninHandler
-from app.utils.http import RequestUtils
 from app.utils.string import StringUtils
 
 
@@ -45,10 +44,10 @@ class HDArea(_ISiteSigninHandler):
         data = {
             'action': 'sign_in'
         }
-        html_res = RequestUtils(cookies=site_cookie,
-                                ua=ua,
-                                proxies=proxies
-                                ).post_res(url="https://www.hdarea.club/sign_in.php", data=data)
+        html_res = self.request_utils(cookies=site_cookie,
+                                      ua=ua,
+                                      proxies=proxies
+                                      ).post_res(url="https://www.hdarea.club/sign_in.php", data=data)
         if not html_res or html_res.status_code != 200:
             logger.error(f"{site} 签到失败，请检查站点连通性")
             return False, '签到失败，请检查站点连通性'
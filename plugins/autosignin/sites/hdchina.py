@@ -7,7 +7,6 @@ from ruamel.yaml import CommentedMap
 from app.core.config import settings
 from app.log import logger
 from app.plugins.autosignin.sites import _ISiteSigninHandler
-from app.utils.http import RequestUtils
 from app.utils.string import StringUtils
 
 
@@ -57,10 +56,10 @@ class HDChina(_ISiteSigninHandler):
 
         site_cookie = cookie
         # 获取页面html
-        html_res = RequestUtils(cookies=site_cookie,
-                                ua=ua,
-                                proxies=proxies
-                                ).get_res(url="https://hdchina.org/index.php")
+        html_res = self.request_utils(cookies=site_cookie,
+                                      ua=ua,
+                                      proxies=proxies
+                                      ).get_res(url="https://hdchina.org/index.php")
         if not html_res or html_res.status_code != 200:
             logger.error(f"{site} 签到失败，请检查站点连通性")
             return False, '签到失败，请检查站点连通性'
@@ -97,10 +96,10 @@ class HDChina(_ISiteSigninHandler):
         data = {
             'csrf': x_csrf
         }
-        sign_res = RequestUtils(cookies=site_cookie,
-                                ua=ua,
-                                proxies=proxies
-                                ).post_res(url="https://hdchina.org/plugin_sign-in.php?cmd=signin", data=data)
+        sign_res = self.request_utils(cookies=site_cookie,
+                                      ua=ua,
+                                      proxies=proxies
+                                      ).post_res(url="https://hdchina.org/plugin_sign-in.php?cmd=signin", data=data)
         if not sign_res or sign_res.status_code != 200:
             logger.error(f"{site} 签到失败，签到接口请求失败")
             return False, '签到失败，签到接口请求失败'
@@ -8,7 +8,6 @@ from app.core.config import settings
 from app.helper.ocr import OcrHelper
 from app.log import logger
 from app.plugins.autosignin.sites import _ISiteSigninHandler
-from app.utils.http import RequestUtils
 from app.utils.string import StringUtils
 
 
@@ -68,14 +67,14 @@ class HDSky(_ISiteSigninHandler):
         res_times = 0
         img_hash = None
         while not img_hash and res_times <= 3:
-            image_res = RequestUtils(cookies=site_cookie,
-                                     ua=ua,
-                                     content_type='application/x-www-form-urlencoded; charset=UTF-8',
-                                     referer="https://hdsky.me/index.php",
-                                     accept_type="*/*",
-                                     proxies=settings.PROXY if proxy else None
-                                     ).post_res(url='https://hdsky.me/image_code_ajax.php',
-                                                data={'action': 'new'})
+            image_res = self.request_utils(cookies=site_cookie,
+                                           ua=ua,
+                                           content_type='application/x-www-form-urlencoded; charset=UTF-8',
+                                           referer="https://hdsky.me/index.php",
+                                           accept_type="*/*",
+                                           proxies=settings.PROXY if proxy else None
+                                           ).post_res(url='https://hdsky.me/image_code_ajax.php',
+                                                      data={'action': 'new'})
             if image_res and image_res.status_code == 200:
                 image_json = json.loads(image_res.text)
                 if image_json["success"]:
@@ -116,11 +115,11 @@ class HDSky(_ISiteSigninHandler):
                     'imagestring': ocr_result
                 }
                 # 访问签到链接
-                res = RequestUtils(cookies=site_cookie,
-                                   ua=ua,
-                                   referer=referer,
-                                   proxies=settings.PROXY if proxy else None
-                                   ).post_res(url='https://hdsky.me/showup.php', data=data)
+                res = self.request_utils(cookies=site_cookie,
+                                         ua=ua,
+                                         referer=referer,
+                                         proxies=settings.PROXY if proxy else None
+                                         ).post_res(url='https://hdsky.me/showup.php', data=data)
                 if res and res.status_code == 200:
                     if json.loads(res.text)["success"]:
                         logger.info(f"{site} 签到成功")
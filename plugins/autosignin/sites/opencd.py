@@ -9,7 +9,6 @@ from app.core.config import settings
 from app.helper.ocr import OcrHelper
 from app.log import logger
 from app.plugins.autosignin.sites import _ISiteSigninHandler
-from app.utils.http import RequestUtils
 from app.utils.string import StringUtils
 
 
@@ -113,10 +112,10 @@ class Opencd(_ISiteSigninHandler):
                 'imagestring': ocr_result
             }
             # 访问签到链接
-            sign_res = RequestUtils(cookies=site_cookie,
-                                    ua=ua,
-                                    proxies=settings.PROXY if proxy else None
-                                    ).post_res(url='https://www.open.cd/plugin_sign-in.php?cmd=signin', data=data)
+            sign_res = self.request_utils(cookies=site_cookie,
+                                          ua=ua,
+                                          proxies=settings.PROXY if proxy else None
+                                          ).post_res(url='https://www.open.cd/plugin_sign-in.php?cmd=signin', data=data)
             if sign_res and sign_res.status_code == 200:
                 logger.debug(f"sign_res返回 {sign_res.text}")
                 # sign_res.text = '{"state":"success","signindays":"0","integral":"10"}'
@@ -98,10 +98,10 @@ class Tjupt(_ISiteSigninHandler):
         img_url = "https://www.tjupt.org" + img_url
         logger.info(f"获取到签到图片 {img_url}")
         # 获取签到图片hash
-        captcha_img_res = RequestUtils(cookies=site_cookie,
-                                       ua=ua,
-                                       proxies=settings.PROXY if proxy else None
-                                       ).get_res(url=img_url)
+        captcha_img_res = self.request_utils(cookies=site_cookie,
+                                             ua=ua,
+                                             proxies=settings.PROXY if proxy else None
+                                             ).get_res(url=img_url)
         if not captcha_img_res or captcha_img_res.status_code != 200:
             logger.error(f"{site} 签到图片 {img_url} 请求失败")
             return False, '签到失败，未获取到签到图片'
@@ -202,10 +202,10 @@ class Tjupt(_ISiteSigninHandler):
             'submit': '提交'
         }
         logger.debug(f"提交data {data}")
-        sign_in_res = RequestUtils(cookies=site_cookie,
-                                   ua=ua,
-                                   proxies=settings.PROXY if proxy else None
-                                   ).post_res(url=self._sign_in_url, data=data)
+        sign_in_res = self.request_utils(cookies=site_cookie,
+                                         ua=ua,
+                                         proxies=settings.PROXY if proxy else None
+                                         ).post_res(url=self._sign_in_url, data=data)
         if not sign_in_res or sign_in_res.status_code != 200:
             logger.error(f"{site} 签到失败，签到接口请求失败")
             return False, '签到失败，签到接口请求失败'
@@ -9,7 +9,6 @@ from ruamel.yaml import CommentedMap
 from app.core.config import settings
 from app.log import logger
 from app.plugins.autosignin.sites import _ISiteSigninHandler
-from app.utils.http import RequestUtils
 from app.utils.string import StringUtils
 
 
@@ -104,11 +103,11 @@ class U2(_ISiteSigninHandler):
             submit_name[answer_num]: submit_value[answer_num]
         }
         # 签到
-        sign_res = RequestUtils(cookies=site_cookie,
-                                ua=ua,
-                                proxies=settings.PROXY if proxy else None
-                                ).post_res(url="https://u2.dmhy.org/showup.php?action=show",
-                                           data=data)
+        sign_res = self.request_utils(cookies=site_cookie,
+                                      ua=ua,
+                                      proxies=settings.PROXY if proxy else None
+                                      ).post_res(url="https://u2.dmhy.org/showup.php?action=show",
+                                                 data=data)
         if not sign_res or sign_res.status_code != 200:
             logger.error(f"{site} 签到失败，签到接口请求失败")
             return False, '签到失败，签到接口请求失败'
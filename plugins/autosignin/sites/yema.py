@@ -5,7 +5,6 @@ from ruamel.yaml import CommentedMap
 
 from app.core.config import settings
 from app.plugins.autosignin.sites import _ISiteSigninHandler
-from app.utils.http import RequestUtils
 
 
 class YemaPT(_ISiteSigninHandler):
@@ -36,12 +35,11 @@ class YemaPT(_ISiteSigninHandler):
             "Accept": "application/json, text/plain, */*",
         }
         # 获取用户信息，更新最后访问时间
-        res = (RequestUtils(headers=headers,
-                            timeout=15,
-                            cookies=site_info.get("cookie"),
-                            proxies=settings.PROXY if site_info.get("proxy") else None,
-                            referer=site_info.get('url')
-                            ).get_res(urljoin(site_info.get('url'), "api/consumer/checkIn")))
+        res = (self.request_utils(headers=headers,
+                                  cookies=site_info.get("cookie"),
+                                  proxies=settings.PROXY if site_info.get("proxy") else None,
+                                  referer=site_info.get('url')
+                                  ).get_res(urljoin(site_info.get('url'), "api/consumer/checkIn")))
 
         if res and res.json().get("success"):
             return True, "签到成功"
@@ -63,12 +61,11 @@ class YemaPT(_ISiteSigninHandler):
             "Accept": "application/json, text/plain, */*",
         }
         # 获取用户信息，更新最后访问时间
-        res = (RequestUtils(headers=headers,
-                            timeout=15,
-                            cookies=site_info.get("cookie"),
-                            proxies=settings.PROXY if site_info.get("proxy") else None,
-                            referer=site_info.get('url')
-                            ).get_res(urljoin(site_info.get('url'), "api/user/profile")))
+        res = (self.request_utils(headers=headers,
+                                  cookies=site_info.get("cookie"),
+                                  proxies=settings.PROXY if site_info.get("proxy") else None,
+                                  referer=site_info.get('url')
+                                  ).get_res(urljoin(site_info.get('url'), "api/user/profile")))
 
         if res and res.json().get("success"):
             return True, "模拟登录成功"
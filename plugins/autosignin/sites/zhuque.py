@@ -7,7 +7,6 @@ from ruamel.yaml import CommentedMap
 from app.core.config import settings
 from app.log import logger
 from app.plugins.autosignin.sites import _ISiteSigninHandler
-from app.utils.http import RequestUtils
 from app.utils.string import StringUtils
 
 
@@ -71,10 +70,10 @@ class ZhuQue(_ISiteSigninHandler):
                 "Content-Type": "application/json; charset=utf-8",
                 "User-Agent": ua
             }
-            skill_res = RequestUtils(cookies=site_cookie,
-                                     headers=headers,
-                                     proxies=settings.PROXY if proxy else None
-                                     ).post_res(url="https://zhuque.in/api/gaming/fireGenshinCharacterMagic", json=data)
+            skill_res = self.request_utils(cookies=site_cookie,
+                                           headers=headers,
+                                           proxies=settings.PROXY if proxy else None
+                                           ).post_res(url="https://zhuque.in/api/gaming/fireGenshinCharacterMagic", json=data)
             if not skill_res or skill_res.status_code != 200:
                 logger.error(f"模拟登录失败，释放技能失败")
 
@@ -1,14 +1,16 @@
+import copy
 import datetime
+import json
 import re
 import shutil
 import threading
-import traceback
 from pathlib import Path
-from typing import List, Tuple, Dict, Any, Optional
+from typing import List, Tuple, Dict, Any, Optional, Set
 
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy.orm import Session
 from watchdog.events import FileSystemEventHandler
 from watchdog.observers import Observer
 from watchdog.observers.polling import PollingObserver
@@ -21,17 +23,19 @@ from app.core.config import settings
 from app.core.context import MediaInfo
 from app.core.event import eventmanager, Event
 from app.core.metainfo import MetaInfoPath
+from app.db import db_query
 from app.db.downloadhistory_oper import DownloadHistoryOper
+from app.db.models.transferhistory import TransferHistory
 from app.db.transferhistory_oper import TransferHistoryOper
 from app.log import logger
 from app.plugins import _PluginBase
+from app.plugins.dirmonitor.manifest import FileManifest
+from app.plugins.dirmonitor.pipeline import RecognizeCache, TransferPipeline
 from app.schemas import NotificationType, TransferInfo
 from app.schemas.types import EventType, MediaType, SystemConfigKey
 from app.utils.string import StringUtils
 from app.utils.system import SystemUtils
 
-lock = threading.Lock()
-
 
 class FileMonitorHandler(FileSystemEventHandler):
     """
@@ -60,7 +64,7 @@ class DirMonitor(_PluginBase):
     # 插件图标
     plugin_icon = "directory.png"
     # 插件版本
-    plugin_version = "2.4"
+    plugin_version = "2.6"
     # 插件作者
     plugin_author = "jxxghp"
     # 作者主页
@@ -98,6 +102,24 @@ class DirMonitor(_PluginBase):
     # 存储源目录转移方式
     _transferconf: Dict[str, Optional[str]] = {}
     _medias = {}
+    _medias_lock = threading.Lock()
+    # 处理流水线
+    _pipeline: Optional[TransferPipeline] = None
+    # 文件大小稳定的等待时间（秒）
+    _settle_seconds = 5
+    # 识别、转移线程数
+    _recognize_workers = 4
+    _transfer_workers = 2
+    # 识别结果缓存
+    _recognize_cache = RecognizeCache()
+    # 已处理文件清单
+    _manifest: Optional[FileManifest] = None
+    # 全量同步时预先加载的已整理源文件
+    _transfer_srcs: Optional[Set[str]] = None
+    # 过滤关键字及整理屏蔽词合并后的正则：(配置, 合并的正则, 无法合并单独匹配的正则)
+    _exclude_patterns: Optional[tuple] = None
+    # 媒体文件扩展名
+    _media_exts: Set[str] = set()
     # 退出事件
     _event = threading.Event()
 
@@ -110,6 +132,9 @@ class DirMonitor(_PluginBase):
         # 清空配置
         self._dirconf = {}
         self._transferconf = {}
+        self._recognize_cache = RecognizeCache()
+        self._exclude_patterns = None
+        self._media_exts = {ext.casefold() for ext in settings.RMT_MEDIAEXT}
 
         # 读取配置
         if config:
@@ -129,6 +154,10 @@ class DirMonitor(_PluginBase):
         self.stop_service()
 
         if self._enabled or self._onlyonce:
+            # 加载已处理文件清单
+            self._manifest = FileManifest(self)
+            self._manifest.load(self.__fingerprint())
+
             # 定时服务管理器
             self._scheduler = BackgroundScheduler(timezone=settings.TZ)
             # 追加入库消息统一发送服务
@@ -267,12 +296,41 @@ class DirMonitor(_PluginBase):
         立即运行一次，全量同步目录中所有文件
         """
         logger.info("开始全量同步监控目录 ...")
-        # 遍历所有监控目录
-        for mon_path in self._dirconf.keys():
-            # 遍历目录下所有文件
-            for file_path in SystemUtils.list_files(Path(mon_path), settings.RMT_MEDIAEXT):
-                self.__handle_file(event_path=str(file_path), mon_path=mon_path)
-        logger.info("全量同步监控目录完成！")
+        pipeline = self.__get_pipeline()
+        if not self._manifest:
+            self._manifest = FileManifest(self)
+        self._manifest.load(self.__fingerprint())
+        # 一次性加载已整理的源文件，避免逐个文件查询
+        self._transfer_srcs = self.__get_transfer_srcs()
+        skip_cnt = 0
+        submit_cnt = 0
+        try:
+            # 遍历所有监控目录
+            for mon_path in self._dirconf.keys():
+                paths = set()
+                # 遍历目录下所有文件
+                for file_path in SystemUtils.list_files(Path(mon_path), settings.RMT_MEDIAEXT):
+                    event_path = str(file_path)
+                    paths.add(event_path)
+                    try:
+                        stat = file_path.stat()
+                    except OSError:
+                        continue
+                    # 已整理或被过滤且处理后未变化的文件不再处理，整理记录被删除的文件重新处理
+                    if self._manifest.unchanged(event_path, stat) \
+                            and (self._manifest.filtered(event_path)
+                                 or self.__is_transferred(self.__history_src(event_path))):
+                        skip_cnt += 1
+                        continue
+                    submit_cnt += 1
+                    pipeline.submit(event_path=event_path, mon_path=mon_path, settle=False)
+                self._manifest.prune(paths, mon_path)
+            # 等待流水线处理完成
+            pipeline.wait()
+        finally:
+            self._transfer_srcs = None
+            self._manifest.save()
+        logger.info(f"全量同步监控目录完成！处理文件 {submit_cnt} 个，跳过未变化文件 {skip_cnt} 个")
 
     def event_handler(self, event, mon_path: str, text: str, event_path: str):
         """
@@ -285,191 +343,303 @@ class DirMonitor(_PluginBase):
         if not event.is_directory:
             # 文件发生变化
             logger.debug("文件%s：%s" % (text, event_path))
-            self.__handle_file(event_path=event_path, mon_path=mon_path)
+            self.__get_pipeline().submit(event_path=event_path, mon_path=mon_path)
 
-    def __handle_file(self, event_path: str, mon_path: str):
+    def __fingerprint(self) -> str:
+        """
+        影响文件过滤结果的配置
+        """
+        return json.dumps([self._monitor_dirs, self._exclude_keywords, self._size,
+                           self.systemconfig.get(SystemConfigKey.TransferExcludeWords) or []],
+                          ensure_ascii=False, sort_keys=True)
+
+    @staticmethod
+    @db_query
+    def __get_transfer_srcs(db: Session = None) -> Set[str]:
+        """
+        获取全部已整理的源文件路径
+        """
+        try:
+            return {src for src, in db.query(TransferHistory.src).all() if src}
+        except Exception as e:
+            logger.error(f"加载整理记录失败：{str(e)}")
+            return set()
+
+    @staticmethod
+    def __history_src(event_path: str) -> str:
+        """
+        整理记录中的源路径，蓝光原盘为BDMV所在目录
+        """
+        if re.search(r"BDMV[/\\]STREAM", event_path, re.IGNORECASE):
+            return str(Path(event_path[:event_path.find("BDMV")]))
+        return event_path
+
+    def __is_transferred(self, path: str) -> bool:
+        """
+        源文件是否已整理过，全量同步时使用预先加载的记录
+        """
+        transfer_srcs = self._transfer_srcs
+        if transfer_srcs is not None:
+            return path in transfer_srcs
+        return bool(self.transferhis.get_by_src(path))
+
+    def __exclude_match(self, path: str) -> Optional[str]:
+        """
+        匹配过滤关键字和整理屏蔽词，返回命中的内容
+        """
+        transfer_exclude_words = tuple(self.systemconfig.get(SystemConfigKey.TransferExcludeWords) or [])
+        config = (self._exclude_keywords, transfer_exclude_words)
+        if not self._exclude_patterns or self._exclude_patterns[0] != config:
+            patterns = []
+            fallbacks = []
+            # 过滤关键字区分大小写，整理屏蔽词不区分大小写
+            for keyword, flag in [(keyword, 0) for keyword in (self._exclude_keywords or "").split("\n")] \
+                    + [(keyword, re.IGNORECASE) for keyword in transfer_exclude_words]:
+                if not keyword:
+                    continue
+                pattern = f"(?i:{keyword})" if flag else f"(?:{keyword})"
+                try:
+                    re.compile(pattern)
+                    patterns.append(pattern)
+                except re.error:
+                    # 含全局标记等无法合并的表达式单独匹配
+                    try:
+                        fallbacks.append(re.compile(keyword, flag))
+                    except re.error as e:
+                        logger.warn(f"过滤关键字 {keyword} 不是有效的正则表达式：{str(e)}")
+            self._exclude_patterns = (config, re.compile("|".join(patterns)) if patterns else None, fallbacks)
+        _, combined, fallbacks = self._exclude_patterns
+        if combined:
+            match = combined.search(path)
+            if match:
+                return match.group()
+        for pattern in fallbacks:
+            match = pattern.search(path)
+            if match:
+                return match.group()
+        return None
+
+    def __file_done(self, event_path: str, recorded: bool):
+        """
+        文件已有整理记录时记录到清单，转移模块失败等未写入记录的文件下次全量同步时重试
+        """
+        if recorded and self._manifest:
+            self._manifest.mark(event_path)
+
+    def __file_skipped(self, event_path: str, filtered: bool = True):
+        """
+        文件已整理过或被过滤，记录到清单，下次全量同步时不再提交
         """
-        同步一个文件
+        if self._manifest:
+            self._manifest.mark(event_path, filtered=filtered)
+
+    def __get_pipeline(self) -> TransferPipeline:
+        """
+        获取处理流水线
+        """
+        if not self._pipeline:
+            self._pipeline = TransferPipeline(prepare=self.__prepare_file,
+                                              recognize=self.__recognize_file,
+                                              transfer=self.__transfer_file,
+                                              done=self.__file_done,
+                                              settle=self._settle_seconds,
+                                              recognize_workers=self._recognize_workers,
+                                              transfer_workers=self._transfer_workers)
+        return self._pipeline
+
+    def __prepare_file(self, event_path: str, mon_path: str) -> Optional[dict]:
+        """
+        过滤文件，返回处理上下文
         :param event_path: 事件文件路径
         :param mon_path: 监控目录
         """
         file_path = Path(event_path)
-        try:
-            if not file_path.exists():
-                return
-            # 全程加锁
-            with lock:
-                transfer_history = self.transferhis.get_by_src(event_path)
-                if transfer_history:
-                    logger.debug("文件已处理过：%s" % event_path)
-                    return
-
-                # 回收站及隐藏的文件不处理
-                if event_path.find('/@Recycle/') != -1 \
-                        or event_path.find('/#recycle/') != -1 \
-                        or event_path.find('/.') != -1 \
-                        or event_path.find('/@eaDir') != -1:
-                    logger.debug(f"{event_path} 是回收站或隐藏的文件")
-                    return
-
-                # 命中过滤关键字不处理
-                if self._exclude_keywords:
-                    for keyword in self._exclude_keywords.split("\n"):
-                        if keyword and re.findall(keyword, event_path):
-                            logger.info(f"{event_path} 命中过滤关键字 {keyword}，不处理")
-                            return
-
-                # 整理屏蔽词不处理
-                transfer_exclude_words = self.systemconfig.get(SystemConfigKey.TransferExcludeWords)
-                if transfer_exclude_words:
-                    for keyword in transfer_exclude_words:
-                        if not keyword:
-                            continue
-                        if keyword and re.search(r"%s" % keyword, event_path, re.IGNORECASE):
-                            logger.info(f"{event_path} 命中整理屏蔽词 {keyword}，不处理")
-                            return
-
-                # 不是媒体文件不处理
-                if file_path.suffix.casefold() not in map(str.casefold, settings.RMT_MEDIAEXT):
-                    logger.debug(f"{event_path} 不是媒体文件")
-                    return
-
-                # 判断是不是蓝光目录
-                bluray_flag = False
-                if re.search(r"BDMV[/\\]STREAM", event_path, re.IGNORECASE):
-                    bluray_flag = True
-                    # 截取BDMV前面的路径
-                    blurray_dir = event_path[:event_path.find("BDMV")]
-                    file_path = Path(blurray_dir)
-                    logger.info(f"{event_path} 是蓝光目录，更正文件路径为：{str(file_path)}")
-
-                # 查询历史记录，已转移的不处理
-                if self.transferhis.get_by_src(str(file_path)):
-                    logger.info(f"{file_path} 已整理过")
-                    return
-
-                # 元数据
-                file_meta = MetaInfoPath(file_path)
-                if not file_meta.name:
-                    logger.error(f"{file_path.name} 无法识别有效信息")
-                    return
-
-                # 判断文件大小
-                if self._size and float(self._size) > 0 and file_path.stat().st_size < float(self._size) * 1024 ** 3:
-                    logger.info(f"{file_path} 文件大小小于监控文件大小，不处理")
-                    return
-
-                # 查询转移目的目录
-                target: Path = self._dirconf.get(mon_path)
-                # 查询转移方式
-                transfer_type = self._transferconf.get(mon_path)
-
-                # 根据父路径获取下载历史
-                download_history = None
-                if bluray_flag:
-                    # 蓝光原盘，按目录名查询
-                    # FIXME 理论上DownloadHistory表中的path应该是全路径，但实际表中登记的数据只有目录名，暂按目录名查询
-                    download_history = self.downloadhis.get_by_path(file_path.name)
-                else:
-                    # 按文件全路径查询
-                    download_file = self.downloadhis.get_file_by_fullpath(str(file_path))
-                    if download_file:
-                        download_history = self.downloadhis.get_by_hash(download_file.download_hash)
-
-                # 识别媒体信息
-                if download_history and download_history.tmdbid:
-                    mediainfo: MediaInfo = self.mediaChain.recognize_media(mtype=MediaType(download_history.type),
-                                                                           tmdbid=download_history.tmdbid,
-                                                                           doubanid=download_history.doubanid)
-                else:
-                    mediainfo: MediaInfo = self.mediaChain.recognize_by_meta(file_meta)
-                if not mediainfo:
-                    logger.warn(f'未识别到媒体信息，标题：{file_meta.name}')
-                    # 新增转移成功历史记录
-                    his = self.transferhis.add_fail(
-                        src_path=file_path,
-                        mode=transfer_type,
-                        meta=file_meta
-                    )
-                    if self._notify:
-                        self.post_message(
-                            mtype=NotificationType.Manual,
-                            title=f"{file_path.name} 未识别到媒体信息，无法入库！\n"
-                                  f"回复：```\n/redo {his.id} [tmdbid]|[类型]\n``` 手动识别转移。"
-                        )
-                    return
-
-                # 如果未开启新增已入库媒体是否跟随TMDB信息变化则根据tmdbid查询之前的title
-                if not settings.SCRAP_FOLLOW_TMDB:
-                    transfer_history = self.transferhis.get_by_type_tmdbid(tmdbid=mediainfo.tmdb_id,
-                                                                           mtype=mediainfo.type.value)
-                    if transfer_history:
-                        mediainfo.title = transfer_history.title
-                logger.info(f"{file_path.name} 识别为：{mediainfo.type.value} {mediainfo.title_year}")
-
-                # 更新媒体图片
-                self.chain.obtain_images(mediainfo=mediainfo)
-
-                # 获取集数据
-                if mediainfo.type == MediaType.TV:
-                    episodes_info = self.tmdbchain.tmdb_episodes(tmdbid=mediainfo.tmdb_id,
-                                                                 season=file_meta.begin_season or 1)
-                else:
-                    episodes_info = None
-
-                # 获取下载Hash
-                download_hash = None
-                if download_history:
-                    download_hash = download_history.download_hash
-
-                # 转移
-                transferinfo: TransferInfo = self.chain.transfer(mediainfo=mediainfo,
-                                                                 path=file_path,
-                                                                 transfer_type=transfer_type,
-                                                                 target=target,
-                                                                 meta=file_meta,
-                                                                 episodes_info=episodes_info)
-
-                if not transferinfo:
-                    logger.error("文件转移模块运行失败")
-                    return
-
-                if not transferinfo.success:
-                    # 判断是否转移后文件已存在，补充转移成功历史记录
-                    if transferinfo.target_path and transferinfo.target_path.exists():
-                        logger.info(f"{file_path.name} 目标文件已存在，补充转移成功历史记录")
-                        # 补充转移成功历史记录
-                        self.transferhis.add_success(
-                            src_path=file_path,
-                            mode=transfer_type,
-                            download_hash=download_hash,
-                            meta=file_meta,
-                            mediainfo=mediainfo,
-                            transferinfo=transferinfo
-                        )
-                        return
-
-                    # 转移失败
-                    logger.warn(f"{file_path.name} 入库失败：{transferinfo.message}")
-                    # 新增转移失败历史记录
-                    self.transferhis.add_fail(
-                        src_path=file_path,
-                        mode=transfer_type,
-                        download_hash=download_hash,
-                        meta=file_meta,
-                        mediainfo=mediainfo,
-                        transferinfo=transferinfo
-                    )
-                    if self._notify:
-                        self.post_message(
-                            mtype=NotificationType.Manual,
-                            title=f"{mediainfo.title_year}{file_meta.season_episode} 入库失败！",
-                            text=f"原因：{transferinfo.message or '未知'}",
-                            image=mediainfo.get_message_image()
-                        )
-                    return
-
-                # 新增转移成功历史记录
+        if not file_path.exists():
+            return None
+        if self.__is_transferred(event_path):
+            logger.debug("文件已处理过：%s" % event_path)
+            self.__file_skipped(event_path, filtered=False)
+            return None
+
+        # 回收站及隐藏的文件不处理
+        if event_path.find('/@Recycle/') != -1 \
+                or event_path.find('/#recycle/') != -1 \
+                or event_path.find('/.') != -1 \
+                or event_path.find('/@eaDir') != -1:
+            logger.debug(f"{event_path} 是回收站或隐藏的文件")
+            self.__file_skipped(event_path)
+            return None
+
+        # 命中过滤关键字或整理屏蔽词不处理
+        matched = self.__exclude_match(event_path)
+        if matched:
+            logger.info(f"{event_path} 命中过滤关键字或整理屏蔽词 {matched}，不处理")
+            self.__file_skipped(event_path)
+            return None
+
+        # 不是媒体文件不处理
+        if file_path.suffix.casefold() not in self._media_exts:
+            logger.debug(f"{event_path} 不是媒体文件")
+            self.__file_skipped(event_path)
+            return None
+
+        # 判断是不是蓝光目录
+        bluray_flag = False
+        if re.search(r"BDMV[/\\]STREAM", event_path, re.IGNORECASE):
+            bluray_flag = True
+            # 截取BDMV前面的路径
+            blurray_dir = event_path[:event_path.find("BDMV")]
+            file_path = Path(blurray_dir)
+            logger.info(f"{event_path} 是蓝光目录，更正文件路径为：{str(file_path)}")
+
+        # 查询历史记录，已转移的不处理
+        if bluray_flag and self.__is_transferred(str(file_path)):
+            logger.info(f"{file_path} 已整理过")
+            self.__file_skipped(event_path, filtered=False)
+            return None
+
+        # 元数据
+        file_meta = MetaInfoPath(file_path)
+        if not file_meta.name:
+            logger.error(f"{file_path.name} 无法识别有效信息")
+            return None
+
+        # 判断文件大小
+        if self._size and float(self._size) > 0 and file_path.stat().st_size < float(self._size) * 1024 ** 3:
+            logger.info(f"{file_path} 文件大小小于监控文件大小，不处理")
+            self.__file_skipped(event_path)
+            return None
+
+        return {
+            "mon_path": mon_path,
+            "file_path": file_path,
+            "file_meta": file_meta,
+            "bluray_flag": bluray_flag,
+            # 查询转移目的目录
+            "target": self._dirconf.get(mon_path),
+            # 查询转移方式
+            "transfer_type": self._transferconf.get(mon_path)
+        }
+
+    def __recognize_file(self, context: dict) -> Optional[dict]:
+        """
+        识别媒体信息，同一标题的识别结果、图片和集信息只查询一次
+        """
+        file_path: Path = context.get("file_path")
+        file_meta = context.get("file_meta")
+        transfer_type = context.get("transfer_type")
+
+        # 根据父路径获取下载历史
+        download_history = None
+        if context.get("bluray_flag"):
+            # 蓝光原盘，按目录名查询
+            # FIXME 理论上DownloadHistory表中的path应该是全路径，但实际表中登记的数据只有目录名，暂按目录名查询
+            download_history = self.downloadhis.get_by_path(file_path.name)
+        else:
+            # 按文件全路径查询
+            download_file = self.downloadhis.get_file_by_fullpath(str(file_path))
+            if download_file:
+                download_history = self.downloadhis.get_by_hash(download_file.download_hash)
+
+        def __recognize() -> Optional[MediaInfo]:
+            # 识别媒体信息
+            if download_history and download_history.tmdbid:
+                _mediainfo: MediaInfo = self.mediaChain.recognize_media(mtype=MediaType(download_history.type),
+                                                                        tmdbid=download_history.tmdbid,
+                                                                        doubanid=download_history.doubanid)
+            else:
+                _mediainfo: MediaInfo = self.mediaChain.recognize_by_meta(file_meta)
+            if not _mediainfo:
+                return None
+            # 如果未开启新增已入库媒体是否跟随TMDB信息变化则根据tmdbid查询之前的title
+            if not settings.SCRAP_FOLLOW_TMDB:
+                _transfer_history = self.transferhis.get_by_type_tmdbid(tmdbid=_mediainfo.tmdb_id,
+                                                                        mtype=_mediainfo.type.value)
+                if _transfer_history:
+                    _mediainfo.title = _transfer_history.title
+            # 更新媒体图片
+            self.chain.obtain_images(mediainfo=_mediainfo)
+            return _mediainfo
+
+        if download_history and download_history.tmdbid:
+            cache_key = ("tmdb", download_history.type, download_history.tmdbid, download_history.doubanid)
+        else:
+            cache_key = ("meta", file_meta.name, file_meta.year,
+                         file_meta.type.value if file_meta.type else None)
+        mediainfo: MediaInfo = self._recognize_cache.get(cache_key, __recognize)
+        if not mediainfo:
+            logger.warn(f'未识别到媒体信息，标题：{file_meta.name}')
+            # 新增转移成功历史记录
+            his = self.transferhis.add_fail(
+                src_path=file_path,
+                mode=transfer_type,
+                meta=file_meta
+            )
+            if self._notify:
+                self.post_message(
+                    mtype=NotificationType.Manual,
+                    title=f"{file_path.name} 未识别到媒体信息，无法入库！\n"
+                          f"回复：```\n/redo {his.id} [tmdbid]|[类型]\n``` 手动识别转移。"
+                )
+            return None
+        # 同一标题的文件共享识别结果，转移时各自使用副本
+        mediainfo = copy.deepcopy(mediainfo)
+        logger.info(f"{file_path.name} 识别为：{mediainfo.type.value} {mediainfo.title_year}")
+
+        # 获取集数据
+        if mediainfo.type == MediaType.TV:
+            season = file_meta.begin_season or 1
+            episodes_info = self._recognize_cache.get(
+                ("episodes", mediainfo.tmdb_id, season),
+                lambda: self.tmdbchain.tmdb_episodes(tmdbid=mediainfo.tmdb_id, season=season))
+        else:
+            episodes_info = None
+
+        context.update({
+            "mediainfo": mediainfo,
+            "episodes_info": episodes_info,
+            # 获取下载Hash
+            "download_hash": download_history.download_hash if download_history else None,
+            # 目的目录相同的文件串行转移
+            "lock_key": (str(context.get("target")), mediainfo.type.value, mediainfo.title_year)
+        })
+        return context
+
+    def __transfer_file(self, context: dict) -> bool:
+        """
+        转移文件、刮削并汇总消息
+        :return: 是否已有整理记录（成功或失败），没有记录的文件下次全量同步时需要重新处理
+        """
+        mon_path = context.get("mon_path")
+        file_path: Path = context.get("file_path")
+        file_meta = context.get("file_meta")
+        target: Path = context.get("target")
+        transfer_type = context.get("transfer_type")
+        mediainfo: MediaInfo = context.get("mediainfo")
+        download_hash = context.get("download_hash")
+
+        # 同一蓝光目录的多个文件可能同时进入流水线，转移前再次确认
+        if self.transferhis.get_by_src(str(file_path)):
+            logger.info(f"{file_path} 已整理过")
+            return True
+
+        # 转移
+        transferinfo: TransferInfo = self.chain.transfer(mediainfo=mediainfo,
+                                                         path=file_path,
+                                                         transfer_type=transfer_type,
+                                                         target=target,
+                                                         meta=file_meta,
+                                                         episodes_info=context.get("episodes_info"))
+
+        if not transferinfo:
+            logger.error("文件转移模块运行失败")
+            return False
+
+        if not transferinfo.success:
+            # 判断是否转移后文件已存在，补充转移成功历史记录
+            if transferinfo.target_path and transferinfo.target_path.exists():
+                logger.info(f"{file_path.name} 目标文件已存在，补充转移成功历史记录")
+                # 补充转移成功历史记录
                 self.transferhis.add_success(
                     src_path=file_path,
                     mode=transfer_type,
@@ -478,92 +648,122 @@ class DirMonitor(_PluginBase):
                     mediainfo=mediainfo,
                     transferinfo=transferinfo
                 )
+                return True
+
+            # 转移失败
+            logger.warn(f"{file_path.name} 入库失败：{transferinfo.message}")
+            # 新增转移失败历史记录
+            self.transferhis.add_fail(
+                src_path=file_path,
+                mode=transfer_type,
+                download_hash=download_hash,
+                meta=file_meta,
+                mediainfo=mediainfo,
+                transferinfo=transferinfo
+            )
+            if self._notify:
+                self.post_message(
+                    mtype=NotificationType.Manual,
+                    title=f"{mediainfo.title_year}{file_meta.season_episode} 入库失败！",
+                    text=f"原因：{transferinfo.message or '未知'}",
+                    image=mediainfo.get_message_image()
+                )
+            return True
+
+        # 新增转移成功历史记录
+        self.transferhis.add_success(
+            src_path=file_path,
+            mode=transfer_type,
+            download_hash=download_hash,
+            meta=file_meta,
+            mediainfo=mediainfo,
+            transferinfo=transferinfo
+        )
+
+        # 刮削单个文件
+        if self._scrape:
+            self.chain.scrape_metadata(path=transferinfo.target_path,
+                                       mediainfo=mediainfo,
+                                       transfer_type=transfer_type)
 
-                # 刮削单个文件
-                if self._scrape:
-                    self.chain.scrape_metadata(path=transferinfo.target_path,
-                                               mediainfo=mediainfo,
-                                               transfer_type=transfer_type)
-
-                """
-                {
-                    "title_year season": {
-                        "files": [
-                            {
-                                "path":,
-                                "mediainfo":,
-                                "file_meta":,
-                                "transferinfo":
-                            }
-                        ],
-                        "time": "2023-08-24 23:23:23.332"
-                    }
-                }
-                """
-                # 发送消息汇总
-                media_list = self._medias.get(mediainfo.title_year + " " + file_meta.season) or {}
-                if media_list:
-                    media_files = media_list.get("files") or []
-                    if media_files:
-                        file_exists = False
-                        for file in media_files:
-                            if str(file_path) == file.get("path"):
-                                file_exists = True
-                                break
-                        if not file_exists:
-                            media_files.append({
-                                "path": str(file_path),
-                                "mediainfo": mediainfo,
-                                "file_meta": file_meta,
-                                "transferinfo": transferinfo
-                            })
-                    else:
-                        media_files = [
-                            {
-                                "path": str(file_path),
-                                "mediainfo": mediainfo,
-                                "file_meta": file_meta,
-                                "transferinfo": transferinfo
-                            }
-                        ]
-                    media_list = {
-                        "files": media_files,
-                        "time": datetime.datetime.now()
-                    }
-                else:
-                    media_list = {
-                        "files": [
-                            {
-                                "path": str(file_path),
-                                "mediainfo": mediainfo,
-                                "file_meta": file_meta,
-                                "transferinfo": transferinfo
-                            }
-                        ],
-                        "time": datetime.datetime.now()
+        """
+        {
+            "title_year season": {
+                "files": [
+                    {
+                        "path":,
+                        "mediainfo":,
+                        "file_meta":,
+                        "transferinfo":
                     }
-                self._medias[mediainfo.title_year + " " + file_meta.season] = media_list
-
-                # 广播事件
-                self.eventmanager.send_event(EventType.TransferComplete, {
-                    'meta': file_meta,
-                    'mediainfo': mediainfo,
-                    'transferinfo': transferinfo
-                })
-
-                # 移动模式删除空目录
-                if transfer_type == "move":
-                    for file_dir in file_path.parents:
-                        if len(str(file_dir)) <= len(str(Path(mon_path))):
-                            # 重要，删除到监控目录为止
+                ],
+                "time": "2023-08-24 23:23:23.332"
+            }
+        }
+        """
+        # 发送消息汇总
+        with self._medias_lock:
+            media_list = self._medias.get(mediainfo.title_year + " " + file_meta.season) or {}
+            if media_list:
+                media_files = media_list.get("files") or []
+                if media_files:
+                    file_exists = False
+                    for file in media_files:
+                        if str(file_path) == file.get("path"):
+                            file_exists = True
                             break
-                        files = SystemUtils.list_files(file_dir, settings.RMT_MEDIAEXT + settings.DOWNLOAD_TMPEXT)
-                        if not files:
-                            logger.warn(f"移动模式，删除空目录：{file_dir}")
-                            shutil.rmtree(file_dir, ignore_errors=True)
+                    if not file_exists:
+                        media_files.append({
+                            "path": str(file_path),
+                            "mediainfo": mediainfo,
+                            "file_meta": file_meta,
+                            "transferinfo": transferinfo
+                        })
+                else:
+                    media_files = [
+                        {
+                            "path": str(file_path),
+                            "mediainfo": mediainfo,
+                            "file_meta": file_meta,
+                            "transferinfo": transferinfo
+                        }
+                    ]
+                media_list = {
+                    "files": media_files,
+                    "time": datetime.datetime.now()
+                }
+            else:
+                media_list = {
+                    "files": [
+                        {
+                            "path": str(file_path),
+                            "mediainfo": mediainfo,
+                            "file_meta": file_meta,
+                            "transferinfo": transferinfo
+                        }
+                    ],
+                    "time": datetime.datetime.now()
+                }
+            self._medias[mediainfo.title_year + " " + file_meta.season] = media_list
 
-        except Exception as e:
-            logger.error("目录监控发生错误：%s - %s" % (str(e), traceback.format_exc()))
+        # 广播事件
+        self.eventmanager.send_event(EventType.TransferComplete, {
+            'meta': file_meta,
+            'mediainfo': mediainfo,
+            'transferinfo': transferinfo
+        })
+
+        # 移动模式删除空目录
+        if transfer_type == "move":
+            for file_dir in file_path.parents:
+                if len(str(file_dir)) <= len(str(Path(mon_path))):
+                    # 重要，删除到监控目录为止
+                    break
+                files = SystemUtils.list_files(file_dir, settings.RMT_MEDIAEXT + settings.DOWNLOAD_TMPEXT)
+                if not files:
+                    logger.warn(f"移动模式，删除空目录：{file_dir}")
+                    shutil.rmtree(file_dir, ignore_errors=True)
+        return True
 
     def send_msg(self):
         """
@@ -626,7 +826,8 @@ class DirMonitor(_PluginBase):
                                                              transferinfo=transferinfo,
                                                              season_episode=season_episode)
                 # 发送完消息，移出key
-                del self._medias[medis_title_year_season]
+                with self._medias_lock:
+                    self._medias.pop(medis_title_year_season, None)
                 continue
 
     def get_state(self) -> bool:
@@ -655,6 +856,12 @@ class DirMonitor(_PluginBase):
             "methods": ["GET"],
             "summary": "目录监控同步",
             "description": "目录监控同步",
+        }, {
+            "path": "/pipeline_status",
+            "endpoint": self.pipeline_status,
+            "methods": ["GET"],
+            "summary": "目录监控处理队列状态",
+            "description": "各处理阶段的排队数和耗时",
         }]
 
     def get_service(self) -> List[Dict[str, Any]]:
@@ -687,6 +894,18 @@ class DirMonitor(_PluginBase):
         self.sync_all()
         return schemas.Response(success=True)
 
+    def pipeline_status(self, apikey: str) -> schemas.Response:
+        """
+        API查询处理队列状态
+        """
+        if apikey != settings.API_TOKEN:
+            return schemas.Response(success=False, message="API密钥错误")
+        if not self._pipeline:
+            return schemas.Response(success=True, data={})
+        data = self._pipeline.status()
+        data["cache"] = {"hits": self._recognize_cache.hits, "misses": self._recognize_cache.misses}
+        return schemas.Response(success=True, data=data)
+
     def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
         return [
             {
@@ -994,7 +1213,89 @@ class DirMonitor(_PluginBase):
         }
 
     def get_page(self) -> List[dict]:
-        pass
+        """
+        拼装插件详情页面，显示各处理阶段的排队数和耗时
+        """
+        if not self._pipeline:
+            return [
+                {
+                    'component': 'div',
+                    'text': '暂无数据',
+                    'props': {
+                        'class': 'text-center',
+                    }
+                }
+            ]
+        status = self._pipeline.status()
+        names = {
+            "settle": "等待写入",
+            "recognize": "识别",
+            "transfer": "转移"
+        }
+        contents = []
+        for stage, stats in status.get("stages", {}).items():
+            contents.append({
+                'component': 'tr',
+                'props': {
+                    'class': 'text-sm'
+                },
+                'content': [
+                    {
+                        'component': 'td',
+                        'text': names.get(stage, stage)
+                    },
+                    {
+                        'component': 'td',
+                        'text': str(stats.get("queued"))
+                    },
+                    {
+                        'component': 'td',
+                        'text': str(stats.get("running"))
+                    },
+                    {
+                        'component': 'td',
+                        'text': str(stats.get("done"))
+                    },
+                    {
+                        'component': 'td',
+                        'text': f'{stats.get("avg")}s / {stats.get("max")}s'
+                    }
+                ]
+            })
+        return [
+            {
+                'component': 'VTable',
+                'props': {
+                    'hover': True
+                },
+                'content': [
+                    {
+                        'component': 'thead',
+                        'content': [
+                            {
+                                'component': 'th',
+                                'props': {
+                                    'class': 'text-start ps-4'
+                                },
+                                'text': text
+                            } for text in ['阶段', '排队', '处理中', '已完成', '平均/最大耗时']
+                        ]
+                    },
+                    {
+                        'component': 'tbody',
+                        'content': contents
+                    }
+                ]
+            },
+            {
+                'component': 'div',
+                'props': {
+                    'class': 'text-sm mt-3',
+                },
+                'text': f'识别缓存命中 {self._recognize_cache.hits} 次，'
+                        f'未命中 {self._recognize_cache.misses} 次'
+            }
+        ]
 
     def stop_service(self):
         """
@@ -1008,6 +1309,12 @@ class DirMonitor(_PluginBase):
                 except Exception as e:
                     print(str(e))
         self._observer = []
+        if self._pipeline:
+            self._pipeline.stop()
+            self._pipeline = None
+        if self._manifest:
+            self._manifest.save()
+            self._manifest = None
         if self._scheduler:
             self._scheduler.remove_all_jobs()
             if self._scheduler.running:
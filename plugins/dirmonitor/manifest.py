@@ -0,0 +1,118 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from app.log import logger
+
+
+class FileManifest:
+    """
+    已处理文件清单
+    记录已有整理记录或被过滤的文件处理完成时的大小和修改时间，全量同步时大小和修改时间都未变化、
+    且整理记录仍存在（或被过滤）的文件直接跳过；过滤配置变化时清空清单，使被过滤的文件重新参与判断
+    """
+
+    def __init__(self, plugin: Any, key: str = "manifest"):
+        """
+        :param plugin: 插件实例，用于读写插件数据
+        :param key: 插件数据键
+        """
+        self._plugin = plugin
+        self._key = key
+        self._lock = threading.Lock()
+        # 路径 -> [文件大小, 修改时间, 是否被过滤]
+        self._files: Dict[str, List[int]] = {}
+        self._fingerprint: Optional[str] = None
+        self._dirty = False
+        self._loaded = False
+
+    def load(self, fingerprint: str):
+        """
+        加载清单
+        :param fingerprint: 影响过滤结果的配置，与保存时不一致则清空
+        """
+        with self._lock:
+            data = self._plugin.get_data(self._key) or {}
+            if data.get("fingerprint") == fingerprint:
+                self._files = data.get("files") or {}
+            else:
+                if data:
+                    logger.info("目录监控配置已变化，清空已处理文件清单")
+                self._files = {}
+                self._dirty = bool(data)
+            self._fingerprint = fingerprint
+            self._loaded = True
+
+    @staticmethod
+    def __signature(stat: os.stat_result) -> List[int]:
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def unchanged(self, path: str, stat: os.stat_result) -> bool:
+        """
+        文件处理后是否未发生变化
+        """
+        with self._lock:
+            return (self._files.get(path) or [])[:2] == self.__signature(stat)
+
+    def filtered(self, path: str) -> bool:
+        """
+        文件是否因过滤条件未处理
+        """
+        with self._lock:
+            item = self._files.get(path) or []
+            return len(item) > 2 and bool(item[2])
+
+    def mark(self, path: str, filtered: bool = False):
+        """
+        记录文件已处理
+        :param filtered: 是否因过滤条件未处理（没有整理记录）
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        with self._lock:
+            if not self._loaded:
+                return
+            self._files[path] = self.__signature(stat) + [1 if filtered else 0]
+            self._dirty = True
+
+    def discard(self, path: str):
+        with self._lock:
+            if self._files.pop(path, None):
+                self._dirty = True
+
+    def prune(self, paths: set, prefix: str):
+        """
+        清理监控目录下已不存在的文件
+        :param paths: 本次遍历到的全部文件
+        :param prefix: 监控目录
+        """
+        prefix = os.path.join(prefix, "")
+        with self._lock:
+            for path in [path for path in self._files if path.startswith(prefix) and path not in paths]:
+                self._files.pop(path, None)
+                self._dirty = True
+
+    def save(self):
+        """
+        有变化时保存清单
+        """
+        with self._lock:
+            if not self._loaded or not self._dirty:
+                return
+            self._plugin.save_data(self._key, {
+                "fingerprint": self._fingerprint,
+                "files": self._files
+            })
+            self._dirty = False
+
+    def clear(self):
+        with self._lock:
+            self._files = {}
+            self._dirty = False
+            self._loaded = False
+        self._plugin.del_data(self._key)
+
+    def __len__(self):
+        return len(self._files)
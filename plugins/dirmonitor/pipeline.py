@@ -0,0 +1,313 @@
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from app.log import logger
+
+
+class StageStats:
+    """
+    单个阶段的排队数和耗时统计
+    """
+
+    def __init__(self, window: int = 100):
+        self._lock = threading.Lock()
+        # 排队中（已提交未开始）
+        self.queued = 0
+        # 处理中
+        self.running = 0
+        self.done = 0
+        self.max_cost = 0.0
+        self._costs = deque(maxlen=window)
+
+    def submit(self):
+        with self._lock:
+            self.queued += 1
+
+    def start(self):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+
+    def finish(self, cost: float):
+        with self._lock:
+            self.running -= 1
+            self.done += 1
+            self.max_cost = max(self.max_cost, cost)
+            self._costs.append(cost)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "queued": self.queued,
+                "running": self.running,
+                "done": self.done,
+                "avg": round(sum(self._costs) / len(self._costs), 3) if self._costs else 0,
+                "max": round(self.max_cost, 3)
+            }
+
+
+class RecognizeCache:
+    """
+    识别结果缓存
+    同一标题（或tmdbid）的多个文件并发识别时，只有第一个文件真正查询，其余等待其结果；
+    结果为空（识别失败，可能是网络等临时问题）时不缓存，后续文件重新查询
+    """
+
+    def __init__(self, ttl: float = 600, max_size: int = 500):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # key -> (过期时间, 结果)
+        self._values: Dict[Hashable, Tuple[float, Any]] = {}
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                cached = self._values.get(key)
+                if cached and cached[0] > time.time():
+                    self.hits += 1
+                    return cached[1]
+                self.misses += 1
+            value = loader()
+            if value is None:
+                return value
+            with self._lock:
+                if len(self._values) >= self.max_size:
+                    # 清理过期及最早的缓存
+                    now = time.time()
+                    for k in [k for k, v in self._values.items() if v[0] <= now] or list(self._values)[:1]:
+                        self._values.pop(k, None)
+                        self._key_locks.pop(k, None)
+                self._values[key] = (time.time() + self.ttl, value)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._key_locks.clear()
+
+
+class TransferPipeline:
+    """
+    目录监控分阶段处理
+    1、等待：文件创建事件先进入等待队列，文件大小在等待时间内不再变化后才处理，避免处理未写完的文件；
+    2、识别：多线程并发执行过滤、查询历史和媒体识别，识别结果按标题共享；
+    3、转移：多线程并发转移，只有目的目录相同的文件串行执行
+    """
+
+    def __init__(self,
+                 prepare: Callable[[str, str], Optional[dict]],
+                 recognize: Callable[[dict], Optional[dict]],
+                 transfer: Callable[[dict], bool],
+                 done: Callable[[str, bool], None] = None,
+                 settle: float = 5,
+                 recognize_workers: int = 4,
+                 transfer_workers: int = 2):
+        """
+        :param prepare: 过滤文件，返回处理上下文，不需处理时返回None
+        :param recognize: 识别媒体信息，返回转移上下文，识别失败返回None
+        :param transfer: 转移文件，返回是否已有整理记录，上下文中的lock_key相同的文件串行执行
+        :param done: 文件处理结束的回调，参数为文件路径、转移阶段是否返回已有整理记录
+        :param settle: 文件大小稳定的等待时间（秒）
+        """
+        self._prepare = prepare
+        self._recognize = recognize
+        self._transfer = transfer
+        self._done = done
+        self.settle = settle
+        self._recognize_executor = ThreadPoolExecutor(max_workers=max(recognize_workers, 1),
+                                                      thread_name_prefix="DirMonitor-recognize")
+        self._transfer_executor = ThreadPoolExecutor(max_workers=max(transfer_workers, 1),
+                                                     thread_name_prefix="DirMonitor-transfer")
+        self.stats = {
+            "settle": StageStats(),
+            "recognize": StageStats(),
+            "transfer": StageStats()
+        }
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        # 等待中的文件：路径 -> (监控目录, 检查时间, 文件大小, 加入时间)
+        self._pending: Dict[str, Tuple[str, float, int, float]] = {}
+        # 处理中的文件
+        self._inflight = set()
+        # 目的目录 -> 锁
+        self._dir_locks: Dict[Hashable, threading.Lock] = {}
+        self._stop = threading.Event()
+        self._settle_thread: Optional[threading.Thread] = None
+
+    def submit(self, event_path: str, mon_path: str, settle: bool = True):
+        """
+        提交文件
+        :param settle: 是否等待文件写入完成，全量同步时不需等待
+        """
+        if self._stop.is_set():
+            return
+        with self._lock:
+            if event_path in self._inflight:
+                return
+            if settle and self.settle > 0:
+                now = time.time()
+                if event_path not in self._pending:
+                    self.stats["settle"].submit()
+                    self._pending[event_path] = (mon_path, now + self.settle, -1, now)
+                else:
+                    _, _, size, created = self._pending[event_path]
+                    # 再次收到事件，重新计时
+                    self._pending[event_path] = (mon_path, now + self.settle, size, created)
+                self.__start_settle()
+                return
+            self._inflight.add(event_path)
+        self.__dispatch(event_path, mon_path)
+
+    def __start_settle(self):
+        if self._settle_thread:
+            return
+        self._settle_thread = threading.Thread(target=self.__settle_loop, name="DirMonitor-settle", daemon=True)
+        self._settle_thread.start()
+
+    def __settle_loop(self):
+        while not self._stop.wait(1):
+            now = time.time()
+            ready = []
+            with self._lock:
+                if not self._pending:
+                    # 等待队列为空时退出，下次提交时重新启动
+                    self._settle_thread = None
+                    self._idle.notify_all()
+                    break
+                for event_path, (mon_path, due, size, created) in list(self._pending.items()):
+                    if due > now:
+                        continue
+                    try:
+                        current = Path(event_path).stat().st_size
+                    except OSError:
+                        # 文件已不存在
+                        self._pending.pop(event_path)
+                        self.stats["settle"].start()
+                        self.stats["settle"].finish(now - created)
+                        continue
+                    if current != size:
+                        # 文件仍在写入
+                        self._pending[event_path] = (mon_path, now + self.settle, current, created)
+                        continue
+                    self._pending.pop(event_path)
+                    self.stats["settle"].start()
+                    self.stats["settle"].finish(now - created)
+                    if event_path in self._inflight:
+                        continue
+                    self._inflight.add(event_path)
+                    ready.append((event_path, mon_path))
+            for event_path, mon_path in ready:
+                self.__dispatch(event_path, mon_path)
+
+    def __dispatch(self, event_path: str, mon_path: str):
+        self.stats["recognize"].submit()
+        try:
+            self._recognize_executor.submit(self.__run_recognize, event_path, mon_path)
+        except RuntimeError:
+            # 已停止
+            self.stats["recognize"].start()
+            self.stats["recognize"].finish(0)
+            self.__done(event_path)
+
+    def __run_recognize(self, event_path: str, mon_path: str):
+        stats = self.stats["recognize"]
+        stats.start()
+        begin = time.time()
+        context = None
+        try:
+            if not self._stop.is_set():
+                context = self._prepare(event_path, mon_path)
+                if context:
+                    context = self._recognize(context)
+        except Exception as e:
+            logger.error(f"{event_path} 识别出错：{str(e)} - {traceback.format_exc()}")
+            context = None
+        finally:
+            stats.finish(time.time() - begin)
+        if not context:
+            self.__done(event_path)
+            return
+        self.stats["transfer"].submit()
+        try:
+            self._transfer_executor.submit(self.__run_transfer, event_path, context)
+        except RuntimeError:
+            self.stats["transfer"].start()
+            self.stats["transfer"].finish(0)
+            self.__done(event_path)
+
+    def __run_transfer(self, event_path: str, context: dict):
+        stats = self.stats["transfer"]
+        stats.start()
+        begin = time.time()
+        recorded = False
+        try:
+            with self.__dir_lock(context.get("lock_key")):
+                if not self._stop.is_set():
+                    recorded = bool(self._transfer(context))
+        except Exception as e:
+            logger.error(f"{event_path} 转移出错：{str(e)} - {traceback.format_exc()}")
+        finally:
+            stats.finish(time.time() - begin)
+            self.__done(event_path, recorded)
+
+    def __dir_lock(self, key: Hashable) -> threading.Lock:
+        with self._lock:
+            return self._dir_locks.setdefault(key, threading.Lock())
+
+    def __done(self, event_path: str, recorded: bool = False):
+        if self._done:
+            try:
+                self._done(event_path, recorded)
+            except Exception as e:
+                logger.error(f"{event_path} 处理结束回调出错：{str(e)}")
+        with self._lock:
+            self._inflight.discard(event_path)
+            if not self._inflight and not self._pending:
+                # 处理完成后释放目录锁
+                self._dir_locks.clear()
+                self._idle.notify_all()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        等待全部文件处理完成
+        """
+        end = time.time() + timeout if timeout else None
+        with self._lock:
+            while (self._inflight or self._pending) and not self._stop.is_set():
+                remain = end - time.time() if end else 5
+                if remain <= 0:
+                    return False
+                self._idle.wait(min(remain, 5))
+        return True
+
+    def status(self) -> dict:
+        """
+        各阶段排队数及耗时（秒）
+        """
+        with self._lock:
+            pending = len(self._pending)
+            inflight = len(self._inflight)
+        return {
+            "pending": pending,
+            "inflight": inflight,
+            "stages": {name: stats.to_dict() for name, stats in self.stats.items()}
+        }
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            self._pending.clear()
+            self._idle.notify_all()
+        self._recognize_executor.shutdown(wait=False, cancel_futures=True)
+        self._transfer_executor.shutdown(wait=False, cancel_futures=True)
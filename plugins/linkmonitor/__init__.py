@@ -1,7 +1,9 @@
 import datetime
 import re
 import threading
+import time
 import traceback
+from concurrent.futures import Future
 from pathlib import Path
 from typing import List, Tuple, Dict, Any, Optional
 
@@ -17,12 +19,11 @@ from app.core.config import settings
 from app.core.event import eventmanager, Event
 from app.log import logger
 from app.plugins import _PluginBase
+from app.plugins.linkmonitor.executor import LinkExecutor, LinkSummary
 from app.schemas import NotificationType
 from app.schemas.types import EventType
 from app.utils.system import SystemUtils
 
-lock = threading.Lock()
-
 
 class FileMonitorHandler(FileSystemEventHandler):
     """
@@ -51,7 +52,7 @@ class LinkMonitor(_PluginBase):
     # 插件图标
     plugin_icon = "Linkace_C.png"
     # 插件版本
-    plugin_version = "1.6"
+    plugin_version = "1.7"
     # 插件作者
     plugin_author = "jxxghp"
     # 作者主页
@@ -81,6 +82,14 @@ class LinkMonitor(_PluginBase):
     _dirconf: Dict[str, Optional[Path]] = {}
     # 存储源目录转移方式
     _transferconf: Dict[str, Optional[str]] = {}
+    # 硬链接线程数
+    _workers = 4
+    _executor: Optional[LinkExecutor] = None
+    # 实时处理和全量同步的结果汇总
+    _summary = LinkSummary()
+    _sync_summary = LinkSummary()
+    # 目录无新文件多久后发送汇总消息（秒）
+    _interval = 10
     # 退出事件
     _event = threading.Event()
 
@@ -99,11 +108,20 @@ class LinkMonitor(_PluginBase):
             self._exclude_keywords = config.get("exclude_keywords") or ""
             self._cron = config.get("cron")
             self._size = config.get("size") or 0
+            try:
+                self._workers = int(config.get("workers") or 4)
+            except ValueError:
+                self._workers = 4
 
         # 停止现有任务
         self.stop_service()
 
         if self._enabled or self._onlyonce:
+            # 定时服务管理器
+            self._scheduler = BackgroundScheduler(timezone=settings.TZ)
+            # 汇总消息统一发送服务
+            if self._notify:
+                self._scheduler.add_job(self.send_msg, trigger='interval', seconds=15)
 
             # 读取目录配置
             monitor_dirs = self._monitor_dirs.split("\n")
@@ -174,8 +192,6 @@ class LinkMonitor(_PluginBase):
 
             # 运行一次定时服务
             if self._onlyonce:
-                # 定时服务管理器
-                self._scheduler = BackgroundScheduler(timezone=settings.TZ)
                 logger.info("目录监控服务启动，立即运行一次")
                 self._scheduler.add_job(func=self.sync_all, trigger='date',
                                         run_date=datetime.datetime.now(
@@ -186,10 +202,10 @@ class LinkMonitor(_PluginBase):
                 # 保存配置
                 self.__update_config()
 
-                # 启动定时服务
-                if self._scheduler.get_jobs():
-                    self._scheduler.print_jobs()
-                    self._scheduler.start()
+            # 启动定时服务
+            if self._scheduler.get_jobs():
+                self._scheduler.print_jobs()
+                self._scheduler.start()
 
     def __update_config(self):
         """
@@ -203,7 +219,8 @@ class LinkMonitor(_PluginBase):
             "monitor_dirs": self._monitor_dirs,
             "exclude_keywords": self._exclude_keywords,
             "cron": self._cron,
-            "size": self._size
+            "size": self._size,
+            "workers": self._workers
         })
 
     @eventmanager.register(EventType.PluginAction)
@@ -228,12 +245,28 @@ class LinkMonitor(_PluginBase):
         立即运行一次，全量同步目录中所有文件
         """
         logger.info("开始全量实时硬链接 ...")
+        executor = self.__get_executor()
+        begin = time.time()
+        futures = []
         # 遍历所有监控目录
         for mon_path in self._dirconf.keys():
             # 遍历目录下所有文件
             for file_path in SystemUtils.list_files(Path(mon_path), ['.*']):
-                self.__handle_file(event_path=str(file_path), mon_path=mon_path)
-        logger.info("全量实时硬链接完成！")
+                future = self.__submit_file(executor=executor, event_path=str(file_path), mon_path=mon_path,
+                                            summary=self._sync_summary)
+                if future:
+                    futures.append(future)
+        # 等待全部完成
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"硬链接出错：{str(e)}")
+        cost = time.time() - begin
+        logger.info(f"全量实时硬链接完成！共处理 {len(futures)} 个文件，耗时 {cost:.1f} 秒，"
+                    f"{len(futures) / cost if cost > 0 else len(futures):.1f} 个/秒")
+        # 全量同步结果合并为一条消息
+        self.__send_summary(self._sync_summary.flush(), title="全量硬链接完成")
 
     def event_handler(self, event, mon_path: str, text: str, event_path: str):
         """
@@ -246,7 +279,17 @@ class LinkMonitor(_PluginBase):
         if not event.is_directory:
             # 文件发生变化
             logger.debug("文件%s：%s" % (text, event_path))
-            self.__handle_file(event_path=event_path, mon_path=mon_path)
+            # 未开启通知时不汇总，避免汇总结果一直累积
+            self.__submit_file(executor=self.__get_executor(), event_path=event_path, mon_path=mon_path,
+                               summary=self._summary if self._notify else None)
+
+    def __get_executor(self) -> LinkExecutor:
+        """
+        获取硬链接执行器
+        """
+        if not self._executor:
+            self._executor = LinkExecutor(max_workers=self._workers)
+        return self._executor
 
     @staticmethod
     def _link_file(src_path: Path, mon_path: str,
@@ -265,6 +308,8 @@ class LinkMonitor(_PluginBase):
             return False, "文件路径不在监控目录内"
         new_path = target_path / rel_path
         if new_path.exists():
+            if LinkExecutor.same_file(src_path, new_path):
+                return True, "目标路径已是硬链接"
             return True, "目标路径文件已存在"
         else:
             # 创建目标目录
@@ -277,73 +322,116 @@ class LinkMonitor(_PluginBase):
                 code, errmsg = SystemUtils.link(src_path, new_path)
             return True if code == 0 else False, errmsg
 
-    def __handle_file(self, event_path: str, mon_path: str):
+    def __submit_file(self, executor: LinkExecutor, event_path: str, mon_path: str,
+                      summary: Optional[LinkSummary]) -> Optional[Future]:
         """
-        同步一个文件
+        过滤文件后提交到执行器，目标文件相同的任务串行执行
         :param event_path: 事件文件路径
         :param mon_path: 监控目录
         """
         file_path = Path(event_path)
         try:
             if not file_path.exists():
-                return
-            # 全程加锁
-            with lock:
-
-                # 回收站及隐藏的文件不处理
-                if event_path.find('/@Recycle/') != -1 \
-                        or event_path.find('/#recycle/') != -1 \
-                        or event_path.find('/.') != -1 \
-                        or event_path.find('/@eaDir') != -1:
-                    logger.debug(f"{event_path} 是回收站或隐藏的文件")
-                    return
-
-                # 命中过滤关键字不处理
-                if self._exclude_keywords:
-                    for keyword in self._exclude_keywords.split("\n"):
-                        if keyword and re.findall(keyword, event_path):
-                            logger.info(f"{event_path} 命中过滤关键字 {keyword}，不处理")
-                            return
-
-                # 判断文件大小
-                if self._size and float(self._size) > 0 and file_path.stat().st_size < float(self._size) * 1024:
-                    logger.info(f"{event_path} 文件大小小于最小文件大小，复制...")
-                    _transfer_type = "copy"
-                else:
-                    _transfer_type = "link"
-
-                # 查询转移目的目录
-                target: Path = self._dirconf.get(mon_path)
-                if not target:
-                    logger.warn(f"{mon_path} 未配置目的目录，将不会进行硬链接")
-                    return
-
-                # 开始硬连接
-                state, errmsg = self._link_file(src_path=file_path, mon_path=mon_path,
-                                                target_path=target, transfer_type=_transfer_type)
-
-                if not state:
-                    # 转移失败
-                    logger.warn(f"{file_path.name} 硬链接失败：{errmsg}")
-                    if self._notify:
-                        self.post_message(
-                            mtype=NotificationType.Manual,
-                            title=f"{file_path.name} 硬链接失败！",
-                            text=f"原因：{errmsg or '未知'}"
-                        )
-                    return
+                return None
+
+            # 回收站及隐藏的文件不处理
+            if event_path.find('/@Recycle/') != -1 \
+                    or event_path.find('/#recycle/') != -1 \
+                    or event_path.find('/.') != -1 \
+                    or event_path.find('/@eaDir') != -1:
+                logger.debug(f"{event_path} 是回收站或隐藏的文件")
+                return None
+
+            # 命中过滤关键字不处理
+            if self._exclude_keywords:
+                for keyword in self._exclude_keywords.split("\n"):
+                    if keyword and re.findall(keyword, event_path):
+                        logger.info(f"{event_path} 命中过滤关键字 {keyword}，不处理")
+                        return None
+
+            # 查询转移目的目录
+            target: Path = self._dirconf.get(mon_path)
+            if not target:
+                logger.warn(f"{mon_path} 未配置目的目录，将不会进行硬链接")
+                return None
+
+            try:
+                target_dir = str((target / file_path.relative_to(Path(mon_path))).parent)
+            except ValueError:
+                target_dir = str(target)
+            # 只有目标文件相同的任务串行，同一目录的文件并发处理
+            return executor.submit(str(Path(target_dir) / file_path.name), self.__handle_file,
+                                   file_path=file_path, mon_path=mon_path, target=target,
+                                   target_dir=target_dir, summary=summary)
+        except Exception as e:
+            logger.error("目录监控发生错误：%s - %s" % (str(e), traceback.format_exc()))
+            return None
 
+    def __handle_file(self, file_path: Path, mon_path: str, target: Path, target_dir: str,
+                      summary: Optional[LinkSummary]):
+        """
+        同步一个文件
+        :param file_path: 文件路径
+        :param mon_path: 监控目录
+        :param target: 目的目录
+        :param target_dir: 文件所在的目标目录，用于汇总消息
+        :param summary: 结果汇总，为空时不汇总
+        """
+        state_key, reason = None, None
+        try:
+            # 判断文件大小
+            if self._size and float(self._size) > 0 and file_path.stat().st_size < float(self._size) * 1024:
+                logger.info(f"{file_path} 文件大小小于最小文件大小，复制...")
+                _transfer_type = "copy"
+            else:
+                _transfer_type = "link"
+
+            # 开始硬连接
+            state, errmsg = self._link_file(src_path=file_path, mon_path=mon_path,
+                                            target_path=target, transfer_type=_transfer_type)
+
+            if not state:
+                # 转移失败
+                logger.warn(f"{file_path.name} 硬链接失败：{errmsg}")
+                state_key, reason = "failed", errmsg
+            elif errmsg == "目标路径已是硬链接":
+                logger.debug(f"{file_path.name} 目标路径已是硬链接，跳过")
+                state_key = "skipped"
+            elif errmsg == "目标路径文件已存在":
+                logger.info(f"{file_path.name} 目标路径文件已存在")
+                state_key = "exists"
+            else:
                 # 转移成功
                 logger.info(f"{file_path.name} 硬链接成功")
-                if self._notify:
-                    self.post_message(
-                        mtype=NotificationType.Manual,
-                        title=f"{file_path.name} 硬链接完成！",
-                        text=f"目标目录：{target}"
-                    )
+                state_key = "copied" if _transfer_type == "copy" else "linked"
 
         except Exception as e:
             logger.error("目录监控发生错误：%s - %s" % (str(e), traceback.format_exc()))
+            state_key, reason = "failed", str(e)
+        if summary:
+            summary.add(target_dir, file_path.name, state_key, reason)
+
+    def send_msg(self):
+        """
+        定时发送已稳定目录的汇总消息
+        """
+        self.__send_summary(self._summary.flush(idle=self._interval), title="硬链接完成")
+
+    def __send_summary(self, summaries: List[dict], title: str):
+        """
+        发送汇总消息，只有跳过的目录不发送
+        """
+        if not self._notify:
+            return
+        for summary in summaries:
+            states = summary.get("states") or {}
+            if not any(count for state, count in states.items() if state != "skipped"):
+                continue
+            self.post_message(
+                mtype=NotificationType.Manual,
+                title=f"{title}！" if not states.get("failed") else f"{title}，{states.get('failed')} 个文件失败！",
+                text=LinkSummary.text(summary)
+            )
 
     def get_state(self) -> bool:
         return self._enabled
@@ -467,7 +555,7 @@ class LinkMonitor(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    'md': 4
+                                    'md': 3
                                 },
                                 'content': [
                                     {
@@ -487,7 +575,7 @@ class LinkMonitor(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    'md': 4
+                                    'md': 3
                                 },
                                 'content': [
                                     {
@@ -504,7 +592,7 @@ class LinkMonitor(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    'md': 4
+                                    'md': 3
                                 },
                                 'content': [
                                     {
@@ -516,6 +604,23 @@ class LinkMonitor(_PluginBase):
                                         }
                                     }
                                 ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'workers',
+                                            'label': '硬链接线程数',
+                                            'placeholder': '4'
+                                        }
+                                    }
+                                ]
                             }
                         ]
                     },
@@ -596,7 +701,8 @@ class LinkMonitor(_PluginBase):
             "monitor_dirs": "",
             "exclude_keywords": "",
             "cron": "",
-            "size": ""
+            "size": "",
+            "workers": 4
         }
 
     def get_page(self) -> List[dict]:
@@ -614,6 +720,9 @@ class LinkMonitor(_PluginBase):
                 except Exception as e:
                     print(str(e))
         self._observer = []
+        if self._executor:
+            self._executor.shutdown()
+            self._executor = None
         if self._scheduler:
             self._scheduler.remove_all_jobs()
             if self._scheduler.running:
@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+
+class LinkExecutor:
+    """
+    并发硬链接执行器
+    多个线程同时处理，只有目标文件相同的任务串行执行（创建目录本身可以并发）
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max(int(max_workers or 1), 1)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="LinkMonitor")
+        self._lock = threading.Lock()
+        # 目标文件 -> [锁, 使用数]
+        self._file_locks: Dict[Hashable, list] = {}
+
+    def submit(self, key: Hashable, func: Callable, *args, **kwargs) -> Optional[Future]:
+        """
+        提交任务
+        :param key: 目标文件，相同的任务串行执行
+        """
+        try:
+            return self._executor.submit(self.__run, key, func, *args, **kwargs)
+        except RuntimeError:
+            # 已停止
+            return None
+
+    def __run(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            file_lock = self._file_locks.setdefault(key, [threading.Lock(), 0])
+            file_lock[1] += 1
+        try:
+            with file_lock[0]:
+                return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                file_lock[1] -= 1
+                if file_lock[1] <= 0:
+                    self._file_locks.pop(key, None)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def same_file(src_path: Path, target_path: Path) -> bool:
+        """
+        目标文件是否就是源文件的硬链接
+        """
+        try:
+            src_stat = os.stat(src_path)
+            target_stat = os.stat(target_path)
+        except OSError:
+            return False
+        return src_stat.st_dev == target_stat.st_dev and src_stat.st_ino == target_stat.st_ino
+
+
+class LinkSummary:
+    """
+    硬链接结果汇总
+    按目的目录汇总，同一目录一段时间内没有新结果后合并为一条消息
+    """
+
+    # 状态：成功、已链接、已存在、失败
+    STATES = {
+        "linked": "硬链接",
+        "copied": "复制",
+        "skipped": "已链接",
+        "exists": "已存在",
+        "failed": "失败"
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 目的目录 -> {"states": {状态: 数量}, "errors": [(文件名, 原因)], "time": 最后更新时间}
+        self._dirs: Dict[str, dict] = {}
+
+    def add(self, target_dir: str, name: str, state: str, errmsg: str = None):
+        with self._lock:
+            summary = self._dirs.setdefault(target_dir, {"states": {}, "errors": [], "time": 0})
+            summary["states"][state] = summary["states"].get(state, 0) + 1
+            if state == "failed":
+                summary["errors"].append((name, errmsg))
+            summary["time"] = time.time()
+
+    def flush(self, idle: float = 0) -> List[dict]:
+        """
+        取出已稳定的汇总
+        :param idle: 目录最后更新后需要等待的时间（秒），0为全部取出
+        """
+        now = time.time()
+        with self._lock:
+            keys = [key for key, summary in self._dirs.items() if now - summary["time"] >= idle]
+            return [dict(self._dirs.pop(key), dir=key) for key in keys]
+
+    @classmethod
+    def text(cls, summary: dict, max_errors: int = 5) -> str:
+        """
+        汇总消息文本
+        """
+        states = summary.get("states") or {}
+        counts = "，".join(f"{cls.STATES.get(state, state)} {count} 个" for state, count in states.items() if count)
+        lines = [f"目标目录：{summary.get('dir')}", counts]
+        errors = summary.get("errors") or []
+        for name, errmsg in errors[:max_errors]:
+            lines.append(f"{name}：{errmsg or '未知'}")
+        if len(errors) > max_errors:
+            lines.append(f"…… 等 {len(errors)} 个文件失败")
+        return "\n".join(lines)
@@ -1,7 +1,6 @@
 import datetime
 import json
 import os
-import re
 import time
 from pathlib import Path
 from typing import List, Tuple, Dict, Any, Optional
@@ -18,6 +17,9 @@ from app.log import logger
 from app.modules.emby import Emby
 from app.modules.jellyfin import Jellyfin
 from app.plugins import _PluginBase
+from app.plugins.mediasyncdel.delete_planner import DeletePlanner
+from app.plugins.mediasyncdel.history_store import HistoryStore
+from app.plugins.mediasyncdel.log_tail import LogTailer, EMBY_PATTERN, JELLYFIN_PATTERN
 from app.schemas.types import NotificationType, EventType, MediaType, MediaImageType
 
 
@@ -29,7 +31,7 @@ class MediaSyncDel(_PluginBase):
     # 插件图标
     plugin_icon = "mediasyncdel.png"
     # 插件版本
-    plugin_version = "1.7.1"
+    plugin_version = "2.0"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -51,9 +53,18 @@ class MediaSyncDel(_PluginBase):
     _del_history = False
     _exclude_path = None
     _library_path = None
+    _keep_days = 90
+    _keep_count = 1000
+    _history: Optional[HistoryStore] = None
     _transferchain = None
     _transferhis = None
     _downloadhis = None
+    # 服务器 -> 日志文件 -> 读取位置
+    _log_cursors: Dict[str, Dict[str, dict]] = {}
+    # 每次调用下载器删除/暂停的种子数
+    _torrent_batch_size = 50
+    # 详情页面显示的历史记录条数
+    _page_size = 30
 
     def init_plugin(self, config: dict = None):
         self._transferchain = TransferChain()
@@ -73,20 +84,35 @@ class MediaSyncDel(_PluginBase):
             self._del_history = config.get("del_history")
             self._exclude_path = config.get("exclude_path")
             self._library_path = config.get("library_path")
+            # 升级前保存的配置没有保留设置，不限制，避免升级后未经确认清理已有记录
+            self._keep_days = self.__int(config.get("keep_days"), 90 if "keep_days" in config else 0)
+            self._keep_count = self.__int(config.get("keep_count"), 1000 if "keep_count" in config else 0)
+
+        self._history = HistoryStore(self, keep_days=self._keep_days, max_count=self._keep_count)
+        # 清理插件历史
+        if config and self._del_history:
+            self._history.clear()
+            self.update_config({
+                "enabled": self._enabled,
+                "sync_type": self._sync_type,
+                "cron": self._cron,
+                "notify": self._notify,
+                "del_source": self._del_source,
+                "del_history": False,
+                "exclude_path": self._exclude_path,
+                "library_path": self._library_path,
+                "keep_days": self._keep_days,
+                "keep_count": self._keep_count
+            })
+        # 旧版本历史记录迁移为分片存储
+        self._history.migrate()
 
-            # 清理插件历史
-            if self._del_history:
-                self.del_data(key="history")
-                self.update_config({
-                    "enabled": self._enabled,
-                    "sync_type": self._sync_type,
-                    "cron": self._cron,
-                    "notify": self._notify,
-                    "del_source": self._del_source,
-                    "del_history": False,
-                    "exclude_path": self._exclude_path,
-                    "library_path": self._library_path
-                })
+    @staticmethod
+    def __int(value: Any, default: int) -> int:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return default
 
     @staticmethod
     def get_command() -> List[Dict[str, Any]]:
@@ -103,6 +129,18 @@ class MediaSyncDel(_PluginBase):
                 "endpoint": self.delete_history,
                 "methods": ["GET"],
                 "summary": "删除订阅历史记录"
+            },
+            {
+                "path": "/history",
+                "endpoint": self.get_history,
+                "methods": ["GET"],
+                "summary": "分页查询同步删除历史记录"
+            },
+            {
+                "path": "/preview",
+                "endpoint": self.preview_log,
+                "methods": ["GET"],
+                "summary": "预览日志方式的删除计划"
             }
         ]
 
@@ -112,15 +150,25 @@ class MediaSyncDel(_PluginBase):
         """
         if apikey != settings.API_TOKEN:
             return schemas.Response(success=False, message="API密钥错误")
-        # 历史记录
-        historys = self.get_data('history')
-        if not historys:
-            return schemas.Response(success=False, message="未找到历史记录")
         # 删除指定记录
-        historys = [h for h in historys if h.get("unique") != key]
-        self.save_data('history', historys)
+        if not self._history.delete(key):
+            return schemas.Response(success=False, message="未找到历史记录")
         return schemas.Response(success=True, message="删除成功")
 
+    def get_history(self, apikey: str, page: int = 1, count: int = 30):
+        """
+        分页查询历史记录，按删除时间倒序
+        """
+        if apikey != settings.API_TOKEN:
+            return schemas.Response(success=False, message="API密钥错误")
+        historys, total = self._history.page(page=page, count=count)
+        return schemas.Response(success=True, data={
+            "total": total,
+            "page": page,
+            "count": count,
+            "items": historys
+        })
+
     def get_service(self) -> List[Dict[str, Any]]:
         """
         注册插件公共服务
@@ -310,6 +358,45 @@ class MediaSyncDel(_PluginBase):
                             }
                         ]
                     },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'keep_days',
+                                            'label': '历史保留天数',
+                                            'placeholder': '0为不限制'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'keep_count',
+                                            'label': '历史保留条数',
+                                            'placeholder': '0为不限制'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
                     {
                         'component': 'VRow',
                         'content': [
@@ -437,14 +524,16 @@ class MediaSyncDel(_PluginBase):
             "sync_type": "webhook",
             "cron": "*/30 * * * *",
             "exclude_path": "",
+            "keep_days": 90,
+            "keep_count": 1000,
         }
 
     def get_page(self) -> List[dict]:
         """
         拼装插件详情页面，需要返回页面配置，同时附带数据
         """
-        # 查询同步详情
-        historys = self.get_data('history')
+        # 查询同步详情，只加载最新一页，更多记录通过分页接口获取
+        historys, total = self._history.page(page=1, count=self._page_size)
         if not historys:
             return [
                 {
@@ -455,8 +544,6 @@ class MediaSyncDel(_PluginBase):
                     }
                 }
             ]
-        # 数据按时间降序排序
-        historys = sorted(historys, key=lambda x: x.get('del_time'), reverse=True)
         # 拼装页面
         contents = []
         for history in historys:
@@ -598,7 +685,7 @@ class MediaSyncDel(_PluginBase):
                 }
             )
 
-        return [
+        pages = [
             {
                 'component': 'div',
                 'props': {
@@ -607,6 +694,16 @@ class MediaSyncDel(_PluginBase):
                 'content': contents
             }
         ]
+        if total > len(historys):
+            pages.append({
+                'component': 'div',
+                'props': {
+                    'class': 'text-center text-sm mt-3',
+                },
+                'text': f'共 {total} 条记录，显示最新 {len(historys)} 条，'
+                        f'更多记录请通过 /api/v1/plugin/MediaSyncDel/history?page=2&count={self._page_size} 查询'
+            })
+        return pages
 
     @eventmanager.register(EventType.WebhookMessage)
     def sync_del_by_webhook(self, event: Event):
@@ -784,44 +881,8 @@ class MediaSyncDel(_PluginBase):
             return
 
         # 开始删除
-        year = None
-        del_torrent_hashs = []
-        stop_torrent_hashs = []
-        error_cnt = 0
-        image = 'https://emby.media/notificationicon.png'
-        for transferhis in transfer_history:
-            title = transferhis.title
-            if title not in media_name:
-                logger.warn(
-                    f"当前转移记录 {transferhis.id} {title} {transferhis.tmdbid} 与删除媒体{media_name}不符，防误删，暂不自动删除")
-                continue
-            image = transferhis.image or image
-            year = transferhis.year
-
-            # 0、删除转移记录
-            self._transferhis.delete(transferhis.id)
-
-            # 删除种子任务
-            if self._del_source:
-                # 1、直接删除源文件
-                if transferhis.src and Path(transferhis.src).suffix in settings.RMT_MEDIAEXT:
-                    self._transferchain.delete_files(Path(transferhis.src))
-                    if transferhis.download_hash:
-                        try:
-                            # 2、判断种子是否被删除完
-                            delete_flag, success_flag, handle_torrent_hashs = self.handle_torrent(
-                                type=transferhis.type,
-                                src=transferhis.src,
-                                torrent_hash=transferhis.download_hash)
-                            if not success_flag:
-                                error_cnt += 1
-                            else:
-                                if delete_flag:
-                                    del_torrent_hashs += handle_torrent_hashs
-                                else:
-                                    stop_torrent_hashs += handle_torrent_hashs
-                        except Exception as e:
-                            logger.error("删除种子失败：%s" % str(e))
+        del_torrent_hashs, stop_torrent_hashs, error_cnt, image, year = self.__delete_transfer_history(
+            transfer_history=transfer_history, media_name=media_name)
 
         logger.info(f"同步删除 {msg} 完成！")
 
@@ -861,16 +922,14 @@ class MediaSyncDel(_PluginBase):
                      f"时间 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))}"
             )
 
-        # 读取历史记录
-        history = self.get_data('history') or []
-
         # 获取poster
         poster_image = self.chain.obtain_specific_image(
             mediaid=tmdb_id,
             mtype=media_type,
             image_type=MediaImageType.Poster,
         ) or image
-        history.append({
+        del_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time()))
+        self._history.append({
             "type": media_type.value,
             "title": media_name,
             "year": year,
@@ -878,13 +937,10 @@ class MediaSyncDel(_PluginBase):
             "season": season_num if season_num and str(season_num).isdigit() else None,
             "episode": episode_num if episode_num and str(episode_num).isdigit() else None,
             "image": poster_image,
-            "del_time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time())),
-            "unique": f"{media_name}:{tmdb_id}:{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))}"
+            "del_time": del_time,
+            "unique": f"{media_name}:{tmdb_id}:{del_time}"
         })
 
-        # 保存历史
-        self.save_data("history", history)
-
     def __get_transfer_his(self, media_type: str, media_name: str, media_path: str,
                            tmdb_id: int, season_num: str, episode_num: str):
         """
@@ -952,9 +1008,10 @@ class MediaSyncDel(_PluginBase):
         emby删除媒体库同步删除历史记录
         日志方式
         """
-        # 读取历史记录
-        history = self.get_data('history') or []
+        history = []
         last_time = self.get_data("last_time") or None
+        # 各服务器日志的读取位置
+        self._log_cursors = self.get_data("log_cursors") or {}
         del_medias = []
 
         # 媒体服务器类型，多个以,分隔
@@ -971,125 +1028,31 @@ class MediaSyncDel(_PluginBase):
                 return
 
         if not del_medias:
-            logger.error("未解析到已删除媒体信息")
+            self.save_data("log_cursors", self._log_cursors)
+            logger.info("未解析到新的已删除媒体信息")
             return
 
-        # 遍历删除
-        last_del_time = None
-        for del_media in del_medias:
-            # 删除时间
-            del_time = del_media.get("time")
-            last_del_time = del_time or datetime.datetime.now()
-            # 媒体类型 Movie|Series|Season|Episode
-            media_type = del_media.get("type")
-            # 媒体名称 蜀山战纪
-            media_name = del_media.get("name")
-            # 媒体年份 2015
-            media_year = del_media.get("year")
-            # 媒体路径 /data/series/国产剧/蜀山战纪 (2015)/Season 2/蜀山战纪 - S02E01 - 第1集.mp4
-            media_path = del_media.get("path")
-            # 季数 S02
-            media_season = del_media.get("season")
-            # 集数 E02
-            media_episode = del_media.get("episode")
-
-            # 排除路径不处理
-            if self._exclude_path and media_path and any(
-                    os.path.abspath(media_path).startswith(os.path.abspath(path)) for path in
-                    self._exclude_path.split(",")):
-                logger.info(f"媒体路径 {media_path} 已被排除，暂不处理")
-                self.save_data("last_time", last_del_time)
-                return
+        # 排除路径、处理路径映射
+        del_medias = [del_media for del_media in del_medias if self.__prepare_log_media(del_media)]
+        last_del_time = del_medias[-1].get("time") if del_medias else None
 
-            # 处理路径映射 (处理同一媒体多分辨率的情况)
-            if self._library_path:
-                paths = self._library_path.split("\n")
-                for path in paths:
-                    sub_paths = path.split(":")
-                    if len(sub_paths) < 2:
-                        continue
-                    media_path = media_path.replace(sub_paths[0], sub_paths[1]).replace('\\', '/')
-
-            # 获取删除的记录
-            # 删除电影
-            if media_type == "Movie":
-                msg = f'电影 {media_name}'
-                transfer_history: List[TransferHistory] = self._transferhis.get_by(
-                    title=media_name,
-                    year=media_year,
-                    dest=media_path)
-            # 删除电视剧
-            elif media_type == "Series":
-                msg = f'剧集 {media_name}'
-                transfer_history: List[TransferHistory] = self._transferhis.get_by(
-                    title=media_name,
-                    year=media_year)
-            # 删除季 S02
-            elif media_type == "Season":
-                msg = f'剧集 {media_name} {media_season}'
-                transfer_history: List[TransferHistory] = self._transferhis.get_by(
-                    title=media_name,
-                    year=media_year,
-                    season=media_season)
-            # 删除剧集S02E02
-            elif media_type == "Episode":
-                msg = f'剧集 {media_name} {media_season}{media_episode}'
-                transfer_history: List[TransferHistory] = self._transferhis.get_by(
-                    title=media_name,
-                    year=media_year,
-                    season=media_season,
-                    episode=media_episode,
-                    dest=media_path)
-            else:
-                self.save_data("last_time", last_del_time)
-                continue
-
-            logger.info(f"正在同步删除 {msg}")
+        # 按媒体分组生成删除计划
+        plans = DeletePlanner(self._transferhis).plan(del_medias)
+        for i, plan in enumerate(plans, 1):
+            msg = plan.get("msg")
+            media_name = plan.get("name")
+            transfer_history: List[TransferHistory] = plan.get("histories")
+            logger.info(f"正在同步删除 {msg}（{i}/{len(plans)}）")
 
             if not transfer_history:
                 logger.info(f"未获取到 {msg} 转移记录，请检查路径映射是否配置错误，请检查tmdbid获取是否正确")
-                self.save_data("last_time", last_del_time)
                 continue
 
             logger.info(f"获取到删除历史记录数量 {len(transfer_history)}")
 
             # 开始删除
-            image = 'https://emby.media/notificationicon.png'
-            del_torrent_hashs = []
-            stop_torrent_hashs = []
-            error_cnt = 0
-            for transferhis in transfer_history:
-                title = transferhis.title
-                if title not in media_name:
-                    logger.warn(
-                        f"当前转移记录 {transferhis.id} {title} {transferhis.tmdbid} 与删除媒体{media_name}不符，防误删，暂不自动删除")
-                    self.save_data("last_time", last_del_time)
-                    continue
-                image = transferhis.image or image
-                # 0、删除转移记录
-                self._transferhis.delete(transferhis.id)
-
-                # 删除种子任务
-                if self._del_source:
-                    # 1、直接删除源文件
-                    if transferhis.src and Path(transferhis.src).suffix in settings.RMT_MEDIAEXT:
-                        self._transferchain.delete_files(Path(transferhis.src))
-                        if transferhis.download_hash:
-                            try:
-                                # 2、判断种子是否被删除完
-                                delete_flag, success_flag, handle_torrent_hashs = self.handle_torrent(
-                                    type=transferhis.type,
-                                    src=transferhis.src,
-                                    torrent_hash=transferhis.download_hash)
-                                if not success_flag:
-                                    error_cnt += 1
-                                else:
-                                    if delete_flag:
-                                        del_torrent_hashs += handle_torrent_hashs
-                                    else:
-                                        stop_torrent_hashs += handle_torrent_hashs
-                            except Exception as e:
-                                logger.error("删除种子失败：%s" % str(e))
+            del_torrent_hashs, stop_torrent_hashs, error_cnt, image, _ = self.__delete_transfer_history(
+                transfer_history=transfer_history, media_name=media_name)
 
             logger.info(f"同步删除 {msg} 完成！")
 
@@ -1115,27 +1078,172 @@ class MediaSyncDel(_PluginBase):
                          f"时间 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))}",
                     image=image)
 
-            history.append({
-                "type": "电影" if media_type == "Movie" else "电视剧",
-                "title": media_name,
-                "year": media_year,
-                "path": media_path,
-                "season": media_season,
-                "episode": media_episode,
-                "image": image,
-                "del_time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time()))
-            })
+            del_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time()))
+            for del_media in plan.get("medias"):
+                media_type = del_media.get("type")
+                history.append({
+                    "type": "电影" if media_type == "Movie" else "电视剧",
+                    "title": del_media.get("name"),
+                    "year": del_media.get("year"),
+                    "path": del_media.get("path"),
+                    "season": del_media.get("season"),
+                    "episode": del_media.get("episode"),
+                    "image": image,
+                    "del_time": del_time,
+                    "unique": f"{del_media.get('name')}:{del_media.get('path')}:{del_time}"
+                })
+
+        # 追加历史
+        self._history.extend(history)
+
+        if last_del_time:
+            self.save_data("last_time", last_del_time)
+        self.save_data("log_cursors", self._log_cursors)
+
+    def __prepare_log_media(self, del_media: dict) -> bool:
+        """
+        排除路径不处理，并处理路径映射
+        """
+        media_path = del_media.get("path")
+        # 排除路径不处理
+        if self._exclude_path and media_path and any(
+                os.path.abspath(media_path).startswith(os.path.abspath(path)) for path in
+                self._exclude_path.split(",")):
+            logger.info(f"媒体路径 {media_path} 已被排除，暂不处理")
+            return False
+
+        # 处理路径映射 (处理同一媒体多分辨率的情况)
+        if self._library_path and media_path:
+            paths = self._library_path.split("\n")
+            for path in paths:
+                sub_paths = path.split(":")
+                if len(sub_paths) < 2:
+                    continue
+                media_path = media_path.replace(sub_paths[0], sub_paths[1]).replace('\\', '/')
+            del_media["path"] = media_path
+        return True
+
+    def preview_log(self, apikey: str) -> schemas.Response:
+        """
+        预览日志方式下一次将执行的删除计划，不执行删除，也不记录读取位置
+        """
+        if apikey != settings.API_TOKEN:
+            return schemas.Response(success=False, message="API密钥错误")
+        if not settings.MEDIASERVER:
+            return schemas.Response(success=False, message="未配置媒体服务器")
+        last_time = self.get_data("last_time") or None
+        self._log_cursors = self.get_data("log_cursors") or {}
+        del_medias = []
+        for media_server in settings.MEDIASERVER.split(','):
+            if media_server == 'emby':
+                del_medias.extend(self.parse_emby_log(last_time))
+            elif media_server == 'jellyfin':
+                del_medias.extend(self.parse_jellyfin_log(last_time))
+        del_medias = [del_media for del_media in del_medias if self.__prepare_log_media(del_media)]
+        plans = DeletePlanner(self._transferhis).plan(del_medias)
+        return schemas.Response(success=True, data=DeletePlanner.preview(plans))
 
-        # 保存历史
-        self.save_data("history", history)
+    def __torrent_action(self, action: str, hashs: str, downloader: str = None, actions: dict = None):
+        """
+        删除或暂停种子，传入actions时只记录，稍后合并执行
+        """
+        if actions is not None:
+            actions.setdefault((action, downloader), []).append(hashs)
+        elif action == "remove":
+            self.chain.remove_torrents(hashs=hashs, downloader=downloader)
+        else:
+            self.chain.stop_torrents(hashs=hashs, downloader=downloader)
+
+    def apply_torrent_actions(self, actions: dict):
+        """
+        按下载器分批执行记录的种子操作，已删除的种子不再暂停
+        """
+        removed = set()
+        for (action, downloader), hashs in sorted(actions.items(), key=lambda x: x[0][0] != "remove"):
+            hashs = list(dict.fromkeys(hashs))
+            if action == "remove":
+                removed.update((downloader, torrent_hash) for torrent_hash in hashs)
+            else:
+                hashs = [torrent_hash for torrent_hash in hashs if (downloader, torrent_hash) not in removed]
+            for i in range(0, len(hashs), self._torrent_batch_size):
+                chunk = hashs[i:i + self._torrent_batch_size]
+                logger.info(f"{'删除' if action == 'remove' else '暂停'}下载任务 {downloader or settings.DEFAULT_DOWNLOADER}："
+                            f"{i + len(chunk)}/{len(hashs)}")
+                try:
+                    if action == "remove":
+                        self.chain.remove_torrents(hashs=chunk, downloader=downloader)
+                    else:
+                        self.chain.stop_torrents(hashs=chunk, downloader=downloader)
+                except Exception as e:
+                    logger.error(f"{'删除' if action == 'remove' else '暂停'}种子失败：{str(e)}")
+
+    def __delete_transfer_history(self, transfer_history: List[TransferHistory],
+                                  media_name: str) -> Tuple[list, list, int, str, Any]:
+        """
+        删除转移记录、源文件，并合并处理下载任务
+        :return: 删除的种子、暂停的种子、失败数、图片、年份
+        """
+        image = 'https://emby.media/notificationicon.png'
+        year = None
+        del_torrent_hashs = []
+        stop_torrent_hashs = []
+        error_cnt = 0
+        # 每个种子只处理一次
+        torrents: Dict[str, TransferHistory] = {}
+        # 下载种子 -> 本次实际删除的源文件
+        deleted_srcs: Dict[str, List[str]] = {}
+        for transferhis in transfer_history:
+            title = transferhis.title
+            if title not in media_name:
+                logger.warn(
+                    f"当前转移记录 {transferhis.id} {title} {transferhis.tmdbid} 与删除媒体{media_name}不符，防误删，暂不自动删除")
+                continue
+            image = transferhis.image or image
+            year = transferhis.year
 
-        self.save_data("last_time", last_del_time)
+            # 0、删除转移记录
+            self._transferhis.delete(transferhis.id)
 
-    def handle_torrent(self, type: str, src: str, torrent_hash: str):
+            # 删除种子任务
+            if self._del_source:
+                # 1、直接删除源文件
+                if transferhis.src and Path(transferhis.src).suffix in settings.RMT_MEDIAEXT:
+                    self._transferchain.delete_files(Path(transferhis.src))
+                    if transferhis.download_hash:
+                        torrents.setdefault(transferhis.download_hash, transferhis)
+                        deleted_srcs.setdefault(transferhis.download_hash, []).append(transferhis.src)
+
+        # 2、判断种子是否被删除完
+        actions = {}
+        for i, (torrent_hash, transferhis) in enumerate(torrents.items(), 1):
+            logger.info(f"检查下载任务 {i}/{len(torrents)}：{torrent_hash}")
+            try:
+                delete_flag, success_flag, handle_torrent_hashs = self.handle_torrent(
+                    type=transferhis.type,
+                    src=transferhis.src,
+                    torrent_hash=torrent_hash,
+                    actions=actions,
+                    srcs=deleted_srcs.get(torrent_hash))
+                if not success_flag:
+                    error_cnt += 1
+                else:
+                    if delete_flag:
+                        del_torrent_hashs += handle_torrent_hashs
+                    else:
+                        stop_torrent_hashs += handle_torrent_hashs
+            except Exception as e:
+                logger.error("删除种子失败：%s" % str(e))
+        # 3、分批删除/暂停种子
+        self.apply_torrent_actions(actions)
+        return del_torrent_hashs, stop_torrent_hashs, error_cnt, image, year
+
+    def handle_torrent(self, type: str, src: str, torrent_hash: str, actions: dict = None, srcs: list = None):
         """
         判断种子是否局部删除
         局部删除则暂停种子
         全部删除则删除种子
+        :param actions: 传入时只记录种子操作，由apply_torrent_actions统一分批执行
+        :param srcs: 同一种子本次删除的其他源文件
         """
         download_id = torrent_hash
         download = settings.DEFAULT_DOWNLOADER
@@ -1149,6 +1257,9 @@ class MediaSyncDel(_PluginBase):
         try:
             # 删除本次种子记录
             self._downloadhis.delete_file_by_fullpath(fullpath=src)
+            for other_src in srcs or []:
+                if other_src and other_src != src:
+                    self._downloadhis.delete_file_by_fullpath(fullpath=other_src)
 
             # 根据种子hash查询所有下载器文件记录
             download_files = self._downloadhis.get_files_by_hash(download_hash=torrent_hash)
@@ -1189,14 +1300,13 @@ class MediaSyncDel(_PluginBase):
 
                         # 删除源种子
                         logger.info(f"删除源下载器下载任务：{settings.DEFAULT_DOWNLOADER} - {torrent_hash}")
-                        self.chain.remove_torrents(torrent_hash)
+                        self.__torrent_action("remove", torrent_hash, actions=actions)
                         handle_torrent_hashs.append(torrent_hash)
 
                     # 删除转种后任务
                     logger.info(f"删除转种后下载任务：{download} - {download_id}")
                     # 删除转种后下载任务
-                    self.chain.remove_torrents(hashs=torrent_hash,
-                                               downloader=download)
+                    self.__torrent_action("remove", torrent_hash, downloader=download, actions=actions)
                     handle_torrent_hashs.append(download_id)
                 else:
                     # 暂停种子
@@ -1206,43 +1316,45 @@ class MediaSyncDel(_PluginBase):
 
                         # 暂停源种子
                         logger.info(f"暂停源下载器下载任务：{settings.DEFAULT_DOWNLOADER} - {torrent_hash}")
-                        self.chain.stop_torrents(torrent_hash)
+                        self.__torrent_action("stop", torrent_hash, actions=actions)
                         handle_torrent_hashs.append(torrent_hash)
 
                     logger.info(f"暂停转种后下载任务：{download} - {download_id}")
                     # 删除转种后下载任务
-                    self.chain.stop_torrents(hashs=download_id, downloader=download)
+                    self.__torrent_action("stop", download_id, downloader=download, actions=actions)
                     handle_torrent_hashs.append(download_id)
             else:
                 # 未转种de情况
                 if delete_flag:
                     # 删除源种子
                     logger.info(f"删除源下载器下载任务：{download} - {download_id}")
-                    self.chain.remove_torrents(download_id)
+                    self.__torrent_action("remove", download_id, actions=actions)
                 else:
                     # 暂停源种子
                     logger.info(f"暂停源下载器下载任务：{download} - {download_id}")
-                    self.chain.stop_torrents(download_id)
+                    self.__torrent_action("stop", download_id, actions=actions)
                 handle_torrent_hashs.append(download_id)
 
             # 处理辅种
             handle_torrent_hashs = self.__del_seed(download_id=download_id,
                                                    delete_flag=delete_flag,
-                                                   handle_torrent_hashs=handle_torrent_hashs)
+                                                   handle_torrent_hashs=handle_torrent_hashs,
+                                                   actions=actions)
             # 处理合集
             if str(type) == "电视剧":
                 handle_torrent_hashs = self.__del_collection(src=src,
                                                              delete_flag=delete_flag,
                                                              torrent_hash=torrent_hash,
                                                              download_files=download_files,
-                                                             handle_torrent_hashs=handle_torrent_hashs)
+                                                             handle_torrent_hashs=handle_torrent_hashs,
+                                                             actions=actions)
             return delete_flag, True, handle_torrent_hashs
         except Exception as e:
             logger.error(f"删种失败： {str(e)}")
             return False, False, 0
 
     def __del_collection(self, src: str, delete_flag: bool, torrent_hash: str, download_files: list,
-                         handle_torrent_hashs: list):
+                         handle_torrent_hashs: list, actions: dict = None):
         """
         处理合集
         """
@@ -1272,13 +1384,13 @@ class MediaSyncDel(_PluginBase):
 
                             # 删除合集种子
                             if delete_flag:
-                                self.chain.remove_torrents(hashs=download_file.download_hash,
-                                                           downloader=download_file.downloader)
+                                self.__torrent_action("remove", download_file.download_hash,
+                                                      downloader=download_file.downloader, actions=actions)
                                 logger.info(f"删除合集种子 {download_file.downloader} {download_file.download_hash}")
                             else:
                                 # 暂停合集种子
-                                self.chain.stop_torrents(hashs=download_file.download_hash,
-                                                         downloader=download_file.downloader)
+                                self.__torrent_action("stop", download_file.download_hash,
+                                                      downloader=download_file.downloader, actions=actions)
                                 logger.info(f"暂停合集种子 {download_file.downloader} {download_file.download_hash}")
                             # 已处理种子+1
                             handle_torrent_hashs.append(download_file.download_hash)
@@ -1286,14 +1398,15 @@ class MediaSyncDel(_PluginBase):
                             # 处理合集辅种
                             handle_torrent_hashs = self.__del_seed(download_id=download_file.download_hash,
                                                                    delete_flag=delete_flag,
-                                                                   handle_torrent_hashs=handle_torrent_hashs)
+                                                                   handle_torrent_hashs=handle_torrent_hashs,
+                                                                   actions=actions)
         except Exception as e:
             logger.error(f"处理 {torrent_hash} 合集失败")
             print(str(e))
 
         return handle_torrent_hashs
 
-    def __del_seed(self, download_id, delete_flag, handle_torrent_hashs):
+    def __del_seed(self, download_id, delete_flag, handle_torrent_hashs, actions: dict = None):
         """
         删除辅种
         """
@@ -1320,17 +1433,17 @@ class MediaSyncDel(_PluginBase):
                     # 删除辅种
                     if delete_flag:
                         logger.info(f"删除辅种：{downloader} - {torrent}")
-                        self.chain.remove_torrents(hashs=torrent,
-                                                   downloader=downloader)
+                        self.__torrent_action("remove", torrent, downloader=downloader, actions=actions)
                     # 暂停辅种
                     else:
-                        self.chain.stop_torrents(hashs=torrent, downloader=downloader)
+                        self.__torrent_action("stop", torrent, downloader=downloader, actions=actions)
                         logger.info(f"辅种：{downloader} - {torrent} 暂停")
 
                     # 处理辅种的辅种
                     handle_torrent_hashs = self.__del_seed(download_id=torrent,
                                                            delete_flag=delete_flag,
-                                                           handle_torrent_hashs=handle_torrent_hashs)
+                                                           handle_torrent_hashs=handle_torrent_hashs,
+                                                           actions=actions)
 
             # 删除辅种历史
             if delete_flag:
@@ -1338,85 +1451,11 @@ class MediaSyncDel(_PluginBase):
                               plugin_id=plugin_id)
         return handle_torrent_hashs
 
-    @staticmethod
-    def parse_emby_log(last_time):
+    def parse_emby_log(self, last_time):
         """
-        获取emby日志列表、解析emby日志
+        获取emby日志列表、增量解析emby日志
         """
-
-        def __parse_log(file_name: str, del_list: list):
-            """
-            解析emby日志
-            """
-            log_url = f"[HOST]System/Logs/{file_name}?api_key=[APIKEY]"
-            log_res = Emby().get_data(log_url)
-            if not log_res or log_res.status_code != 200:
-                logger.error("获取emby日志失败，请检查服务器配置")
-                return del_list
-
-            # 正则解析删除的媒体信息
-            pattern = r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}.\d{3}) Info App: Removing item from database, Type: (\w+), Name: (.*), Path: (.*), Id: (\d+)'
-            matches = re.findall(pattern, log_res.text)
-
-            # 循环获取媒体信息
-            for match in matches:
-                mtime = match[0]
-                # 排除已处理的媒体信息
-                if last_time and mtime < last_time:
-                    continue
-
-                mtype = match[1]
-                name = match[2]
-                path = match[3]
-
-                year = None
-                year_pattern = r'\(\d+\)'
-                year_match = re.search(year_pattern, path)
-                if year_match:
-                    year = year_match.group()[1:-1]
-
-                season = None
-                episode = None
-                if mtype == 'Episode' or mtype == 'Season':
-                    name_pattern = r"\/([\u4e00-\u9fa5]+)(?= \()"
-                    season_pattern = r"Season\s*(\d+)"
-                    episode_pattern = r"S\d+E(\d+)"
-                    name_match = re.search(name_pattern, path)
-                    season_match = re.search(season_pattern, path)
-                    episode_match = re.search(episode_pattern, path)
-
-                    if name_match:
-                        name = name_match.group(1)
-
-                    if season_match:
-                        season = season_match.group(1)
-                        if int(season) < 10:
-                            season = f'S0{season}'
-                        else:
-                            season = f'S{season}'
-                    else:
-                        season = None
-
-                    if episode_match:
-                        episode = episode_match.group(1)
-                        episode = f'E{episode}'
-                    else:
-                        episode = None
-
-                media = {
-                    "time": mtime,
-                    "type": mtype,
-                    "name": name,
-                    "year": year,
-                    "path": path,
-                    "season": season,
-                    "episode": episode,
-                }
-                logger.debug(f"解析到删除媒体：{json.dumps(media)}")
-                del_list.append(media)
-
-            return del_list
-
+        tailer = LogTailer(server="emby", client=Emby(), cursors=self._log_cursors.setdefault("emby", {}))
         log_files = []
         try:
             # 获取所有emby日志
@@ -1427,100 +1466,32 @@ class MediaSyncDel(_PluginBase):
                 log_files_dict = json.loads(log_list_res.text)
                 for item in log_files_dict.get("Items"):
                     if str(item.get('Name')).startswith("embyserver"):
-                        log_files.append(str(item.get('Name')))
+                        log_files.append(item)
         except Exception as e:
             print(str(e))
 
         if not log_files:
-            log_files.append("embyserver.txt")
+            log_files.append({"Name": "embyserver.txt"})
 
         del_medias = []
         log_files.reverse()
         for log_file in log_files:
-            del_medias = __parse_log(file_name=log_file,
-                                     del_list=del_medias)
+            file_name = str(log_file.get("Name"))
+            lines = tailer.read(file_name=file_name,
+                                url=f"[HOST]System/Logs/{file_name}?api_key=[APIKEY]",
+                                size=log_file.get("Size"),
+                                created=log_file.get("DateCreated"))
+            del_medias.extend(tailer.parse(lines=lines, pattern=EMBY_PATTERN, last_time=last_time))
+        tailer.prune([str(log_file.get("Name")) for log_file in log_files])
 
         return del_medias
 
-    @staticmethod
-    def parse_jellyfin_log(last_time: datetime):
+    def parse_jellyfin_log(self, last_time: datetime):
         """
-        获取jellyfin日志列表、解析jellyfin日志
+        获取jellyfin日志列表、增量解析jellyfin日志
         """
-
-        def __parse_log(file_name: str, del_list: list):
-            """
-            解析jellyfin日志
-            """
-            log_url = f"[HOST]System/Logs/Log?name={file_name}&api_key=[APIKEY]"
-            log_res = Jellyfin().get_data(log_url)
-            if not log_res or log_res.status_code != 200:
-                logger.error("获取jellyfin日志失败，请检查服务器配置")
-                return del_list
-
-            # 正则解析删除的媒体信息
-            pattern = r'\[(.*?)\].*?Removing item, Type: "(.*?)", Name: "(.*?)", Path: "(.*?)"'
-            matches = re.findall(pattern, log_res.text)
-
-            # 循环获取媒体信息
-            for match in matches:
-                mtime = match[0]
-                # 排除已处理的媒体信息
-                if last_time and mtime < last_time:
-                    continue
-
-                mtype = match[1]
-                name = match[2]
-                path = match[3]
-
-                year = None
-                year_pattern = r'\(\d+\)'
-                year_match = re.search(year_pattern, path)
-                if year_match:
-                    year = year_match.group()[1:-1]
-
-                season = None
-                episode = None
-                if mtype == 'Episode' or mtype == 'Season':
-                    name_pattern = r"\/([\u4e00-\u9fa5]+)(?= \()"
-                    season_pattern = r"Season\s*(\d+)"
-                    episode_pattern = r"S\d+E(\d+)"
-                    name_match = re.search(name_pattern, path)
-                    season_match = re.search(season_pattern, path)
-                    episode_match = re.search(episode_pattern, path)
-
-                    if name_match:
-                        name = name_match.group(1)
-
-                    if season_match:
-                        season = season_match.group(1)
-                        if int(season) < 10:
-                            season = f'S0{season}'
-                        else:
-                            season = f'S{season}'
-                    else:
-                        season = None
-
-                    if episode_match:
-                        episode = episode_match.group(1)
-                        episode = f'E{episode}'
-                    else:
-                        episode = None
-
-                media = {
-                    "time": mtime,
-                    "type": mtype,
-                    "name": name,
-                    "year": year,
-                    "path": path,
-                    "season": season,
-                    "episode": episode,
-                }
-                logger.debug(f"解析到删除媒体：{json.dumps(media)}")
-                del_list.append(media)
-
-            return del_list
-
+        tailer = LogTailer(server="jellyfin", client=Jellyfin(),
+                           cursors=self._log_cursors.setdefault("jellyfin", {}))
         log_files = []
         try:
             # 获取所有jellyfin日志
@@ -1531,18 +1502,23 @@ class MediaSyncDel(_PluginBase):
                 log_files_dict = json.loads(log_list_res.text)
                 for item in log_files_dict:
                     if str(item.get('Name')).startswith("log_"):
-                        log_files.append(str(item.get('Name')))
+                        log_files.append(item)
         except Exception as e:
             print(str(e))
 
         if not log_files:
-            log_files.append("log_%s.log" % datetime.date.today().strftime("%Y%m%d"))
+            log_files.append({"Name": "log_%s.log" % datetime.date.today().strftime("%Y%m%d")})
 
         del_medias = []
         log_files.reverse()
         for log_file in log_files:
-            del_medias = __parse_log(file_name=log_file,
-                                     del_list=del_medias)
+            file_name = str(log_file.get("Name"))
+            lines = tailer.read(file_name=file_name,
+                                url=f"[HOST]System/Logs/Log?name={file_name}&api_key=[APIKEY]",
+                                size=log_file.get("Size"),
+                                created=log_file.get("DateCreated"))
+            del_medias.extend(tailer.parse(lines=lines, pattern=JELLYFIN_PATTERN, last_time=last_time))
+        tailer.prune([str(log_file.get("Name")) for log_file in log_files])
 
         return del_medias
 
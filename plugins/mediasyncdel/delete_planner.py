@@ -0,0 +1,107 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.db.models.transferhistory import TransferHistory
+
+
+class DeletePlanner:
+    """
+    批量删除计划
+    将一次解析到的删除记录按媒体（名称、年份）分组，每组只查询一次转移记录，再在内存中按
+    电影/剧集/季/集的条件匹配；删除整部剧集时同组的季、集记录不再重复处理；
+    同一种子的多个文件合并为一次种子处理
+    """
+
+    def __init__(self, transferhis: Any):
+        self._transferhis = transferhis
+
+    @staticmethod
+    def __match(media: dict, his: TransferHistory) -> bool:
+        """
+        与按条件查询转移记录的结果保持一致
+        """
+        media_type = media.get("type")
+        if media_type == "Movie":
+            return his.dest == media.get("path")
+        if media_type == "Series":
+            return True
+        if media_type == "Season":
+            return his.seasons == media.get("season")
+        if media_type == "Episode":
+            return his.seasons == media.get("season") \
+                and his.episodes == media.get("episode") \
+                and his.dest == media.get("path")
+        return False
+
+    @staticmethod
+    def media_msg(media: dict) -> str:
+        media_type = media.get("type")
+        if media_type == "Movie":
+            return f'电影 {media.get("name")}'
+        if media_type == "Series":
+            return f'剧集 {media.get("name")}'
+        if media_type == "Season":
+            return f'剧集 {media.get("name")} {media.get("season")}'
+        return f'剧集 {media.get("name")} {media.get("season")}{media.get("episode")}'
+
+    def plan(self, del_medias: List[dict]) -> List[dict]:
+        """
+        生成删除计划
+        :param del_medias: 解析到的删除媒体
+        :return: [{"name", "year", "type", "msg", "medias", "histories", "hashes"}]
+        """
+        groups: Dict[Tuple[str, Optional[str]], dict] = {}
+        for media in del_medias:
+            if media.get("type") not in ["Movie", "Series", "Season", "Episode"]:
+                continue
+            key = (media.get("name"), media.get("year"))
+            group = groups.setdefault(key, {
+                "name": media.get("name"),
+                "year": media.get("year"),
+                "type": "电影" if media.get("type") == "Movie" else "电视剧",
+                "medias": []
+            })
+            group["medias"].append(media)
+
+        plans = []
+        for group in groups.values():
+            medias = group["medias"]
+            # 整部剧集被删除时，同组的季、集已包含在内
+            series = [media for media in medias if media.get("type") == "Series"]
+            if series:
+                group["medias"] = medias = series[-1:]
+            # 每组只查询一次转移记录
+            transfer_history: List[TransferHistory] = self._transferhis.get_by(title=group["name"],
+                                                                               year=group["year"]) or []
+            histories = {}
+            for his in transfer_history:
+                if any(self.__match(media, his) for media in medias):
+                    histories[his.id] = his
+            # 下载种子 -> 源文件
+            hashes: Dict[str, List[str]] = {}
+            for his in histories.values():
+                if his.download_hash:
+                    hashes.setdefault(his.download_hash, []).append(his.src)
+            if len(medias) == 1:
+                group["msg"] = self.media_msg(medias[0])
+            else:
+                group["msg"] = f'{"电影" if group["type"] == "电影" else "剧集"} {group["name"]} 共{len(medias)}项'
+            group["histories"] = list(histories.values())
+            group["hashes"] = hashes
+            plans.append(group)
+        return plans
+
+    @staticmethod
+    def preview(plans: List[dict]) -> List[dict]:
+        """
+        删除计划预览，不执行删除
+        """
+        return [{
+            "name": group.get("name"),
+            "year": group.get("year"),
+            "type": group.get("type"),
+            "msg": group.get("msg"),
+            "medias": [DeletePlanner.media_msg(media) for media in group.get("medias")],
+            "histories": len(group.get("histories")),
+            "files": [his.src for his in group.get("histories") if his.src],
+            "torrents": list(group.get("hashes").keys())
+        } for group in plans]
@@ -0,0 +1,165 @@
+import datetime
+import threading
+from typing import Any, Dict, List, Tuple
+
+from app.log import logger
+
+
+class HistoryStore:
+    """
+    同步删除历史记录
+    按删除日期分片保存，索引中记录每个分片的条数：新增记录只改写当天的分片，
+    分页查询按索引从最新的分片开始只读取需要的分片；超过保留天数或条数时整片清理最旧的记录
+    """
+
+    # 索引：日期 -> 条数
+    INDEX_KEY = "history_index"
+    SHARD_PREFIX = "history_"
+    # 旧版本的全量历史记录
+    LEGACY_KEY = "history"
+    # 索引读改写锁，webhook与定时任务在不同线程写入，插件重新初始化后仍共用
+    _lock = threading.RLock()
+
+    def __init__(self, plugin: Any, keep_days: int = 90, max_count: int = 1000):
+        """
+        :param plugin: 插件实例，用于读写插件数据
+        :param keep_days: 保留天数，0为不限制
+        :param max_count: 最多保留条数，0为不限制
+        """
+        self._plugin = plugin
+        self.keep_days = max(int(keep_days or 0), 0)
+        self.max_count = max(int(max_count or 0), 0)
+
+    def __index(self) -> Dict[str, int]:
+        return self._plugin.get_data(self.INDEX_KEY) or {}
+
+    def __shard(self, day: str) -> List[dict]:
+        return self._plugin.get_data(self.SHARD_PREFIX + day) or []
+
+    def __save_shard(self, index: Dict[str, int], day: str, items: List[dict]):
+        if items:
+            self._plugin.save_data(self.SHARD_PREFIX + day, items)
+            index[day] = len(items)
+        else:
+            self._plugin.del_data(self.SHARD_PREFIX + day)
+            index.pop(day, None)
+
+    @staticmethod
+    def __day(history: dict) -> str:
+        del_time = history.get("del_time") or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return del_time[:10].replace("-", "")
+
+    @property
+    def total(self) -> int:
+        return sum(self.__index().values())
+
+    def migrate(self):
+        """
+        将旧版本的全量历史记录拆分为按日期的分片
+        """
+        with self._lock:
+            legacy = self._plugin.get_data(self.LEGACY_KEY)
+            if not legacy:
+                return
+            if isinstance(legacy, list):
+                logger.info(f"迁移同步删除历史记录 {len(legacy)} 条")
+                # 迁移时不清理，保留设置在下次新增记录时生效
+                self.extend(legacy, prune=False)
+            self._plugin.del_data(self.LEGACY_KEY)
+
+    def extend(self, historys: List[dict], prune: bool = True):
+        """
+        追加历史记录，只改写涉及日期的分片
+        :param prune: 是否按保留天数和条数清理
+        """
+        if not historys:
+            return
+        days: Dict[str, List[dict]] = {}
+        for history in historys:
+            days.setdefault(self.__day(history), []).append(history)
+        with self._lock:
+            index = self.__index()
+            for day, items in days.items():
+                self.__save_shard(index, day, self.__shard(day) + items)
+            if prune:
+                self.__prune(index)
+            self._plugin.save_data(self.INDEX_KEY, index)
+
+    def append(self, history: dict):
+        self.extend([history])
+
+    def __prune(self, index: Dict[str, int]):
+        """
+        按保留天数和条数清理最旧的记录
+        """
+        if self.keep_days:
+            expire = (datetime.datetime.now() - datetime.timedelta(days=self.keep_days)).strftime("%Y%m%d")
+            for day in [day for day in index if day < expire]:
+                self.__save_shard(index, day, [])
+        if self.max_count:
+            total = sum(index.values())
+            for day in sorted(index):
+                if total <= self.max_count:
+                    break
+                if total - index[day] >= self.max_count:
+                    total -= index[day]
+                    self.__save_shard(index, day, [])
+                else:
+                    # 分片内按时间保留最新的记录
+                    items = sorted(self.__shard(day), key=lambda x: x.get("del_time") or "")
+                    items = items[total - self.max_count:]
+                    self.__save_shard(index, day, items)
+                    total = self.max_count
+
+    def page(self, page: int = 1, count: int = 30) -> Tuple[List[dict], int]:
+        """
+        按删除时间倒序分页查询
+        :return: 当前页记录, 总条数
+        """
+        index = self.__index()
+        total = sum(index.values())
+        page = max(int(page or 1), 1)
+        count = max(int(count or 30), 1)
+        skip = (page - 1) * count
+        result = []
+        for day in sorted(index, reverse=True):
+            if len(result) >= count:
+                break
+            if skip >= index[day]:
+                skip -= index[day]
+                continue
+            items = sorted(self.__shard(day), key=lambda x: x.get("del_time") or "", reverse=True)
+            result.extend(items[skip:skip + count - len(result)])
+            skip = 0
+        return result, total
+
+    def delete(self, unique: str) -> bool:
+        """
+        删除指定记录，唯一标识以删除时间结尾时只读取当天的分片
+        """
+        if not unique:
+            return False
+        with self._lock:
+            index = self.__index()
+            days = sorted(index, reverse=True)
+            day = unique[-19:-9].replace("-", "")
+            if day in index:
+                days = [day] + [other for other in days if other != day]
+            for day in days:
+                items = self.__shard(day)
+                remain = [history for history in items if history.get("unique") != unique]
+                if len(remain) != len(items):
+                    self.__save_shard(index, day, remain)
+                    self._plugin.save_data(self.INDEX_KEY, index)
+                    return True
+        return False
+
+    def clear(self):
+        """
+        清空全部历史记录
+        """
+        with self._lock:
+            for day in self.__index():
+                self._plugin.del_data(self.SHARD_PREFIX + day)
+            self._plugin.del_data(self.INDEX_KEY)
+            self._plugin.del_data(self.LEGACY_KEY)
@@ -0,0 +1,161 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+from app.log import logger
+from app.utils.http import RequestUtils
+
+# 删除媒体日志
+EMBY_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}.\d{3}) Info App: Removing item from database, '
+                          r'Type: (\w+), Name: (.*), Path: (.*), Id: (\d+)')
+JELLYFIN_PATTERN = re.compile(r'\[(.*?)\].*?Removing item, Type: "(.*?)", Name: "(.*?)", Path: "(.*?)"')
+# 媒体信息
+YEAR_PATTERN = re.compile(r'\(\d+\)')
+NAME_PATTERN = re.compile(r"\/([\u4e00-\u9fa5]+)(?= \()")
+SEASON_PATTERN = re.compile(r"Season\s*(\d+)")
+EPISODE_PATTERN = re.compile(r"S\d+E(\d+)")
+
+
+def parse_media(mtime: str, mtype: str, name: str, path: str) -> dict:
+    """
+    从删除日志中提取媒体信息
+    """
+    year = None
+    year_match = YEAR_PATTERN.search(path)
+    if year_match:
+        year = year_match.group()[1:-1]
+
+    season = None
+    episode = None
+    if mtype == 'Episode' or mtype == 'Season':
+        name_match = NAME_PATTERN.search(path)
+        season_match = SEASON_PATTERN.search(path)
+        episode_match = EPISODE_PATTERN.search(path)
+
+        if name_match:
+            name = name_match.group(1)
+
+        if season_match:
+            season = season_match.group(1)
+            if int(season) < 10:
+                season = f'S0{season}'
+            else:
+                season = f'S{season}'
+
+        if episode_match:
+            episode = f'E{episode_match.group(1)}'
+
+    return {
+        "time": mtime,
+        "type": mtype,
+        "name": name,
+        "year": year,
+        "path": path,
+        "season": season,
+        "episode": episode,
+    }
+
+
+class LogTailer:
+    """
+    媒体服务器日志增量读取
+    每个服务器的每个日志文件记录已读取的字节位置，下次只通过Range请求获取新增内容；
+    文件变小或创建时间变化视为日志轮转，从头读取；轮转后改名的文件沿用原文件的读取位置
+    """
+
+    def __init__(self, server: str, client: Any, cursors: Dict[str, dict]):
+        """
+        :param server: 服务器类型 emby/jellyfin
+        :param client: Emby()/Jellyfin()
+        :param cursors: 该服务器的读取位置，文件名 -> {"offset", "size", "created"}
+        """
+        self.server = server
+        self.client = client
+        self.cursors = cursors
+
+    def __url(self, url: str) -> Optional[str]:
+        host = getattr(self.client, "_host", None)
+        apikey = getattr(self.client, "_apikey", None)
+        if not host or not apikey:
+            return None
+        return url.replace("[HOST]", host).replace("[APIKEY]", apikey)
+
+    def read(self, file_name: str, url: str, size: int = None, created: str = None) -> List[str]:
+        """
+        读取日志文件新增的完整行
+        :param file_name: 日志文件名
+        :param url: 日志地址，包含[HOST]、[APIKEY]占位符
+        :param size: 日志列表中的文件大小
+        :param created: 日志列表中的文件创建时间
+        """
+        cursor = self.cursors.get(file_name)
+        if not cursor and created:
+            # 轮转后改名的文件沿用原文件的读取位置
+            for name, other in list(self.cursors.items()):
+                if other.get("created") == created and name != file_name:
+                    cursor = dict(other)
+                    break
+        cursor = cursor or {}
+        offset = cursor.get("offset") or 0
+        if (created and cursor.get("created") and cursor.get("created") != created) \
+                or (size is not None and size < offset):
+            logger.info(f"{self.server} 日志 {file_name} 已轮转，重新读取")
+            offset = 0
+        if size is not None and size == offset:
+            # 没有新内容
+            self.cursors[file_name] = dict(cursor, offset=offset, size=size, created=created)
+            return []
+
+        full_url = self.__url(url)
+        if full_url and offset:
+            res = RequestUtils(headers={"Range": f"bytes={offset}-"}).get_res(url=full_url)
+        else:
+            res = self.client.get_data(url)
+        if res is not None and res.status_code == 416:
+            # 请求位置超出文件大小，文件已被截断
+            offset = 0
+            res = self.client.get_data(url)
+        if not res or res.status_code not in (200, 206):
+            logger.error(f"获取{self.server}日志失败，请检查服务器配置")
+            return []
+        content = res.content or b""
+        if res.status_code == 200 and offset:
+            # 服务器不支持Range，跳过已读取的部分
+            if len(content) >= offset:
+                content = content[offset:]
+            else:
+                offset = 0
+        # 只处理完整的行，未写完的行下次再读取
+        end = content.rfind(b"\n") + 1
+        lines = content[:end].decode("utf-8", errors="ignore").splitlines()
+        self.cursors[file_name] = dict(cursor, offset=offset + end, size=size, created=created)
+        logger.debug(f"{self.server} 日志 {file_name} 读取 {end} 字节，{len(lines)} 行")
+        return lines
+
+    def parse(self, lines: List[str], pattern: re.Pattern, last_time: Optional[str]) -> List[dict]:
+        """
+        逐行解析删除的媒体信息
+        """
+        del_list = []
+        for line in lines:
+            if "Removing item" not in line:
+                continue
+            match = pattern.search(line)
+            if not match:
+                continue
+            mtime = match.group(1)
+            # 排除已处理的媒体信息
+            if last_time and mtime < last_time:
+                continue
+            media = parse_media(mtime=mtime, mtype=match.group(2), name=match.group(3), path=match.group(4))
+            logger.debug(f"解析到删除媒体：{json.dumps(media)}")
+            del_list.append(media)
+        return del_list
+
+    def prune(self, file_names: List[str]):
+        """
+        清理已不存在的日志文件的读取位置
+        """
+        for name in list(self.cursors.keys()):
+            if name not in file_names:
+                self.cursors.pop(name, None)
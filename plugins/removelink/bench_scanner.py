@@ -0,0 +1,96 @@
+"""
+文件列表扫描性能对比
+在临时目录生成模拟的媒体库目录树，对比旧版 os.walk + 逐个stat 的扫描与 StateScanner 首次扫描（无快照）、
+重启后扫描（快照全部可用）以及新增一个文件后扫描的耗时
+
+用法（在MoviePilot环境中运行）：
+    python -m app.plugins.removelink.bench_scanner --dirs 1000 --files 20
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from app.plugins.removelink.scanner import StateScanner
+
+
+def build_tree(root: Path, dirs: int, files: int):
+    """
+    生成目录树：剧集/季/文件，每个季目录下files个文件，其中一半为硬链接
+    """
+    for i in range(dirs):
+        season = root / f"show_{i // 10:04d}" / f"Season {i % 10 + 1}"
+        season.mkdir(parents=True, exist_ok=True)
+        for j in range(files):
+            file = season / f"S{i % 10 + 1:02d}E{j + 1:02d}.mkv"
+            if j % 2 and (season / f"S{i % 10 + 1:02d}E{j:02d}.mkv").exists():
+                os.link(season / f"S{i % 10 + 1:02d}E{j:02d}.mkv", file)
+            else:
+                file.write_bytes(b"")
+
+
+def walk_scan(monitor_dirs: List[str]) -> Dict[str, int]:
+    """
+    旧版扫描方式
+    """
+    state_set = {}
+    for mon_path in monitor_dirs:
+        for root, _, files in os.walk(mon_path):
+            for file in files:
+                file = Path(root) / file
+                if not file.exists():
+                    continue
+                state_set[str(file)] = file.stat().st_ino
+    return state_set
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RemoveLink 文件列表扫描性能对比")
+    parser.add_argument("--dirs", type=int, default=1000, help="季目录数")
+    parser.add_argument("--files", type=int, default=20, help="每个目录的文件数")
+    parser.add_argument("--workers", type=int, default=4, help="StateScanner 并发数")
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="removelink-bench-"))
+    try:
+        library = tmp / "library"
+        build_tree(library, args.dirs, args.files)
+        monitor_dirs = [str(library)]
+        snapshot = tmp / "state.pkl"
+        # 快照只复用修改时间早于2秒前的目录
+        time.sleep(2.5)
+
+        state_set, walk_cost = timed(walk_scan, monitor_dirs)
+        scanner = StateScanner(snapshot_file=snapshot, max_workers=args.workers)
+        index, cold_cost = timed(scanner.scan, monitor_dirs)
+        cold_scanned = scanner.scanned
+        if len(index) != len(state_set) \
+                or any(index.get(path)[1] != ino for path, ino in state_set.items()):
+            raise SystemExit("StateScanner 扫描结果与 os.walk 不一致")
+
+        index, warm_cost = timed(scanner.scan, monitor_dirs)
+        warm_reused = scanner.reused
+
+        (library / "show_0000" / "Season 1" / "new.mkv").write_bytes(b"")
+        index, change_cost = timed(scanner.scan, monitor_dirs)
+
+        print(f"文件数：{len(state_set)}，目录数：{cold_scanned}")
+        print(f"os.walk + stat：        {walk_cost:.3f} 秒")
+        print(f"StateScanner 首次扫描： {cold_cost:.3f} 秒（{walk_cost / cold_cost:.1f}x）")
+        print(f"StateScanner 快照扫描： {warm_cost:.3f} 秒（{walk_cost / warm_cost:.1f}x），复用 {warm_reused} 个目录")
+        print(f"新增一个文件后扫描：     {change_cost:.3f} 秒，重新扫描 {scanner.scanned} 个目录")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import os
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+
+class InodeIndex:
+    """
+    监控目录的文件列表及inode反向索引
+    文件按所在目录分组保存，目录路径只保存一份；设备号和inode保存在数组中，
+    通过 (st_dev, st_ino) 可直接找到所有硬链接的文件，不需要遍历全部文件。
+    非线程安全，调用方需自行加锁
+    """
+
+    def __init__(self):
+        # 目录ID -> 目录路径
+        self._dirs: List[str] = []
+        # 目录路径 -> 目录ID
+        self._dir_ids: Dict[str, int] = {}
+        # 目录ID -> {文件名: 槽位}
+        self._names: List[Dict[str, int]] = []
+        # 槽位 -> 设备号、inode、目录ID
+        self._devs = array("Q")
+        self._inos = array("Q")
+        self._slot_dirs = array("l")
+        # 槽位 -> 文件名，空槽位为None
+        self._slot_names: List[Optional[str]] = []
+        # 可复用的空槽位
+        self._free: List[int] = []
+        # (设备号, inode) -> 槽位，多个硬链接时为槽位列表
+        self._inodes: Dict[Tuple[int, int], Union[int, List[int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._slot_names) - len(self._free)
+
+    def __contains__(self, path: str) -> bool:
+        return self.__slot(path) is not None
+
+    def __dir_id(self, dir_path: str, create: bool = False) -> Optional[int]:
+        dir_id = self._dir_ids.get(dir_path)
+        if dir_id is None and create:
+            dir_id = len(self._dirs)
+            self._dirs.append(dir_path)
+            self._dir_ids[dir_path] = dir_id
+            self._names.append({})
+        return dir_id
+
+    def __slot(self, path: str) -> Optional[int]:
+        dir_path, name = os.path.split(path)
+        dir_id = self.__dir_id(dir_path)
+        if dir_id is None:
+            return None
+        return self._names[dir_id].get(name)
+
+    def __path(self, slot: int) -> str:
+        return os.path.join(self._dirs[self._slot_dirs[slot]], self._slot_names[slot])
+
+    def add(self, path: str, dev: int, ino: int):
+        """
+        新增或更新文件
+        """
+        if self.__slot(path) is not None:
+            self.remove(path)
+        dir_path, name = os.path.split(path)
+        dir_id = self.__dir_id(dir_path, create=True)
+        if self._free:
+            slot = self._free.pop()
+            self._devs[slot] = dev
+            self._inos[slot] = ino
+            self._slot_dirs[slot] = dir_id
+            self._slot_names[slot] = name
+        else:
+            slot = len(self._slot_names)
+            self._devs.append(dev)
+            self._inos.append(ino)
+            self._slot_dirs.append(dir_id)
+            self._slot_names.append(name)
+        self._names[dir_id][name] = slot
+        key = (dev, ino)
+        slots = self._inodes.get(key)
+        if slots is None:
+            self._inodes[key] = slot
+        elif isinstance(slots, list):
+            slots.append(slot)
+        else:
+            self._inodes[key] = [slots, slot]
+
+    def add_stat(self, path: str, stat: os.stat_result):
+        self.add(path, stat.st_dev, stat.st_ino)
+
+    def get(self, path: str) -> Optional[Tuple[int, int]]:
+        """
+        获取文件的设备号和inode
+        """
+        slot = self.__slot(path)
+        if slot is None:
+            return None
+        return self._devs[slot], self._inos[slot]
+
+    def remove(self, path: str) -> Optional[Tuple[int, int]]:
+        """
+        移除文件
+        :return: 文件的设备号和inode，不在列表中时返回None
+        """
+        dir_path, name = os.path.split(path)
+        dir_id = self.__dir_id(dir_path)
+        if dir_id is None:
+            return None
+        slot = self._names[dir_id].pop(name, None)
+        if slot is None:
+            return None
+        key = (self._devs[slot], self._inos[slot])
+        slots = self._inodes.get(key)
+        if isinstance(slots, list):
+            slots.remove(slot)
+            if len(slots) == 1:
+                self._inodes[key] = slots[0]
+        else:
+            self._inodes.pop(key, None)
+        self._slot_names[slot] = None
+        self._free.append(slot)
+        return key
+
+    def links(self, dev: int, ino: int) -> List[str]:
+        """
+        获取同一inode的所有文件
+        """
+        slots = self._inodes.get((dev, ino))
+        if slots is None:
+            return []
+        if not isinstance(slots, list):
+            slots = [slots]
+        return [self.__path(slot) for slot in slots]
+
+    def items(self) -> Iterator[Tuple[str, Tuple[int, int]]]:
+        """
+        遍历全部文件
+        """
+        for dir_id, names in enumerate(self._names):
+            dir_path = self._dirs[dir_id]
+            for name, slot in names.items():
+                yield os.path.join(dir_path, name), (self._devs[slot], self._inos[slot])
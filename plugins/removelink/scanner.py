@@ -0,0 +1,142 @@
+import os
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.log import logger
+from app.plugins.removelink.inode_index import InodeIndex
+
+# 目录 -> (修改时间, [(文件名, 设备号, inode)], [子目录名])
+DirEntries = Dict[str, Tuple[Optional[int], List[Tuple[str, int, int]], List[str]]]
+
+
+class StateScanner:
+    """
+    监控目录文件列表扫描
+    使用os.scandir遍历，同目录文件的设备号取目录的设备号、inode取目录项自带的值，不再逐个stat；
+    各监控目录下的一级子目录并发扫描；扫描结果按目录保存到快照文件，
+    重启后修改时间未变化的目录直接使用快照（目录内文件增删改名都会改变目录的修改时间）
+    """
+
+    # 快照版本，格式变化时递增
+    VERSION = 1
+
+    def __init__(self, snapshot_file: Optional[Path] = None, max_workers: int = 4):
+        """
+        :param snapshot_file: 快照文件，为空时不使用快照
+        :param max_workers: 并发扫描线程数
+        """
+        self.snapshot_file = snapshot_file
+        self.max_workers = max(max_workers, 1)
+        # 本次扫描统计
+        self.scanned = 0
+        self.reused = 0
+
+    def __load(self) -> DirEntries:
+        if not self.snapshot_file or not self.snapshot_file.exists():
+            return {}
+        try:
+            with open(self.snapshot_file, "rb") as f:
+                data = pickle.load(f)
+            if data.get("version") != self.VERSION:
+                return {}
+            return data.get("dirs") or {}
+        except Exception as e:
+            logger.warn(f"读取文件列表快照失败：{str(e)}")
+            return {}
+
+    def __save(self, dirs: DirEntries):
+        if not self.snapshot_file:
+            return
+        try:
+            self.snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.snapshot_file.with_suffix(".tmp")
+            with open(tmp_file, "wb") as f:
+                pickle.dump({"version": self.VERSION, "dirs": dirs}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, self.snapshot_file)
+        except Exception as e:
+            logger.warn(f"保存文件列表快照失败：{str(e)}")
+
+    def __scan_dir(self, dir_path: str, snapshot: DirEntries, recursive: bool = True) -> Tuple[DirEntries, int, int]:
+        """
+        扫描目录
+        :return: 目录信息, 扫描的目录数, 使用快照的目录数
+        """
+        result: DirEntries = {}
+        scanned = reused = 0
+        # 修改时间在此之后的目录不使用快照，避免同一时间精度内的修改被忽略
+        fresh = time.time_ns() - 2 * 10 ** 9
+        stack = [dir_path]
+        while stack:
+            path = stack.pop()
+            try:
+                dir_stat = os.stat(path)
+            except OSError:
+                continue
+            cached = snapshot.get(path)
+            if cached and cached[0] is not None and cached[0] == dir_stat.st_mtime_ns:
+                entry = cached
+                reused += 1
+            else:
+                files = []
+                subdirs = []
+                try:
+                    with os.scandir(path) as it:
+                        for item in it:
+                            try:
+                                if item.is_dir(follow_symlinks=False):
+                                    subdirs.append(item.name)
+                                elif item.is_symlink():
+                                    # 链接文件记录目标文件的inode
+                                    if item.is_file():
+                                        stat = item.stat()
+                                        files.append((item.name, stat.st_dev, stat.st_ino))
+                                elif item.is_file(follow_symlinks=False):
+                                    files.append((item.name, dir_stat.st_dev, item.inode()))
+                            except OSError:
+                                continue
+                except OSError as e:
+                    logger.debug(f"扫描目录 {path} 失败：{str(e)}")
+                    continue
+                mtime = dir_stat.st_mtime_ns if dir_stat.st_mtime_ns < fresh else None
+                entry = (mtime, files, subdirs)
+                scanned += 1
+            result[path] = entry
+            if recursive:
+                stack.extend(os.path.join(path, name) for name in entry[2])
+        return result, scanned, reused
+
+    def scan(self, monitor_dirs: List[str]) -> InodeIndex:
+        """
+        扫描全部监控目录
+        """
+        snapshot = self.__load()
+        dirs: DirEntries = {}
+        self.scanned = self.reused = 0
+        tasks = []
+        for mon_path in monitor_dirs:
+            if not mon_path:
+                continue
+            mon_path = os.path.normpath(mon_path)
+            # 监控目录本身只扫描一层，一级子目录并发扫描
+            root, scanned, reused = self.__scan_dir(mon_path, snapshot, recursive=False)
+            dirs.update(root)
+            self.scanned += scanned
+            self.reused += reused
+            entry = root.get(mon_path)
+            if entry:
+                tasks.extend(os.path.join(mon_path, name) for name in entry[2])
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="RemoveLink-scan") as executor:
+            for result, scanned, reused in executor.map(lambda path: self.__scan_dir(path, snapshot), tasks):
+                dirs.update(result)
+                self.scanned += scanned
+                self.reused += reused
+
+        index = InodeIndex()
+        for dir_path, (_, files, _) in dirs.items():
+            for name, dev, ino in files:
+                index.add(os.path.join(dir_path, name), dev, ino)
+        self.__save(dirs)
+        return index
@@ -2,7 +2,6 @@ import json
 import re
 import warnings
 from datetime import datetime, timedelta
-from multiprocessing.dummy import Pool as ThreadPool
 from threading import Lock
 from typing import Optional, Any, List, Dict, Tuple
 
@@ -22,6 +21,7 @@ from app.helper.module import ModuleHelper
 from app.helper.sites import SitesHelper
 from app.log import logger
 from app.plugins import _PluginBase
+from app.plugins.sitestatistic.scheduler import SiteRefreshScheduler
 from app.plugins.sitestatistic.siteuserinfo import ISiteUserInfo
 from app.schemas.types import EventType, NotificationType
 from app.utils.http import RequestUtils
@@ -29,6 +29,12 @@ from app.utils.object import ObjectUtils
 from app.utils.string import StringUtils
 from app.utils.timer import TimerUtils
 
+try:
+    # 与站点自动签到插件共用仿真浏览器池
+    from app.plugins.autosignin.browser_pool import BrowserPool
+except ImportError:
+    BrowserPool = None
+
 warnings.filterwarnings("ignore", category=FutureWarning)
 
 lock = Lock()
@@ -42,7 +48,7 @@ class SiteStatistic(_PluginBase):
     # 插件图标
     plugin_icon = "statistic.png"
     # 插件版本
-    plugin_version = "4.0.1"
+    plugin_version = "4.1.1"
     # 插件作者
     plugin_author = "lightolly"
     # 作者主页
@@ -61,6 +67,7 @@ class SiteStatistic(_PluginBase):
     _last_update_time: Optional[datetime] = None
     _sites_data: dict = {}
     _site_schema: List[ISiteUserInfo] = None
+    _refresh_scheduler: Optional[SiteRefreshScheduler] = None
 
     # 配置属性
     _enabled: bool = False
@@ -69,6 +76,8 @@ class SiteStatistic(_PluginBase):
     _cron: str = ""
     _notify: bool = False
     _queue_cnt: int = 5
+    _adaptive: bool = False
+    _refresh_budget: int = 0
     _remove_failed: bool = False
     _statistic_type: str = None
     _statistic_sites: list = []
@@ -88,6 +97,11 @@ class SiteStatistic(_PluginBase):
             self._notify = config.get("notify")
             self._sitemsg = config.get("sitemsg")
             self._queue_cnt = config.get("queue_cnt")
+            self._adaptive = config.get("adaptive")
+            try:
+                self._refresh_budget = int(config.get("refresh_budget") or 0)
+            except ValueError:
+                self._refresh_budget = 0
             self._remove_failed = config.get("remove_failed")
             self._statistic_type = config.get("statistic_type") or "all"
             self._statistic_sites = config.get("statistic_sites") or []
@@ -109,6 +123,8 @@ class SiteStatistic(_PluginBase):
             self._last_update_time = None
             # 站点数据
             self._sites_data = {}
+            # 刷新调度器，加载历史耗时和变化率
+            self._refresh_scheduler = SiteRefreshScheduler(stats=self.get_data("refresh_stats") or {})
 
             # 立即运行一次
             if self._onlyonce:
@@ -117,7 +133,8 @@ class SiteStatistic(_PluginBase):
                 logger.info(f"站点数据统计服务启动，立即运行一次")
                 self._scheduler.add_job(self.refresh_all_site_data, 'date',
                                         run_date=datetime.now(
-                                            tz=pytz.timezone(settings.TZ)) + timedelta(seconds=3)
+                                            tz=pytz.timezone(settings.TZ)) + timedelta(seconds=3),
+                                        kwargs={"force": True}
                                         )
                 # 关闭一次性开关
                 self._onlyonce = False
@@ -165,6 +182,12 @@ class SiteStatistic(_PluginBase):
             "methods": ["GET"],
             "summary": "刷新站点数据",
             "description": "刷新对应域名的站点数据",
+        }, {
+            "path": "/refresh_metrics",
+            "endpoint": self.refresh_metrics,
+            "methods": ["GET"],
+            "summary": "站点刷新指标",
+            "description": "查询各站点刷新耗时、数据变化率及下次刷新时间",
         }]
 
     def get_service(self) -> List[Dict[str, Any]]:
@@ -410,6 +433,62 @@ class SiteStatistic(_PluginBase):
                                     }
                                 ]
                             },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'adaptive',
+                                            'label': '智能调度',
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'refresh_budget',
+                                            'label': '单次刷新站点上限',
+                                            'placeholder': '0为不限制'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 8
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VAlert',
+                                        'props': {
+                                            'type': 'info',
+                                            'variant': 'tonal',
+                                            'text': '开启智能调度后，数据经常变化的站点每次都会刷新，数据长期不变的站点会逐步降低刷新频率（最长3天），'
+                                                    '慢站点优先开始刷新；手动刷新不受影响。'
+                                        }
+                                    }
+                                ]
+                            }
                         ]
                     }
                 ]
@@ -421,6 +500,8 @@ class SiteStatistic(_PluginBase):
             "sitemsg": True,
             "cron": "5 1 * * *",
             "queue_cnt": 5,
+            "adaptive": False,
+            "refresh_budget": 0,
             "remove_failed": False,
             "statistic_type": "all",
             "statistic_sites": [],
@@ -1155,10 +1236,17 @@ class SiteStatistic(_PluginBase):
             logger.debug(f"站点 {site_name} url={url}，site_cookie={site_cookie}，ua={ua}，api_key={apikey}，token={token}，proxy={proxy}")
             if render:
                 # 演染模式
-                html_text = PlaywrightHelper().get_page_source(url=url,
-                                                               cookies=site_cookie,
-                                                               ua=ua,
-                                                               proxies=proxy_server)
+                if BrowserPool:
+                    html_text = BrowserPool.instance().get_page_source(url=url,
+                                                                       cookies=site_cookie,
+                                                                       ua=ua,
+                                                                       proxies=proxy_server,
+                                                                       site=site_name)
+                else:
+                    html_text = PlaywrightHelper().get_page_source(url=url,
+                                                                   cookies=site_cookie,
+                                                                   ua=ua,
+                                                                   proxies=proxy_server)
             else:
                 # 普通模式
                 res = RequestUtils(cookies=site_cookie,
@@ -1360,14 +1448,25 @@ class SiteStatistic(_PluginBase):
             self.post_message(channel=event.event_data.get("channel"),
                               title="开始刷新站点数据 ...",
                               userid=event.event_data.get("user"))
-        self.refresh_all_site_data()
+        self.refresh_all_site_data(force=True)
         if event:
             self.post_message(channel=event.event_data.get("channel"),
                               title="站点数据刷新完成！", userid=event.event_data.get("user"))
 
-    def refresh_all_site_data(self):
+    def refresh_metrics(self, apikey: str) -> schemas.Response:
+        """
+        查询各站点刷新指标，可由API调用
+        """
+        if apikey != settings.API_TOKEN:
+            return schemas.Response(success=False, message="API密钥错误")
+        if not self._refresh_scheduler:
+            return schemas.Response(success=False, message="插件未启用")
+        return schemas.Response(success=True, data=self._refresh_scheduler.metrics())
+
+    def refresh_all_site_data(self, force: bool = False):
         """
         多线程刷新站点下载上传量，默认间隔6小时
+        :param force: 忽略智能调度，刷新全部站点
         """
         if not self.sites.get_indexers():
             return
@@ -1389,7 +1488,7 @@ class SiteStatistic(_PluginBase):
             # 将数据初始化为前一天，筛选站点
             yesterday_sites_data = {}
             today_date = datetime.now().strftime('%Y-%m-%d')
-            if self._statistic_type == "add" or not self._remove_failed:
+            if self._statistic_type == "add" or not self._remove_failed or self._adaptive:
                 if last_update_time := self.get_data("last_update_time"):
                     yesterday_sites_data = self.get_data(last_update_time) or {}
 
@@ -1397,9 +1496,30 @@ class SiteStatistic(_PluginBase):
                 site_names = [site.get("name") for site in refresh_sites]
                 self._sites_data = {k: v for k, v in yesterday_sites_data.items() if k in site_names}
 
-            # 并发刷新
-            with ThreadPool(min(len(refresh_sites), int(self._queue_cnt or 5))) as p:
-                p.map(self.__refresh_site_data, refresh_sites)
+            if not self._refresh_scheduler:
+                self._refresh_scheduler = SiteRefreshScheduler(stats=self.get_data("refresh_stats") or {})
+            # 已删除或停用的站点不再保留刷新统计
+            all_site_names = {site.get("name") for site in all_sites}
+            for site_name in set(self._refresh_scheduler.stats) - all_site_names:
+                self._refresh_scheduler.remove(site_name)
+            if self._adaptive and not force:
+                refresh_sites, skipped_sites = self._refresh_scheduler.plan(sites=refresh_sites,
+                                                                            budget=self._refresh_budget)
+                # 本次跳过的站点沿用上一次的数据
+                for site in skipped_sites:
+                    site_name = site.get("name")
+                    if site_name not in self._sites_data and yesterday_sites_data.get(site_name):
+                        self._sites_data[site_name] = yesterday_sites_data[site_name]
+                logger.info(f"智能调度：本次刷新 {len(refresh_sites)} 个站点，跳过 {len(skipped_sites)} 个站点")
+            else:
+                refresh_sites, _ = self._refresh_scheduler.plan(sites=refresh_sites, force=True)
+
+            # 并发刷新，慢站点优先开始，完成一个记录一个
+            self._refresh_scheduler.run(func=self.__refresh_site_data,
+                                        sites=refresh_sites,
+                                        workers=int(self._queue_cnt or 5),
+                                        snapshot=lambda name: dict(self._sites_data.get(name) or {}))
+            self.save_data("refresh_stats", self._refresh_scheduler.stats)
 
             # 通知刷新完成
             if self._notify:
@@ -1469,6 +1589,8 @@ class SiteStatistic(_PluginBase):
             "notify": self._notify,
             "sitemsg": self._sitemsg,
             "queue_cnt": self._queue_cnt,
+            "adaptive": self._adaptive,
+            "refresh_budget": self._refresh_budget,
             "remove_failed": self._remove_failed,
             "statistic_type": self._statistic_type,
             "statistic_sites": self._statistic_sites,
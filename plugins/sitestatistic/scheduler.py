@@ -0,0 +1,182 @@
+import time
+from multiprocessing.dummy import Pool as ThreadPool
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.log import logger
+
+
+class SiteRefreshScheduler:
+    """
+    站点数据自适应刷新调度器
+    记录每个站点的刷新耗时和数据变化率，活跃站点每次都刷新，数据长期不变的站点逐步降低刷新频率，
+    同时按耗时从慢到快排列任务，避免慢站点拖住整个线程池
+    """
+
+    # 数据完全不变的站点最长刷新间隔（秒）
+    MAX_INTERVAL = 3 * 24 * 3600
+    # 变化率平滑系数
+    CHANGE_ALPHA = 0.3
+    # 耗时平滑系数
+    LATENCY_ALPHA = 0.5
+    # 判断数据是否变化的字段
+    WATCH_FIELDS = ("upload", "download", "bonus", "seeding", "seeding_size", "leeching",
+                    "user_level", "message_unread")
+
+    def __init__(self, stats: Dict[str, dict] = None):
+        # 站点名称 -> 统计信息
+        self._stats: Dict[str, dict] = stats or {}
+        self._lock = Lock()
+
+    @property
+    def stats(self) -> Dict[str, dict]:
+        """
+        全部站点的统计信息，用于持久化
+        """
+        with self._lock:
+            return {name: dict(stat) for name, stat in self._stats.items()}
+
+    def __stat(self, site_name: str) -> dict:
+        return self._stats.setdefault(site_name, {
+            "latency": 0,
+            "avg_latency": 0,
+            "change_rate": 1.0,
+            "last_refresh": 0,
+            "last_changed": 0,
+            "refreshes": 0,
+            "failures": 0
+        })
+
+    def interval(self, site_name: str) -> float:
+        """
+        根据数据变化率计算站点的期望刷新间隔，变化越频繁间隔越短
+        """
+        stat = self._stats.get(site_name)
+        if not stat or not stat.get("refreshes"):
+            return 0
+        return self.MAX_INTERVAL * (1 - min(max(stat.get("change_rate", 1.0), 0), 1))
+
+    def plan(self, sites: List[dict], budget: int = 0, force: bool = False) -> Tuple[List[dict], List[dict]]:
+        """
+        计算本次需要刷新的站点
+        :param sites: 候选站点
+        :param budget: 本次最多刷新的站点数，0为不限制
+        :param force: 忽略刷新间隔，全部站点均视为到期
+        :return: 按耗时从慢到快排列的待刷新站点、本次跳过的站点
+        """
+        now = time.time()
+        due = []
+        skipped = []
+        with self._lock:
+            for site in sites:
+                site_name = site.get("name")
+                stat = self._stats.get(site_name) or {}
+                elapsed = now - stat.get("last_refresh", 0)
+                interval = self.interval(site_name)
+                if force or elapsed >= interval:
+                    # 陈旧度：超出期望间隔越多越优先
+                    due.append((elapsed / max(interval, 1), site))
+                else:
+                    skipped.append(site)
+            # 超出预算时优先保留最陈旧的站点
+            due.sort(key=lambda x: x[0], reverse=True)
+            if budget and len(due) > budget:
+                skipped.extend(site for _, site in due[budget:])
+                due = due[:budget]
+            # 最慢的站点最先开始
+            refresh_sites = sorted((site for _, site in due),
+                                   key=lambda s: self._stats.get(s.get("name"), {}).get("avg_latency", 0),
+                                   reverse=True)
+        return refresh_sites, skipped
+
+    def run(self, func: Callable[[dict], Any], sites: List[dict], workers: int,
+            snapshot: Callable[[str], Optional[dict]]) -> List[Any]:
+        """
+        并发执行刷新，完成一个记录一个
+        :param func: 单站点刷新方法，失败返回None
+        :param sites: 待刷新站点
+        :param workers: 并发数
+        :param snapshot: 按站点名称获取当前站点数据，用于判断刷新后数据是否变化
+        """
+        if not sites:
+            return []
+
+        def __timed(site: dict) -> Tuple[dict, Optional[dict], Any, float]:
+            before = snapshot(site.get("name"))
+            start = time.time()
+            try:
+                result = func(site)
+            except Exception as err:
+                logger.error(f"站点 {site.get('name')} 刷新出错：{str(err)}")
+                result = None
+            return site, before, result, time.time() - start
+
+        results = []
+        with ThreadPool(min(len(sites), max(int(workers or 1), 1))) as p:
+            for site, before, result, latency in p.imap_unordered(__timed, sites):
+                site_name = site.get("name")
+                self.record(site_name=site_name,
+                            latency=latency,
+                            success=result is not None,
+                            changed=self.changed(before, snapshot(site_name)))
+                logger.debug(f"站点 {site_name} 刷新完成，耗时 {latency:.2f} 秒")
+                results.append(result)
+        return results
+
+    def changed(self, before: Optional[dict], after: Optional[dict]) -> bool:
+        """
+        判断站点数据是否发生变化
+        """
+        if not before or not after:
+            return True
+        return any(before.get(field) != after.get(field) for field in self.WATCH_FIELDS)
+
+    def record(self, site_name: str, latency: float, success: bool, changed: bool):
+        """
+        记录一次刷新结果
+        """
+        with self._lock:
+            stat = self.__stat(site_name)
+            stat["latency"] = round(latency, 3)
+            if stat.get("avg_latency"):
+                stat["avg_latency"] = round(self.LATENCY_ALPHA * latency
+                                            + (1 - self.LATENCY_ALPHA) * stat["avg_latency"], 3)
+            else:
+                stat["avg_latency"] = round(latency, 3)
+            stat["refreshes"] = stat.get("refreshes", 0) + 1
+            if not success:
+                # 失败时不更新刷新时间，下次继续尝试
+                stat["failures"] = stat.get("failures", 0) + 1
+                return
+            stat["last_refresh"] = time.time()
+            stat["change_rate"] = round(self.CHANGE_ALPHA * (1 if changed else 0)
+                                        + (1 - self.CHANGE_ALPHA) * stat.get("change_rate", 1.0), 4)
+            if changed:
+                stat["last_changed"] = stat["last_refresh"]
+
+    def remove(self, site_name: str):
+        """
+        删除站点统计信息
+        """
+        with self._lock:
+            self._stats.pop(site_name, None)
+
+    def metrics(self) -> List[dict]:
+        """
+        各站点刷新指标，按平均耗时倒序
+        """
+        now = time.time()
+        with self._lock:
+            metrics = [{
+                "site": name,
+                "latency": stat.get("latency"),
+                "avg_latency": stat.get("avg_latency"),
+                "change_rate": stat.get("change_rate"),
+                "refreshes": stat.get("refreshes"),
+                "failures": stat.get("failures"),
+                "last_refresh": time.strftime("%Y-%m-%d %H:%M:%S",
+                                              time.localtime(stat.get("last_refresh")))
+                if stat.get("last_refresh") else None,
+                "next_refresh_in": max(int(self.interval(name) - (now - stat.get("last_refresh", 0))), 0)
+            } for name, stat in self._stats.items()]
+        return sorted(metrics, key=lambda x: x.get("avg_latency") or 0, reverse=True)
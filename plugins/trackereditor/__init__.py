@@ -8,6 +8,7 @@ from qbittorrentapi.torrents import TorrentInfoList
 from app.modules.transmission import Transmission
 from transmission_rpc.torrent import Torrent
 from app.plugins import _PluginBase
+from app.plugins.trackereditor.rewrite import TrackerRewriter
 from app.schemas import NotificationType
 
 
@@ -19,7 +20,7 @@ class TrackerEditor(_PluginBase):
     # 插件图标
     plugin_icon = "trackereditor_A.png"
     # 插件版本
-    plugin_version = "1.5"
+    plugin_version = "1.6"
     # 插件作者
     plugin_author = "honue"
     # 作者主页
@@ -38,6 +39,10 @@ class TrackerEditor(_PluginBase):
     _port: int = None
     _target_domain: str = None
     _replace_domain: str = None
+    _extra_rules: str = None
+    _dry_run: bool = False
+    # 试运行通知中最多列出的种子数
+    _notify_limit: int = 20
 
     _onlyonce: bool = False
     _downloader: Union[Qbittorrent, Transmission] = None
@@ -56,6 +61,8 @@ class TrackerEditor(_PluginBase):
             self._password = config.get("password")
             self._target_domain = config.get("target_domain")
             self._replace_domain = config.get("replace_domain")
+            self._extra_rules = config.get("extra_rules")
+            self._dry_run = config.get("dry_run")
             self._run_con_enable = config.get("run_con_enable")
             self._run_con = config.get("run_con")
             self._notify = config.get("notify")
@@ -69,23 +76,35 @@ class TrackerEditor(_PluginBase):
 
     def task(self):
         logger.info(f"{'*' * 30}TrackerEditor: 开始执行Tracker替换{'*' * 30}")
+        rewriter = TrackerRewriter(rules=[(self._target_domain, self._replace_domain)]
+                                   + TrackerRewriter.parse_rules(self._extra_rules))
+        if not rewriter.rules:
+            logger.info(f"未设置待替换文本")
+            return
         torrent_total_cnt: int = 0
         torrent_update_cnt: int = 0
+        torrent_failed_cnt: int = 0
+        plan: List[dict] = []
         if self._downloader_type == "qbittorrent":
             self._downloader = Qbittorrent(self._host, self._port, self._username, self._password)
             torrent_info_list: TorrentInfoList
             torrent_info_list, error = self._downloader.get_torrents()
-            torrent_total_cnt = len(torrent_info_list)
             if error:
                 return
-            for torrent in torrent_info_list:
-                for tracker in torrent.trackers:
-                    if self._target_domain in tracker.url:
-                        original_url = tracker.url
-                        new_url = tracker.url.replace(self._target_domain, self._replace_domain)
-                        logger.info(f"{original_url} 替换为\n {new_url}")
-                        torrent.edit_tracker(orig_url=original_url, new_url=new_url)
-                        torrent_update_cnt += 1
+            torrent_total_cnt = len(torrent_info_list)
+            qbc = self._downloader.qbc
+            # 一次性收集全部Tracker, 计算需要修改的种子
+            trackers = TrackerRewriter.collect_qb(qbc, torrent_info_list)
+            plan = rewriter.plan(trackers=trackers,
+                                 names={torrent.get("hash"): torrent.get("name") for torrent in torrent_info_list})
+
+            def __edit(item: dict) -> bool:
+                for original_url, new_url in item.get("changes"):
+                    qbc.torrents_edit_tracker(torrent_hash=item.get("hash"), original_url=original_url,
+                                              new_url=new_url)
+                return True
+
+            edit_func = __edit
 
         elif self._downloader_type == "transmission":
             self._downloader = Transmission(self._host, self._port, self._username, self._password)
@@ -93,36 +112,47 @@ class TrackerEditor(_PluginBase):
             # "4.0.3 (6b0e49bbb2)"  "3.00 (bb6b5a062e)"
             torrent_list: List[Torrent]
             torrent_list, error = self._downloader.get_torrents()
-            torrent_total_cnt = len(torrent_list)
             if error:
                 return
-            for torrent in torrent_list:
-                new_tracker_list = []
-                for tracker in torrent.tracker_list:
-                    if self._target_domain in tracker:
-                        new_url = tracker.replace(self._target_domain, self._replace_domain)
-                        new_tracker_list.append(new_url)
-                        logger.info(f"{tracker} 替换为\n {new_url}")
-                        torrent_update_cnt += 1
-                    else:
-                        new_tracker_list.append(tracker)
+            torrent_total_cnt = len(torrent_list)
+            plan = rewriter.plan(trackers={torrent.hashString: list(torrent.tracker_list) for torrent in torrent_list},
+                                 names={torrent.hashString: torrent.name for torrent in torrent_list})
+
+            def __edit(item: dict) -> bool:
                 if int(tr_version[0]) >= 4:
                     # 版本大于等于4.x
-                    __tracker_list = [new_tracker_list]
+                    __tracker_list = [item.get("trackers")]
                 else:
-                    __tracker_list = new_tracker_list
-                if torrent_update_cnt > 0:
-                    update_result = self._downloader.update_tracker(hash_string=torrent.hashString, tracker_list=__tracker_list)
-                    if not update_result:
-                        logger.error(f"执行tracker修改出错，中止本次执行")
-                        torrent_update_cnt = 0
-                        break
-            if torrent_update_cnt == 0:
-                logger.info(f"tracker修改条数为0")
+                    __tracker_list = item.get("trackers")
+                return self._downloader.update_tracker(hash_string=item.get("hash"), tracker_list=__tracker_list)
+
+            edit_func = __edit
+        else:
+            return
+
+        for item in plan:
+            for original_url, new_url in item.get("changes"):
+                logger.info(f"{original_url} 替换为\n {new_url}")
+        if not plan:
+            logger.info(f"tracker修改条数为0")
+        elif self._dry_run:
+            logger.info(f"试运行，共 {len(plan)} 个种子需要修改，未执行修改")
+        else:
+            torrent_update_cnt, torrent_failed_cnt = rewriter.apply(plan=plan, func=edit_func)
         logger.info(f"{'*' * 30}TrackerEditor: Tracker替换完成{'*' * 30}")
         if (self._run_con_enable and self._notify) or (self._onlyonce and self._notify):
             title = '【Tracker替换】'
-            msg = f'''扫描下载器{self._downloader_type}\n总的种子数: {torrent_total_cnt}\n已修改种子数: {torrent_update_cnt}'''
+            if self._dry_run:
+                msg = f'''扫描下载器{self._downloader_type}\n总的种子数: {torrent_total_cnt}\n试运行，待修改种子数: {len(plan)}'''
+                for item in plan[:self._notify_limit]:
+                    msg += f"\n{item.get('name')}\n" + "\n".join(
+                        f"  {original_url} -> {new_url}" for original_url, new_url in item.get("changes"))
+                if len(plan) > self._notify_limit:
+                    msg += f"\n... 等 {len(plan)} 个种子"
+            else:
+                msg = f'''扫描下载器{self._downloader_type}\n总的种子数: {torrent_total_cnt}\n已修改种子数: {torrent_update_cnt}'''
+                if torrent_failed_cnt:
+                    msg += f"\n修改失败种子数: {torrent_failed_cnt}"
             self.send_site_message(title, msg)
 
     def __update_config(self):
@@ -135,6 +165,8 @@ class TrackerEditor(_PluginBase):
             "port": self._port,
             "target_domain": self._target_domain,
             "replace_domain": self._replace_domain,
+            "extra_rules": self._extra_rules,
+            "dry_run": self._dry_run,
             "run_cron_enable": self._run_con_enable,
             "run_cron": self._run_con,
             "notify": self._notify
@@ -205,6 +237,22 @@ class TrackerEditor(_PluginBase):
                                         }
                                     }
                                 ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'dry_run',
+                                            'label': '试运行 (只列出将被修改的tracker，不执行修改)',
+                                        }
+                                    }
+                                ]
                             }]
                     },
                     {
@@ -362,6 +410,27 @@ class TrackerEditor(_PluginBase):
                                 ]
                             }
                         ]
+                    }, {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextarea',
+                                        'props': {
+                                            'model': 'extra_rules',
+                                            'label': '更多替换规则',
+                                            'rows': 3,
+                                            'placeholder': '每行一条，格式：待替换文本|替换的文本，按顺序依次替换'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
                     }, {
                         'component': 'VRow',
                         'content': [
@@ -418,6 +487,8 @@ class TrackerEditor(_PluginBase):
             "password": "password",
             "target_domain": "",
             "replace_domain": "",
+            "extra_rules": "",
+            "dry_run": False,
             "run_con_enable": False,
             "run_con": "",
             "notify": True
@@ -0,0 +1,130 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.log import logger
+
+
+class TrackerRewriter:
+    """
+    批量Tracker替换
+    先一次性收集全部种子的Tracker，按替换规则（可多条，按顺序在一次遍历中全部应用）计算出
+    确实需要修改的种子及其新旧地址，再分批并发执行修改；试运行时只输出变更，不做修改
+    """
+
+    def __init__(self, rules: List[Tuple[str, str]], max_workers: int = 4, batch_size: int = 50):
+        # [(待替换文本, 替换的文本)]
+        self.rules = [(target, replace or "") for target, replace in rules if target]
+        self.max_workers = max(max_workers, 1)
+        self.batch_size = max(batch_size, 1)
+
+    @staticmethod
+    def parse_rules(text: str) -> List[Tuple[str, str]]:
+        """
+        解析替换规则，每行一条，格式：待替换文本|替换的文本
+        """
+        rules = []
+        for line in (text or "").splitlines():
+            if "|" not in line:
+                continue
+            target, replace = line.split("|", 1)
+            if target.strip():
+                rules.append((target.strip(), replace.strip()))
+        return rules
+
+    def rewrite(self, url: str) -> str:
+        """
+        依次应用全部替换规则
+        """
+        for target, replace in self.rules:
+            if target in url:
+                url = url.replace(target, replace)
+        return url
+
+    def plan(self, trackers: Dict[str, List[str]], names: Dict[str, str] = None) -> List[dict]:
+        """
+        计算需要修改的种子
+        :param trackers: 种子hash -> Tracker地址列表
+        :param names: 种子hash -> 种子名称
+        :return: [{"hash", "name", "changes": [(原地址, 新地址)], "trackers": 修改后的全部地址}]
+        """
+        result = []
+        if not self.rules:
+            return result
+        for torrent_hash, urls in trackers.items():
+            changes = []
+            new_urls = []
+            for url in urls:
+                new_url = self.rewrite(url)
+                if new_url != url:
+                    changes.append((url, new_url))
+                new_urls.append(new_url)
+            if changes:
+                result.append({
+                    "hash": torrent_hash,
+                    "name": (names or {}).get(torrent_hash) or torrent_hash,
+                    "changes": changes,
+                    "trackers": new_urls
+                })
+        return result
+
+    def apply(self, plan: List[dict], func: Callable[[dict], bool]) -> Tuple[int, int]:
+        """
+        分批并发执行修改，某一批全部失败时中止后续批次
+        :param plan: plan()的结果
+        :param func: 修改单个种子的方法，返回是否成功
+        :return: 成功数、失败数
+        """
+        succeed = failed = 0
+
+        def __apply(item: dict) -> bool:
+            try:
+                return bool(func(item))
+            except Exception as e:
+                logger.error(f"修改种子 {item.get('name')} Tracker出错：{str(e)}")
+                return False
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for i in range(0, len(plan), self.batch_size):
+                results = list(executor.map(__apply, plan[i:i + self.batch_size]))
+                succeed += results.count(True)
+                failed += results.count(False)
+                if not any(results):
+                    logger.error(f"执行tracker修改出错，中止本次执行")
+                    break
+        return succeed, failed
+
+    @staticmethod
+    def collect_qb(qbc, torrents: list, max_workers: int = 8) -> Dict[str, List[str]]:
+        """
+        收集qBittorrent全部种子的Tracker
+        支持includeTrackers的版本一次请求获取全部，否则有限并发逐个获取
+        """
+        result: Dict[str, List[str]] = {}
+        hashes = [torrent.get("hash") for torrent in torrents]
+        try:
+            infos = qbc.torrents_info(includeTrackers=True)
+            if infos and "trackers" in infos[0]:
+                for info in infos:
+                    result[info.get("hash")] = TrackerRewriter.__qb_urls(info.get("trackers"))
+        except Exception as e:
+            logger.debug(f"批量获取Tracker失败：{str(e)}")
+        missing = [torrent_hash for torrent_hash in hashes if torrent_hash not in result]
+        if missing:
+            def __fetch(torrent_hash: str) -> Tuple[str, Optional[list]]:
+                try:
+                    return torrent_hash, qbc.torrents_trackers(torrent_hash=torrent_hash)
+                except Exception as err:
+                    logger.error(f"获取种子 {torrent_hash} Tracker失败：{str(err)}")
+                    return torrent_hash, None
+
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for torrent_hash, trackers in executor.map(__fetch, missing):
+                    if trackers is not None:
+                        result[torrent_hash] = TrackerRewriter.__qb_urls(trackers)
+        return {torrent_hash: result[torrent_hash] for torrent_hash in hashes if torrent_hash in result}
+
+    @staticmethod
+    def __qb_urls(trackers: list) -> List[str]:
+        # 排除DHT、PeX、LSD
+        return [tracker.get("url") for tracker in trackers or []
+                if tracker.get("tier", -1) >= 0 and tracker.get("url")]